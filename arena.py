@@ -0,0 +1,1110 @@
+"""One camera, its tracker, calibration and clients: a game arena.
+
+Everything the detection path used to keep in gierka2.py module globals
+lives on an Arena now, so a process can run several of them side by side,
+each with its own camera and websocket endpoints (see server.py). The
+frame loop reaches its clients only through arena.endpoint, see
+endpoint.py.
+
+The frame loop owns the arena's mutable state (tracks, slots,
+calibration). What it decided about a frame goes out as a FrameSnapshot,
+an immutable tuple that other threads can read off arena.snapshot without
+locking: the websocket messages are built from it, so is /state.
+
+Importing this stays cheap: cv2, the overlay, ROI cropping and the
+inference pool only get imported by run_camera(), replays never need them.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+import startup
+from calibration import AutoCalibrator, CalibrationStore
+from endpoint import Endpoint
+from foot_filter import MAX_EXTRAPOLATION, FootDiffFilter
+from gestures import GestureDetector
+from latency import LatencyStats
+from pipeline import (
+    InferenceScheduler,
+    LatestQueue,
+    Stage,
+    StageCounter,
+    format_stats,
+)
+from pose_backends import (
+    LEFT_FOOT,
+    LEFT_KNEE,
+    RIGHT_FOOT,
+    RecordingBackend,
+    make_backend,
+)
+from protocol import PlayerIds, slot_state
+from slots import SlotManager
+from thumbnails import foot_box, refresh_thumbnail
+from tracker import match_detections
+
+# set STUPKI_FILE_FRAMES=1 to go through /tmp/ddd.jpg like in the old days
+USE_FILE_FRAMES = os.environ.get("STUPKI_FILE_FRAMES") == "1"
+# STUPKI_CALIBRATION=venue.json: calibration profile of the first arena,
+# the others get venue-1.json, venue-2.json, ... (see numbered_path())
+CALIBRATION_PATH = os.environ.get("STUPKI_CALIBRATION", "calibration.json")
+# set STUPKI_RECORD=session.jsonl to record what the detector sees
+RECORD_PATH = os.environ.get("STUPKI_RECORD")
+# STUPKI_RECORD_FRAMES=320: .stupki recordings also keep the camera frames
+# scaled down to that width
+RECORD_FRAMES_WIDTH = int(os.environ.get("STUPKI_RECORD_FRAMES", "0"))
+# seconds between pipeline stage stats printouts
+STATS_INTERVAL = 5
+# STUPKI_HEADLESS=1: no window and no overlay work unless a client asks
+HEADLESS = os.environ.get("STUPKI_HEADLESS") == "1"
+# seconds between overlay renders for the local window
+OVERLAY_INTERVAL = float(os.environ.get("STUPKI_OVERLAY_INTERVAL", "0.1"))
+# STUPKI_ROI=1: detect on crops around the players between full rescans
+USE_ROI = os.environ.get("STUPKI_ROI") == "1"
+# STUPKI_TARGET_FPS=30: only detect on every nth frame, n adjusted so
+# detection keeps up with that rate, and interpolate the frames in between.
+# 0 detects on every frame the detector can take.
+TARGET_FPS = float(os.environ.get("STUPKI_TARGET_FPS", "0"))
+# STUPKI_INFERENCE_WORKERS=4: detect in that many worker processes with
+# several frames in flight, 0 detects on a thread of this process
+INFERENCE_WORKERS = int(os.environ.get("STUPKI_INFERENCE_WORKERS", "0"))
+# STUPKI_PLAYERS=4: number of player slots, 2 is primary and secondary
+N_PLAYERS = int(os.environ.get("STUPKI_PLAYERS", "2"))
+# STUPKI_FOOT_FILTER=0 sends the raw foot_diff instead of the filtered one
+FOOT_FILTER = os.environ.get("STUPKI_FOOT_FILTER", "1") == "1"
+# STUPKI_AUTO_CALIBRATION=propose: collect bbox histograms and send the
+# calibration they suggest to clients, =apply: also switch to it
+AUTO_CALIBRATION = os.environ.get("STUPKI_AUTO_CALIBRATION", "")
+# seconds between auto calibration proposals
+AUTO_CALIBRATION_INTERVAL = 10
+
+
+TRACK_N_FRAMES = 40
+# TRACKED_OBSERVATION_MAX_TIME_SINCE_LAST_MATCH = 30
+
+
+class ObservationState:
+    __slots__ = ("bb_center_x", "bb_center_y", "bb_height", "foot_diff", "t")
+
+    def __init__(
+        self,
+        bb_center_x=None,
+        bb_center_y=None,
+        bb_height=None,
+        foot_diff=None,
+        t=None,
+    ):
+        self.bb_center_x = bb_center_x
+        self.bb_center_y = bb_center_y
+        self.bb_height = bb_height
+        self.foot_diff = foot_diff
+        # capture time of the frame it was detected on
+        self.t = t
+
+
+class TrackedObservation:
+    def __init__(self):
+        self.age = 0
+        self.time_since_last_match = 0
+        # ring buffer, slot n_pushed % TRACK_N_FRAMES gets overwritten next
+        self.states = [None] * TRACK_N_FRAMES
+        self.n_pushed = 0
+        # last non-None value of each field and the push it came from, so
+        # the last_* lookups don't have to walk the history
+        self.last_valid = {
+            "bb_center_x": (None, 0),
+            "bb_height": (None, 0),
+            "foot_diff": (None, 0),
+        }
+        # left foot crop area in the current frame, None if not visible
+        self.foot_box = None
+        self.foot_thumbnail = None
+        self.foot_thumbnail_at = -math.inf
+        self.foot_filter = FootDiffFilter()
+        # only fed while the track is a player, see Arena.publish_gestures()
+        self.gestures = GestureDetector()
+        # bbox center pixels per second between the last two detections
+        self.velocity = (0.0, 0.0)
+        self.uuid = str(uuid.uuid4())
+
+    def push_state(self, state):
+        last = self.last_state() if self.n_pushed else None
+        if last is not None and state.t is not None and last.t is not None:
+            dt = state.t - last.t
+            if dt > 0:
+                self.velocity = (
+                    (state.bb_center_x - last.bb_center_x) / dt,
+                    (state.bb_center_y - last.bb_center_y) / dt,
+                )
+        self.states[self.n_pushed % TRACK_N_FRAMES] = state
+        self.n_pushed += 1
+        if state.bb_center_x is not None:
+            self.last_valid["bb_center_x"] = (state.bb_center_x, self.n_pushed)
+        if state.bb_height is not None:
+            self.last_valid["bb_height"] = (state.bb_height, self.n_pushed)
+        if state.foot_diff is not None:
+            self.last_valid["foot_diff"] = (state.foot_diff, self.n_pushed)
+        self.time_since_last_match = 0
+
+    @property
+    def last_states(self):
+        """History from oldest to newest, copies so keep it off hot paths."""
+        if self.n_pushed <= TRACK_N_FRAMES:
+            return self.states[: self.n_pushed]
+        start = self.n_pushed % TRACK_N_FRAMES
+        return self.states[start:] + self.states[:start]
+
+    def last_state(self):
+        return self.states[(self.n_pushed - 1) % TRACK_N_FRAMES]
+
+    def _last_valid(self, field):
+        value, pushed_at = self.last_valid[field]
+        # only look as far back as the history goes
+        if self.n_pushed - pushed_at >= TRACK_N_FRAMES:
+            return None
+        return value
+
+    def last_foot_diff(self):
+        return self._last_valid("foot_diff")
+
+    def last_bb_center_x(self):
+        return self._last_valid("bb_center_x")
+
+    def last_height(self):
+        return self._last_valid("bb_height")
+
+    def predicted_center(self, t):
+        """Where the bbox center should be at t, going by the last two detections."""
+        state = self.last_state()
+        if state.t is None:
+            return state.bb_center_x, state.bb_center_y
+        ahead = min(max(t - state.t, 0.0), MAX_EXTRAPOLATION)
+        return (
+            state.bb_center_x + self.velocity[0] * ahead,
+            state.bb_center_y + self.velocity[1] * ahead,
+        )
+
+    def update_foot_filter(self, t):
+        matched = self.time_since_last_match == 0
+        self.foot_filter.update(self.last_state().foot_diff if matched else None, t)
+
+    def control_foot_diff(self, latency, filtered=True):
+        """foot_diff the game steers with, predicted to when it lands there.
+
+        latency: the arena's pipeline_latency
+        """
+        if not filtered:
+            return self.last_foot_diff()
+        return self.foot_filter.predicted(latency)
+
+
+def observation_boxes(points, frame_size, calibration_config):
+    """Pixel-space joints, per-person bbox and calibration check, all at once.
+
+    points: (people, joints, 3) normalized [x, y, confidence] from a backend
+
+    Joints below calibration_config["min_joint_confidence"] are missing
+    joints from here on, "gated" says which joints only that turned away.
+    """
+    xy = points[:, :, :2]
+    with np.errstate(invalid="ignore"):
+        # same as 0.01 < x < 0.99 and 0.01 < y < 0.99, NaN (missing joint)
+        # compares as False so those drop out here too
+        in_frame = (np.abs(xy - 0.5) < 0.49).all(axis=2)
+        sure = points[:, :, 2] >= calibration_config["min_joint_confidence"]
+    valid = in_frame & sure
+    gated = in_frame & ~sure
+    # x = 1 - x
+    px = xy * (frame_size[0], -frame_size[1]) + (0, frame_size[1])
+    img_x = px[:, :, 0]
+    img_y = px[:, :, 1]
+
+    # fmin/fmax skip NaN, a person with no valid joints ends up all NaN and
+    # fails every check below
+    px_valid = np.where(valid[:, :, None], px, np.nan)
+    with np.errstate(invalid="ignore"):
+        bb_min = np.fmin.reduce(px_valid, axis=1)
+        bb_max = np.fmax.reduce(px_valid, axis=1)
+    bb_min_x, bb_min_y = bb_min.T
+    bb_max_x, bb_max_y = bb_max.T
+    bb_width, bb_height = (bb_max - bb_min).T
+    bb_center_x, bb_center_y = ((bb_max + bb_min) / 2).T
+
+    # check size and whether the center is in a deadzone
+    is_bb_big_valid = (
+        (bb_height >= calibration_config["min_bb_height"])
+        & (bb_width >= calibration_config["min_bb_width"])
+        & (bb_center_x > calibration_config["left_deadzone"])
+        & (bb_center_x < frame_size[0] - calibration_config["right_deadzone"])
+    )
+
+    return {
+        "img_x": img_x,
+        "img_y": img_y,
+        "valid": valid,
+        "gated": gated,
+        "has_joints": valid.any(axis=1),
+        "bb_min_x": bb_min_x,
+        "bb_min_y": bb_min_y,
+        "bb_max_x": bb_max_x,
+        "bb_max_y": bb_max_y,
+        "bb_width": bb_width,
+        "bb_height": bb_height,
+        "bb_center_x": bb_center_x,
+        "bb_center_y": bb_center_y,
+        "is_bb_big_valid": is_bb_big_valid,
+    }
+
+
+def accepted_people(boxes, accepted):
+    """The columns of observation_boxes() for the accepted people only,
+    plus foot_diff and whether their foot can be cropped, and whether the
+    joint gate is why they can't.
+    """
+    people = {
+        name: boxes[name][accepted]
+        for name in (
+            "img_x",
+            "img_y",
+            "valid",
+            "gated",
+            "bb_min_x",
+            "bb_min_y",
+            "bb_max_x",
+            "bb_max_y",
+            "bb_height",
+            "bb_center_x",
+            "bb_center_y",
+        )
+    }
+    valid = people["valid"]
+    img_y = people["img_y"]
+    has_feet = valid[:, LEFT_FOOT] & valid[:, RIGHT_FOOT]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        foot_diff = (img_y[:, LEFT_FOOT] - img_y[:, RIGHT_FOOT]) / people["bb_height"]
+    people["has_feet"] = has_feet & np.isfinite(foot_diff)
+    people["foot_diff"] = foot_diff
+    people["has_foot_crop"] = valid[:, LEFT_FOOT] & valid[:, LEFT_KNEE]
+    # both joints were in the picture but the joint gate took one of them
+    gated = people["gated"]
+    in_frame = valid | gated
+    people["feet_gated"] = (
+        in_frame[:, LEFT_FOOT]
+        & in_frame[:, RIGHT_FOOT]
+        & (gated[:, LEFT_FOOT] | gated[:, RIGHT_FOOT])
+    )
+    people["foot_crop_gated"] = (
+        in_frame[:, LEFT_FOOT]
+        & in_frame[:, LEFT_KNEE]
+        & (gated[:, LEFT_FOOT] | gated[:, LEFT_KNEE])
+    )
+    return people
+
+
+class PlayerSnapshot(NamedTuple):
+    uuid: str
+    # what the game steers with, see TrackedObservation.control_foot_diff()
+    foot_diff: Optional[float]
+    raw_foot_diff: Optional[float]
+
+
+class FrameSnapshot(NamedTuple):
+    """What the arena made of one frame, never changes once published."""
+
+    # camera frame id, None in replays
+    frame: Optional[int]
+    # capture time
+    t: float
+    # PlayerSnapshot per slot, None for empty slots
+    players: Tuple[Optional[PlayerSnapshot], ...]
+    # False for frames that skipped detection
+    measured: bool
+    n_tracks: int
+    calibration_version: int
+
+    def to_dict(self):
+        return {
+            "frame": self.frame,
+            "t": self.t,
+            "players": [
+                player._asdict() if player is not None else None
+                for player in self.players
+            ],
+            "measured": self.measured,
+            "tracks": self.n_tracks,
+            "calibration_version": self.calibration_version,
+        }
+
+
+def make_camera_backend():
+    """Detection backend of the camera loop, inference workers call it too."""
+    backend = make_backend("vision", use_file_frames=USE_FILE_FRAMES)
+    if USE_ROI:
+        from roi import RoiBackend
+
+        backend = RoiBackend(backend)
+    return backend
+
+
+def numbered_path(path, index):
+    """path for the first arena of a process, path-1, path-2, ... for the rest."""
+    if index == 0:
+        return path
+    stem, suffix = os.path.splitext(path)
+    return f"{stem}-{index}{suffix}"
+
+
+def client_number(evt, key):
+    """evt[key] if it is a finite number, what client JSON can't be trusted with."""
+    value = evt[key]
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise TypeError(f"{key} is not a number")
+    if not math.isfinite(value):
+        raise ValueError(f"{key} is not finite")
+    return value
+
+
+def client_int(evt, key):
+    value = client_number(evt, key)
+    if not isinstance(value, int):
+        raise TypeError(f"{key} is not an int")
+    return value
+
+
+class Arena:
+    def __init__(
+        self,
+        name="arena",
+        calibration_path=CALIBRATION_PATH,
+        n_players=N_PLAYERS,
+        foot_filter=FOOT_FILTER,
+        auto_calibration=AUTO_CALIBRATION,
+        endpoint=None,
+    ):
+        """endpoint: where messages to clients go, see endpoint.py"""
+        self.name = name
+        self.foot_filter = foot_filter
+        self.auto_calibration = auto_calibration
+
+        # per-frame stage timestamps, served on /stats/latency
+        self.latency_stats = LatencyStats()
+        self.endpoint = endpoint if endpoint is not None else Endpoint(name)
+        self.endpoint.latency_stats = self.latency_stats
+
+        self.calibration = CalibrationStore(calibration_path)
+        # edited in place by the frame loop only, see calibration.py
+        self.calibration_config = self.calibration.config
+        # bbox histograms for auto calibration, made once frame_size is known
+        self.auto_calibrator = None
+        self.last_proposal_at = -math.inf
+
+        self.last_sent = None
+        # slot -> uuid of the track the last thumbnail sent for it shows
+        self.sent_thumbnails = {}
+        self.players_seq = 0
+        self.player_ids = PlayerIds()
+
+        # what to draw for the current frame, None on frames nobody will look at
+        self.overlay = None
+        self.last_overlay_at = -math.inf
+        # raw BGR camera frame being processed, None in replays
+        self.current_frame = None
+        # latency.FrameTimes of that frame, None in replays
+        self.current_times = None
+        # (width, height) of the frame the observations belong to
+        self.frame_size = None
+        # seconds from capture to publish, smoothed, 0 in replays
+        self.pipeline_latency = 0.0
+
+        self.tracked_observations = []
+        # track in every player slot as last published, None for empty slots
+        self.current_players = [None] * n_players
+        self.slot_manager = SlotManager(n_players)
+        # gesture events sent, see publish_gestures()
+        self.gesture_events = 0
+        # people with joints seen, and how many of those calibration turned away
+        self.people_seen = 0
+        self.people_rejected = 0
+        # what the confidence gates turned away, see format_gate_stats()
+        self.gated_frames = 0
+        self.people_gated = 0
+        self.joints_gated = 0
+        self.foot_diffs_gated = 0
+        self.foot_crops_gated = 0
+        # FrameSnapshot of the last frame published
+        self.snapshot = None
+        # set by stop(), ends run_camera() on another thread
+        self.stopped = threading.Event()
+
+    def stop(self):
+        self.stopped.set()
+
+    def load_calibration(self):
+        self.calibration.load()
+
+    def save_calibration(self):
+        # written from the store's thread once the clicking stops
+        self.calibration.changed()
+
+    def send_json(self, data, frame=None, lossless=False, players=False):
+        """frame: camera frame id to tag the message with, left out of the dedup
+
+        lossless: for messages that must not be dropped when the server
+        falls behind, see endpoint.py
+        players: the JSON players message, which clients on the binary
+        protocol get from send_players() instead
+        """
+        dumped = json.dumps(data)
+        if dumped == self.last_sent:
+            return
+        self.last_sent = dumped
+        if frame is not None:
+            dumped = json.dumps(dict(data, frame=frame))
+        if players:
+            self.endpoint.send_players_json(dumped)
+        else:
+            self.endpoint.send_json(dumped, lossless)
+
+    def send_players(self, snapshot):
+        self.stamp("selected")
+        players_json = [
+            player._asdict() if player is not None else None
+            for player in snapshot.players
+        ]
+        self.send_json(
+            {
+                "type": "players",
+                # what 2 player clients look at
+                "primary": players_json[0],
+                "secondary": players_json[1] if len(players_json) > 1 else None,
+                "slots": players_json,
+                "measured": snapshot.measured,
+            },
+            snapshot.frame,
+            players=True,
+        )
+
+        state = tuple(
+            slot_state(
+                player.uuid if player is not None else None,
+                player.foot_diff if player is not None else None,
+                self.player_ids,
+                not snapshot.measured,
+            )
+            for player in snapshot.players
+        )
+        self.players_seq += 1
+        if len(self.player_ids.ids) > 64:
+            self.player_ids.forget_except(
+                {track.uuid for track in self.tracked_observations}
+            )
+        self.endpoint.send_players(self.players_seq, state, snapshot.frame or 0)
+        self.endpoint.send_snapshot(snapshot)
+        self.stamp("broadcast")
+
+    def tick_tracked_observations(self):
+        kept = []
+        for obs in self.tracked_observations:
+            obs.age += 1
+            obs.time_since_last_match += 1
+            if obs.time_since_last_match <= 10:
+                kept.append(obs)
+        self.tracked_observations[:] = kept
+
+    def filter_tracked_observations(self, t):
+        for obs in self.tracked_observations:
+            obs.update_foot_filter(t)
+
+    def process_observations(self, points, confidences, t=None):
+        """Filter and track one frame worth of backend observations."""
+        overlay = self.overlay
+        calibration_config = self.calibration_config
+        # people the detector isn't sure about don't even get a bbox
+        sure = confidences >= calibration_config["min_confidence"]
+        self.gated_frames += 1
+        if not sure.all():
+            self.people_gated += len(sure) - int(sure.sum())
+            points = points[sure]
+            confidences = confidences[sure]
+        boxes = observation_boxes(points, self.frame_size, calibration_config)
+        self.joints_gated += int(boxes["gated"].sum())
+        has_joints = boxes["has_joints"]
+        if self.auto_calibration:
+            self.observe_for_calibration(boxes, has_joints, t)
+        if overlay is not None:
+            for i in np.flatnonzero(has_joints).tolist():
+                overlay.boxes.append(
+                    (
+                        (
+                            float(boxes["bb_min_x"][i]),
+                            float(boxes["bb_min_y"][i]),
+                            float(boxes["bb_max_x"][i]),
+                            float(boxes["bb_max_y"][i]),
+                        ),
+                        bool(boxes["is_bb_big_valid"][i]),
+                    )
+                )
+        # background people stop here, everything below is per accepted person
+        accepted = np.flatnonzero(has_joints & boxes["is_bb_big_valid"])
+        people = accepted_people(boxes, accepted)
+        self.people_seen += int(has_joints.sum())
+        self.people_rejected += int(has_joints.sum()) - len(accepted)
+        self.foot_diffs_gated += int(people["feet_gated"].sum())
+        self.foot_crops_gated += int(people["foot_crop_gated"].sum())
+        self.stamp("filtered")
+
+        # one tolist() per column beats pulling numpy scalars out one by one
+        bb_min_x = people["bb_min_x"].tolist()
+        bb_min_y = people["bb_min_y"].tolist()
+        bb_max_x = people["bb_max_x"].tolist()
+        bb_max_y = people["bb_max_y"].tolist()
+        bb_height = people["bb_height"].tolist()
+        bb_center_x = people["bb_center_x"].tolist()
+        bb_center_y = people["bb_center_y"].tolist()
+        has_feet = people["has_feet"].tolist()
+        foot_diffs = people["foot_diff"].tolist()
+        has_foot_crop = people["has_foot_crop"].tolist()
+        img_x = people["img_x"]
+        img_y = people["img_y"]
+
+        # track observations, one global matching for the whole frame
+        tracked_observations = self.tracked_observations
+        last_states = [obs.last_state() for obs in tracked_observations]
+        det_idx, trk_idx, lonely = match_detections(
+            people["bb_center_x"],
+            people["bb_center_y"],
+            people["bb_height"],
+            np.array([state.bb_center_x for state in last_states]),
+            np.array([state.bb_center_y for state in last_states]),
+            np.array([state.bb_height for state in last_states]),
+        )
+        matched_tracks = [tracked_observations[t] for t in trk_idx.tolist()]
+        track_for_detection = dict(zip(det_idx.tolist(), matched_tracks))
+        lonely = lonely.tolist()
+
+        for k in range(len(accepted)):
+            foot_diff = foot_diffs[k] if has_feet[k] else None
+            if foot_diff is not None and overlay is not None:
+                overlay.labels.append(
+                    (bb_min_x[k], bb_min_y[k] + 5, "D: " + str(round(foot_diff, 2)))
+                )
+
+            curr_state = ObservationState(
+                bb_center_x=bb_center_x[k],
+                bb_center_y=bb_center_y[k],
+                bb_height=bb_height[k],
+                foot_diff=foot_diff,
+                t=t,
+            )
+            current_tracked_observation = track_for_detection.get(k)
+            if current_tracked_observation is not None:
+                current_tracked_observation.push_state(curr_state)
+            elif lonely[k] and foot_diff is not None:
+                tracked_observations.append(TrackedObservation())
+                current_tracked_observation = tracked_observations[-1]
+                current_tracked_observation.push_state(curr_state)
+                # draw a filled rectangle
+                if overlay is not None:
+                    overlay.new_tracks.append(
+                        (bb_min_x[k], bb_min_y[k], bb_max_x[k], bb_max_y[k])
+                    )
+
+            if current_tracked_observation is None:
+                continue
+            # remember where the left foot is, it only gets cropped if this
+            # track ends up being a player
+            current_tracked_observation.foot_box = None
+            if has_foot_crop[k]:
+                box = foot_box(
+                    float(img_x[k, LEFT_FOOT]),
+                    float(img_y[k, LEFT_FOOT]),
+                    float(img_x[k, LEFT_KNEE]),
+                    float(img_y[k, LEFT_KNEE]),
+                )
+                current_tracked_observation.foot_box = box
+                # draw rect around left foot
+                if overlay is not None:
+                    overlay.foot_boxes.append(box)
+
+        # sort tracked observations by bb_min_x
+        tracked_observations.sort(
+            key=lambda k: k.last_state().bb_center_x, reverse=True
+        )
+
+    def format_gate_stats(self):
+        frames = max(self.gated_frames, 1)
+        return (
+            f"confidence gates per frame: {self.people_gated / frames:.2f} people,"
+            f" {self.joints_gated / frames:.2f} joints,"
+            f" {self.foot_diffs_gated / frames:.2f} foot_diffs,"
+            f" {self.foot_crops_gated / frames:.2f} foot crops"
+        )
+
+    def observe_for_calibration(self, boxes, has_joints, t):
+        if self.auto_calibrator is None:
+            slot_manager = self.slot_manager
+            self.auto_calibrator = AutoCalibrator(
+                self.frame_size,
+                n_players=slot_manager.n_slots,
+                player_height_ratio=slot_manager.keep_ratio(),
+            )
+        self.auto_calibrator.add(
+            t,
+            boxes["bb_width"][has_joints],
+            boxes["bb_height"][has_joints],
+            boxes["bb_center_x"][has_joints],
+        )
+
+    def update_auto_calibration(self, t):
+        """Every AUTO_CALIBRATION_INTERVAL propose calibration, and use it if asked to."""
+        if (
+            self.auto_calibrator is None
+            or t - self.last_proposal_at < AUTO_CALIBRATION_INTERVAL
+        ):
+            return
+        self.last_proposal_at = t
+        proposal = self.auto_calibrator.propose()
+        if proposal is None:
+            return
+        changed = any(
+            self.calibration_config.get(key) != value for key, value in proposal.items()
+        )
+        if self.auto_calibration == "apply" and changed:
+            self.calibration_config.update(proposal)
+            self.save_calibration()
+        self.send_calibration()
+
+    def send_calibration(self):
+        self.send_json(
+            {
+                "type": "calibration",
+                "config": self.calibration_config,
+                "version": self.calibration.version,
+                "proposal": (
+                    self.auto_calibrator.last_proposal if self.auto_calibrator else None
+                ),
+            },
+            lossless=True,
+        )
+
+    def player_snapshot(self, track):
+        if track is None:
+            return None
+        return PlayerSnapshot(
+            track.uuid,
+            track.control_foot_diff(self.pipeline_latency, self.foot_filter),
+            track.last_foot_diff(),
+        )
+
+    def publish_players(self, t, interpolated=False):
+        # send data to websocket
+        players = self.slot_manager.update(self.tracked_observations)
+        previous = list(self.current_players)
+        self.current_players[:] = players
+        self.snapshot = FrameSnapshot(
+            frame=self.current_times.seq if self.current_times is not None else None,
+            t=t,
+            players=tuple(self.player_snapshot(track) for track in players),
+            measured=not interpolated,
+            n_tracks=len(self.tracked_observations),
+            calibration_version=self.calibration.version,
+        )
+        self.publish_gestures(previous, players, t)
+        if any(track is not None for track in players):
+            self.publish_thumbnails(players)
+        self.send_players(self.snapshot)
+
+    def send_gesture(self, event, slot, track, t, side=None):
+        self.gesture_events += 1
+        self.endpoint.send_event(
+            json.dumps(
+                {
+                    "type": "gesture",
+                    "event": event,
+                    "slot": slot,
+                    "uuid": track.uuid,
+                    "side": side,
+                    "t": t,
+                }
+            )
+        )
+
+    def publish_gestures(self, previous, players, t):
+        """Slot changes and foot gestures of the players, see gestures.py
+
+        previous, players: track per slot last frame and this one
+        """
+        for slot, (before, track) in enumerate(zip(previous, players)):
+            if track is not before:
+                if before is not None:
+                    self.send_gesture("player_left", slot, before, t)
+                if track is not None:
+                    self.send_gesture("player_entered", slot, track, t)
+            if track is None:
+                continue
+            # the same foot_diff the game gets, minus the latency prediction
+            foot_diff = track.control_foot_diff(0.0, self.foot_filter)
+            for event, side in track.gestures.update(foot_diff, t):
+                self.send_gesture(event, slot, track, t, side)
+
+    def send_thumbnail(self, slot, track):
+        self.sent_thumbnails[slot] = track.uuid
+        self.endpoint.send_thumbnail(slot, track.uuid, track.foot_thumbnail)
+
+    def publish_thumbnails(self, players):
+        """players: track per slot, None for empty slots"""
+        now = time.monotonic()
+        for slot, track in enumerate(players):
+            if track is None:
+                continue
+            fresh = refresh_thumbnail(track, self.current_frame, now)
+            if track.foot_thumbnail is None:
+                continue
+            if fresh or self.sent_thumbnails.get(slot) != track.uuid:
+                self.send_thumbnail(slot, track)
+
+    def handle_events(self):
+        calibration_config = self.calibration_config
+        reloaded = self.calibration.take_reload()
+        if reloaded is not None:
+            calibration_config.update(reloaded)
+            self.send_calibration()
+        for evt in self.endpoint.take_events():
+            try:
+                self.handle_event(evt)
+            except (AttributeError, KeyError, TypeError, ValueError) as e:
+                # whatever a client sends, the publish stage has to live on
+                print(f"Ignoring client message {evt!r}: {e!r}")
+
+    def handle_event(self, evt):
+        calibration_config = self.calibration_config
+        if evt["type"] == "frame_report":
+            self.latency_stats.client_report(
+                client_int(evt, "frame"), client_number(evt, "receive_to_render")
+            )
+        if evt["type"] == "get_calibration":
+            self.send_calibration()
+        if evt["type"] == "apply_calibration_proposal":
+            auto_calibrator = self.auto_calibrator
+            if auto_calibrator is not None and auto_calibrator.last_proposal:
+                calibration_config.update(auto_calibrator.last_proposal)
+                self.save_calibration()
+                self.send_calibration()
+        if evt["type"] == "adjust_min_bb_height":
+            calibration_config["min_bb_height"] += client_number(evt, "delta")
+            if calibration_config["min_bb_height"] < 0:
+                calibration_config["min_bb_height"] = 0
+            self.save_calibration()
+            self.send_calibration()
+        if evt["type"] == "adjust_min_bb_width":
+            calibration_config["min_bb_width"] += client_number(evt, "delta")
+            if calibration_config["min_bb_width"] < 0:
+                calibration_config["min_bb_width"] = 0
+            self.save_calibration()
+            self.send_calibration()
+        if evt["type"] == "adjust_left_deadzone":
+            calibration_config["left_deadzone"] += client_number(evt, "delta")
+            if calibration_config["left_deadzone"] < 0:
+                calibration_config["left_deadzone"] = 0
+            self.save_calibration()
+            self.send_calibration()
+        if evt["type"] == "adjust_right_deadzone":
+            calibration_config["right_deadzone"] += client_number(evt, "delta")
+            if calibration_config["right_deadzone"] < 0:
+                calibration_config["right_deadzone"] = 0
+            self.save_calibration()
+            self.send_calibration()
+        if evt["type"] in ("adjust_min_confidence", "adjust_min_joint_confidence"):
+            key = evt["type"][len("adjust_") :]
+            # confidences are 0..1, rounded so the steps don't drift
+            calibration_config[key] = min(
+                max(round(calibration_config[key] + client_number(evt, "delta"), 2), 0),
+                1,
+            )
+            self.save_calibration()
+            self.send_calibration()
+
+    def process_frame(self, points, confidences, t=None):
+        """Everything that happens after detection for a single frame.
+
+        t: when the frame was captured, in seconds, defaults to now
+        """
+        if t is None:
+            t = time.monotonic()
+        self.tick_tracked_observations()
+        self.process_observations(points, confidences, t)
+        self.filter_tracked_observations(t)
+        self.stamp("tracked")
+        self.publish_players(t)
+        self.handle_events()
+        if self.auto_calibration:
+            self.update_auto_calibration(t)
+
+    def stamp(self, stage):
+        if self.current_times is not None:
+            self.current_times.stamp(stage)
+
+    def interpolate_frame(self, t):
+        """Publish a frame that skipped detection from what the tracks know."""
+        for obs in self.tracked_observations:
+            obs.foot_filter.advance(t)
+        self.publish_players(t, interpolated=True)
+        self.handle_events()
+
+    def roi_regions(self, t):
+        """Where the detector should look on a frame captured at t, None for everywhere."""
+        if not self.tracked_observations:
+            return None
+        from roi import entry_regions, track_region
+
+        regions = []
+        for obs in self.tracked_observations:
+            center_x, center_y = obs.predicted_center(t)
+            regions.append(track_region(center_x, center_y, obs.last_state().bb_height))
+        regions += entry_regions(
+            self.frame_size[0],
+            self.frame_size[1],
+            self.calibration_config["left_deadzone"],
+            self.calibration_config["right_deadzone"],
+        )
+        return regions
+
+    def run_camera(
+        self,
+        camera=0,
+        show_window=not HEADLESS,
+        record_path=RECORD_PATH,
+        record_frames_width=RECORD_FRAMES_WIDTH,
+    ):
+        """Capture, detect and publish until the camera stops or q is pressed.
+
+        cv2 windows only work from the main thread, other arenas of the
+        process run with show_window=False.
+        """
+        with startup.timed("cv2"):
+            import cv2
+        from inference_pool import InferencePool
+        from overlay import Overlay, encode_jpeg, render
+
+        # with a pool the backends live in the worker processes
+        backend = None
+        if INFERENCE_WORKERS == 0:
+            with startup.timed(f"{self.name} backend"):
+                backend = make_camera_backend()
+        roi_backend = backend if USE_ROI else None
+        recorder = None
+        if record_path:
+            recorder = RecordingBackend(backend, record_path, record_frames_width)
+        scheduler = None
+        if TARGET_FPS > 0:
+            scheduler = InferenceScheduler(
+                TARGET_FPS, max_in_flight=max(INFERENCE_WORKERS, 1)
+            )
+        pool = None
+        # what the next frame's detection should look at, see roi_regions()
+        next_regions = None
+        with startup.timed(f"{self.name} camera open"):
+            cap = cv2.VideoCapture(camera)
+
+        frames = LatestQueue()
+        # skipped frames come straight from capture and pool results in
+        # bursts, so leave room for those next to a detection that is just
+        # finishing
+        detections = LatestQueue(
+            maxsize=4 if scheduler is not None or INFERENCE_WORKERS > 0 else 1
+        )
+        rendered_overlays = LatestQueue()
+
+        def on_pool_result(meta, started, ended, detection):
+            frame, times = meta
+            times.stamp("detect_start", started)
+            times.stamp("detect_end", ended)
+            if scheduler is not None:
+                scheduler.done(ended - started)
+            if recorder is not None:
+                recorder.record(frame, *detection)
+            detections.put((frame, times, detection))
+
+        def capture(_):
+            nonlocal pool
+            # Read a new frame
+            if not cap.isOpened():
+                return StopIteration
+            ret, frame = cap.read()
+            if not ret:
+                return StopIteration
+            times = self.latency_stats.new_frame()
+            if scheduler is not None and not scheduler.should_detect():
+                detections.put((frame, times, None))
+                return None
+            if INFERENCE_WORKERS == 0:
+                return frame, times
+            if pool is None:
+                pool = InferencePool(
+                    frame.shape, INFERENCE_WORKERS, make_camera_backend, on_pool_result
+                )
+            # all slots busy means the frame is dropped, like a full LatestQueue
+            pool.submit(frame, (frame, times), next_regions)
+            return None
+
+        def inference(captured):
+            frame, times = captured
+            times.stamp("detect_start")
+            detection = (recorder or backend).detect_array(frame)
+            times.stamp("detect_end")
+            if scheduler is not None:
+                scheduler.done(
+                    times.stamps["detect_end"] - times.stamps["detect_start"]
+                )
+            return frame, times, detection
+
+        def track_and_publish(detection):
+            nonlocal next_regions
+            frame, times, points_and_confidences = detection
+            captured_at = times.captured_at
+            self.current_frame = frame
+            self.current_times = times
+            self.frame_size = (frame.shape[1], frame.shape[0])
+
+            now = time.monotonic()
+            # what the prediction has to make up for, the part after
+            # publishing (websocket, browser) isn't measured here
+            self.pipeline_latency += 0.1 * (now - captured_at - self.pipeline_latency)
+            for_window = show_window and now - self.last_overlay_at >= OVERLAY_INTERVAL
+            for_clients = self.endpoint.overlay_wanted()
+            self.overlay = Overlay() if for_window or for_clients else None
+
+            if points_and_confidences is None:
+                self.interpolate_frame(captured_at)
+            else:
+                self.process_frame(*points_and_confidences, captured_at)
+            if USE_ROI:
+                # the regions are for the next frame that gets detected, not
+                # this one: it gets captured about now, or once the
+                # scheduler is done skipping frames
+                lookahead = self.pipeline_latency
+                if scheduler is not None:
+                    lookahead = max(lookahead, scheduler.detection_interval())
+                next_regions = self.roi_regions(captured_at + lookahead)
+                if roi_backend is not None:
+                    roi_backend.set_regions(next_regions)
+            self.latency_stats.frame_done(times)
+            startup.done("first frame published")
+
+            if self.overlay is None:
+                return None
+            self.last_overlay_at = now
+            rendered = render(
+                frame, self.overlay, self.tracked_observations, self.calibration_config
+            )
+            if for_clients:
+                self.endpoint.send_overlay(encode_jpeg(rendered))
+            return rendered if for_window else None
+
+        if INFERENCE_WORKERS == 0:
+            stages = [
+                Stage("capture", capture, outbox=frames),
+                Stage("inference", inference, inbox=frames, outbox=detections),
+            ]
+        else:
+            # capture hands frames to the pool itself, its outbox only gets
+            # closed at the end
+            stages = [Stage("capture", capture, outbox=detections)]
+        stages.append(
+            Stage(
+                "publish", track_and_publish, inbox=detections, outbox=rendered_overlays
+            )
+        )
+        for stage in stages:
+            stage.start()
+
+        display_counter = StageCounter("display")
+        counters = [stage.counter for stage in stages] + [display_counter]
+        queues = {
+            "frames": frames,
+            "detections": detections,
+            "overlays": rendered_overlays,
+        }
+        last_stats = time.monotonic()
+        try:
+            while True:
+                rendered = rendered_overlays.get(timeout=0.1)
+                if rendered is not None:
+                    start = time.perf_counter()
+                    cv2.imshow(f"PoseCamera {self.name}", rendered)
+                    display_counter.add(time.perf_counter() - start)
+                elif rendered_overlays.closed:
+                    break
+                if self.stopped.is_set():
+                    break
+
+                if show_window and cv2.waitKey(1) & 0xFF == ord("q"):
+                    break
+
+                if time.monotonic() - last_stats > STATS_INTERVAL:
+                    last_stats = time.monotonic()
+                    print(f"{self.name}:")
+                    print(format_stats(counters, queues))
+                    print(
+                        f"capture -> publish latency {self.pipeline_latency * 1000:.0f} ms"
+                    )
+                    print(
+                        f"calibration v{self.calibration.version}: {self.people_rejected} of"
+                        f" {self.people_seen} people dropped before tracking"
+                    )
+                    print(self.format_gate_stats())
+                    if scheduler is not None:
+                        print(scheduler.format_stats())
+                    if pool is not None:
+                        print(
+                            f"inference pool: {pool.workers} workers,"
+                            f" {pool.in_flight()} in flight, dropped {pool.dropped}"
+                        )
+                    if roi_backend is not None:
+                        print(
+                            f"roi: {roi_backend.scanned_fraction():.0%} of camera pixels"
+                            f" detected, {roi_backend.full_scans} full scans"
+                        )
+        except KeyboardInterrupt:
+            pass
+
+        for stage in stages:
+            stage.stop()
+        for stage in stages:
+            stage.join()
+        if pool is not None:
+            pool.close()
+        if recorder is not None:
+            recorder.close()
+        elif backend is not None:
+            backend.close()
+        cap.release()
+        if show_window:
+            cv2.destroyAllWindows()
+
+    def run_replay(self, path):
+        """Run a recorded session through the pipeline as fast as possible.
+
+        Returns (frames, seconds).
+        """
+        with startup.timed(f"{self.name} open"):
+            backend = make_backend("replay", path=path)
+        self.frame_size = backend.frame_size
+        self.overlay = None
+
+        startup.done("replay started")
+        start = time.perf_counter()
+        n_frames = 0
+        for points, confidences in backend.frames():
+            self.process_frame(points, confidences, backend.t)
+            n_frames += 1
+        elapsed = time.perf_counter() - start
+        backend.close()
+        return n_frames, elapsed
@@ -0,0 +1,132 @@
+"""Aggregate throughput of several arenas side by side.
+
+Every arena replays the same synthetic scene from bench_pipeline.py through
+its own tracker, slots and calibration, as fast as it goes. Arenas run
+either as threads of one process, which is what gierka2.py does with
+STUPKI_CAMERAS, or one process each. The per-frame work is mostly Python,
+so threads share one core between them and processes are what scales with
+the cores the host has.
+
+Every arena also checksums the snapshots it published, they all have to
+match a lone arena's, otherwise arenas are leaking state into each other.
+
+    python bench_arenas.py [frames people]
+"""
+
+import hashlib
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from bench_pipeline import FPS, make_scene, new_arena
+from pose_backends import observations_to_array
+
+
+def replay(frames):
+    """(seconds, checksum of the published snapshots)"""
+    arena = new_arena()
+    checksum = hashlib.sha1()
+    start = time.perf_counter()
+    for f, (points, confidences) in enumerate(frames):
+        arena.process_frame(points, confidences, f / FPS)
+        # uuids are random, what the slots got is what has to match
+        checksum.update(
+            repr(
+                [
+                    player.raw_foot_diff if player is not None else None
+                    for player in arena.snapshot.players
+                ]
+            ).encode()
+        )
+    return time.perf_counter() - start, checksum.hexdigest()
+
+
+def replay_into(frames, results, i):
+    results[i] = replay(frames)
+
+
+def run_threads(frames, n_arenas):
+    results = [None] * n_arenas
+    threads = [
+        threading.Thread(target=replay_into, args=(frames, results, i))
+        for i in range(n_arenas)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, [checksum for _, checksum in results]
+
+
+worker_frames = None
+
+
+def init_worker(frames):
+    global worker_frames
+    worker_frames = frames
+
+
+def replay_frames(_):
+    return replay(worker_frames)
+
+
+def run_processes(pool, n_arenas):
+    # the pool is warm and every worker has the frames, see main()
+    start = time.perf_counter()
+    results = pool.map(replay_frames, range(n_arenas), chunksize=1)
+    return time.perf_counter() - start, [checksum for _, checksum in results]
+
+
+def main():
+    n_frames = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    n_people = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    scene = make_scene("walking", n_people, n_frames, np.random.default_rng(0))
+    frames = [observations_to_array(observations) for observations in scene]
+
+    _, reference = replay(frames)
+    cores = os.cpu_count() or 1
+    counts = []
+    n_arenas = 1
+    while n_arenas <= max(cores, 2) * 2:
+        counts.append(n_arenas)
+        n_arenas *= 2
+
+    context = multiprocessing.get_context("spawn")
+    pool = context.Pool(counts[-1], initializer=init_worker, initargs=(frames,))
+    # warm up, spawning and imports aren't what we time
+    pool.map(replay_frames, range(counts[-1]), chunksize=1)
+
+    print(f"{cores} cores, {n_frames} frames of {n_people} people per arena")
+    print(f"{'arenas':>6} {'mode':>9} {'fps':>9} {'speedup':>8} {'same':>5}")
+    single = {}
+    for n_arenas in counts:
+        for mode in ("threads", "processes"):
+            if mode == "threads":
+                elapsed, checksums = run_threads(frames, n_arenas)
+            else:
+                elapsed, checksums = run_processes(pool, n_arenas)
+            fps = n_arenas * n_frames / elapsed
+            single.setdefault(mode, fps)
+            same = all(checksum == reference for checksum in checksums)
+            # past the core count more arenas only split the same cores
+            note = "  more arenas than cores" if n_arenas > cores else ""
+            print(
+                f"{n_arenas:>6} {mode:>9} {fps:>9.0f}"
+                f" {fps / single[mode]:>8.2f} {str(same):>5}" + note
+            )
+    pool.close()
+    pool.join()
+    if cores < 2:
+        print(
+            f"warning: {cores} core, arenas can only take turns on it, neither"
+            " threads nor processes can show any scaling here"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Time the per-frame handoff from cv2 to the detector/overlay.
+
+old: imwrite /tmp/ddd.jpg -> Image.open -> decode again for the detector
+new: BGRA buffer for the detector + RGB copy for the overlay, no disk
+
+Vision itself is not timed, this only measures what happens before it.
+
+    python bench_frame_path.py [width height frames]
+"""
+
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw
+
+
+def old_path(frame, img_path="/tmp/ddd.jpg"):
+    cv2.imwrite(img_path, frame)
+    img = Image.open(img_path)
+    img.load()
+    ImageDraw.Draw(img, "RGBA")
+    # stand-in for Quartz.CIImage.imageWithContentsOfURL_ decoding the file
+    cv2.imread(img_path)
+    return img
+
+
+def new_path(frame):
+    bgra = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA)
+    img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    ImageDraw.Draw(img, "RGBA")
+    return bgra, img
+
+
+def bench(fn, frames, n):
+    fn(frames[0])
+    start = time.perf_counter()
+    for i in range(n):
+        fn(frames[i % len(frames)])
+    return (time.perf_counter() - start) / n * 1000
+
+
+def main():
+    width = int(sys.argv[1]) if len(sys.argv) > 1 else 1280
+    height = int(sys.argv[2]) if len(sys.argv) > 2 else 720
+    n = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+
+    # noise compresses badly, which is roughly what a camera frame looks like
+    rng = np.random.default_rng(0)
+    frames = [
+        rng.integers(0, 255, (height, width, 3), dtype=np.uint8) for _ in range(4)
+    ]
+
+    old_ms = bench(old_path, frames, n)
+    new_ms = bench(new_path, frames, n)
+    print(f"{width}x{height}, {n} frames")
+    print(f"old (jpeg on disk): {old_ms:.2f} ms/frame")
+    print(f"new (in memory):    {new_ms:.2f} ms/frame")
+    print(f"speedup:            {old_ms / new_ms:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
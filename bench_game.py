@@ -0,0 +1,113 @@
+"""Matches per second of the headless game, and a check against index.js.
+
+Plays the same synthetic matches three ways: stepping game.Match with a
+literal port of detectTrailCollisions() from static/index.js (the whole
+combined trail filtered on every tick), stepping game.Match with its trail
+grid, and game.play_many(). All three have to agree on every result.
+
+    python bench_game.py [matches]
+"""
+
+import math
+import sys
+import time
+
+import numpy as np
+
+import game
+
+
+def detect_trail_collisions(player, combined_trail):
+    """detectTrailCollisions() from index.js, O(trail length)."""
+    close_points = [
+        point
+        for point in combined_trail
+        if abs(point[0] - player.x) < game.NEAR and abs(point[1] - player.y) < game.NEAR
+    ]
+    if len(close_points) <= game.MAX_NEAR_POINTS:
+        return False
+    for a, b in zip(close_points, close_points[1:]):
+        d_a = math.hypot(a[0] - player.x, a[1] - player.y)
+        d_b = math.hypot(b[0] - player.x, b[1] - player.y)
+        d_ab = math.hypot(a[0] - b[0], a[1] - b[1])
+        # playerSize in index.js
+        if abs(d_a + d_b - d_ab) < 10:
+            return True
+    return False
+
+
+class ScanMatch(game.Match):
+    """game.Match colliding like index.js does."""
+
+    def __init__(self, n_players=2, **match_args):
+        super().__init__(n_players, **match_args)
+        self.trails = [[] for _ in range(n_players)]
+
+    def step(self, foot_diffs):
+        for player, trail, foot_diff in zip(self.players, self.trails, foot_diffs):
+            if foot_diff is not None and abs(foot_diff) > self.dead_zone:
+                player.angle += self.steering * foot_diff
+            player.x += math.cos(player.angle) * game.MOVE_DISTANCE
+            player.y += math.sin(player.angle) * game.MOVE_DISTANCE
+            trail.append((player.x, player.y))
+        self.ticks += 1
+        # [...playerB.trail, ...playerA.trail]
+        combined_trail = [point for trail in self.trails[::-1] for point in trail]
+        for i, player in enumerate(self.players):
+            if detect_trail_collisions(player, combined_trail) or game.out_of_bounds(
+                player.x, player.y
+            ):
+                self.loser = i
+                return i
+        return None
+
+
+def step_match(match, streams, stream_rate=30, max_ticks=20000):
+    streams = [stream.tolist() for stream in streams]
+    for tick in range(max_ticks):
+        frame = int(tick * stream_rate / game.TICK_RATE)
+        foot_diffs = [stream[min(frame, len(stream) - 1)] for stream in streams]
+        loser = match.step([None if v != v else v for v in foot_diffs])
+        if loser is not None:
+            return loser, match.ticks
+    return None, match.ticks
+
+
+def timed(label, play, matches, reference=None):
+    start = time.perf_counter()
+    results = play(matches)
+    elapsed = time.perf_counter() - start
+    ticks = sum(n_ticks for _, n_ticks in results)
+    same = "-" if reference is None else str(results[: len(reference)] == reference)
+    print(
+        f"{label:>10} {len(matches) / elapsed:>10.1f} {ticks / elapsed:>12.0f} {same:>6}"
+    )
+    return results
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rng = np.random.default_rng(0)
+    matches = [
+        [game.synthetic_stream(rng, 30 * 60) for _ in range(2)] for _ in range(n)
+    ]
+    print(f"{'':>10} {'matches/s':>10} {'ticks/s':>12} {'same':>6}")
+    # the index.js port is slow, a few matches are plenty
+    reference = timed(
+        "index.js",
+        lambda ms: [step_match(ScanMatch(), streams) for streams in ms],
+        matches[: max(n // 20, 1)],
+    )
+    stepped = timed(
+        "Match",
+        lambda ms: [step_match(game.Match(), streams) for streams in ms],
+        matches,
+        reference,
+    )
+    timed("play_many", game.play_many, matches, stepped)
+    mean_ticks = np.mean([n_ticks for _, n_ticks in stepped])
+    print(f"mean match {mean_ticks / game.TICK_RATE:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
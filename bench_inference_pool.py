@@ -0,0 +1,114 @@
+"""Throughput of the inference pool against the number of worker processes.
+
+Vision only runs on macOS, so the workers run a stand-in backend that
+burns a fixed amount of single-threaded CPU per frame with cv2, roughly
+like a pose model would. Frames go through inference_pool.InferencePool
+exactly like in the camera loop, and the results are checked to come back
+in submit order.
+
+    python bench_inference_pool.py [frames width height]
+"""
+
+import os
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from inference_pool import InferencePool
+from pose_backends import PoseBackend, empty_points
+
+# blur passes per frame, sets how expensive the stand-in detector is
+BLUR_PASSES = 6
+
+
+class BusyBackend(PoseBackend):
+    def __init__(self):
+        # one core per worker, otherwise cv2 spreads every call over all
+        # of them and the scaling says nothing
+        cv2.setNumThreads(1)
+
+    def detect_array(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        for _ in range(BLUR_PASSES):
+            gray = cv2.GaussianBlur(gray, (15, 15), 0)
+        points = empty_points(1)
+        points[0, 0] = (gray.mean() / 255, 0.5, 1.0)
+        return points, np.ones(1, dtype=np.float32)
+
+
+def run_inline(frames, n):
+    backend = BusyBackend()
+    start = time.perf_counter()
+    for i in range(n):
+        backend.detect_array(frames[i % len(frames)])
+    return n / (time.perf_counter() - start)
+
+
+def run_pool(frames, n, workers):
+    received = []
+    done = threading.Event()
+
+    def on_result(meta, started, ended, detection):
+        received.append(meta)
+        if len(received) == n:
+            done.set()
+
+    pool = InferencePool(frames[0].shape, workers, BusyBackend, on_result)
+    # warm up, spawning and importing cv2 in the workers isn't what we time
+    for i in range(workers):
+        pool.submit(frames[0], -1 - i)
+    while len(received) < workers:
+        time.sleep(0.01)
+    received.clear()
+
+    start = time.perf_counter()
+    submitted = 0
+    while submitted < n:
+        if pool.submit(frames[submitted % len(frames)], submitted):
+            submitted += 1
+        else:
+            # every slot busy, like a camera frame that would get dropped
+            time.sleep(0.0005)
+    done.wait()
+    elapsed = time.perf_counter() - start
+    pool.close()
+    in_order = received == list(range(n))
+    return n / elapsed, in_order
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 1280
+    height = int(sys.argv[3]) if len(sys.argv) > 3 else 720
+    rng = np.random.default_rng(0)
+    frames = [
+        rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(4)
+    ]
+
+    cores = os.cpu_count() or 1
+    inline_fps = run_inline(frames, n)
+    print(f"{cores} cores, {width}x{height}")
+    print(f"{'workers':>7} {'fps':>8} {'speedup':>8} {'in order':>8}")
+    print(f"{'inline':>7} {inline_fps:>8.1f} {1.0:>8.2f} {'-':>8}")
+    workers = 1
+    while workers <= max(cores, 2):
+        fps, in_order = run_pool(frames, n, workers)
+        # more workers than cores only adds the pool's overhead
+        note = "  more workers than cores" if workers > cores else ""
+        print(
+            f"{workers:>7} {fps:>8.1f} {fps / inline_fps:>8.2f} {str(in_order):>8}"
+            + note
+        )
+        workers *= 2
+    if cores < 2:
+        print(
+            f"warning: {cores} core, the workers share it with each other and"
+            " the submitting process, nothing here can be faster than inline"
+        )
+
+
+if __name__ == "__main__":
+    main()
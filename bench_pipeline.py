@@ -0,0 +1,237 @@
+"""Detection-to-players benchmark on synthetic keypoint scenes.
+
+Generates Vision-style observations for N people and runs them through the
+same per-frame code as the camera loop, stamping each frame like
+latency.py does. Per stage p50/p99 and end to end frames/sec go to stdout
+as one JSON document, so runs on different commits can be diffed.
+
+Stages:
+    extract    observation dicts -> joint array (what the Vision handler fills)
+    filter     bbox, size and deadzone checks
+    tracking   matching, TrackedObservation updates, foot_diff filters
+    selection  primary/secondary selection and thumbnails
+    send       players message serialization and broadcast
+
+Scenes:
+    walking       everybody walks left and right across the play area
+    foot_raises   standing players raising one foot after the other
+    occlusion     walking, with lower bodies and whole people dropping out
+    enter_leave   people walking in from and out past the frame edges
+
+    python bench_pipeline.py [frames] > results.json
+"""
+
+import json
+import math
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from arena import Arena
+from latency import LatencyStats
+from pose_backends import observations_to_array
+
+WIDTH = 1280
+HEIGHT = 720
+FPS = 30
+SCENES = ["walking", "foot_raises", "occlusion", "enter_leave"]
+PEOPLE = [1, 2, 4, 8]
+CALIBRATION = {
+    "min_bb_height": 300,
+    "min_bb_width": 60,
+    "left_deadzone": 100,
+    "right_deadzone": 100,
+}
+STAGES = {
+    "extract": ("detect_start", "detect_end"),
+    "filter": ("detect_end", "filtered"),
+    "tracking": ("filtered", "tracked"),
+    "selection": ("tracked", "selected"),
+    "send": ("selected", "broadcast"),
+    "end_to_end": ("capture", "broadcast"),
+}
+
+# joint -> (x, y) relative to the point between the feet, in body heights,
+# y going up like in Vision
+SKELETON = {
+    "head_joint": (0.0, 0.95),
+    "left_eye_joint": (-0.02, 0.97),
+    "right_eye_joint": (0.02, 0.97),
+    "left_ear_joint": (-0.04, 0.96),
+    "right_ear_joint": (0.04, 0.96),
+    "neck_1_joint": (0.0, 0.82),
+    "left_shoulder_1_joint": (-0.12, 0.8),
+    "right_shoulder_1_joint": (0.12, 0.8),
+    "left_forearm_joint": (-0.15, 0.62),
+    "right_forearm_joint": (0.15, 0.62),
+    "left_hand_joint": (-0.16, 0.45),
+    "right_hand_joint": (0.16, 0.45),
+    "root": (0.0, 0.52),
+    "left_upLeg_joint": (-0.06, 0.5),
+    "right_upLeg_joint": (0.06, 0.5),
+    "left_leg_joint": (-0.06, 0.27),
+    "right_leg_joint": (0.06, 0.27),
+    "left_foot_joint": (-0.06, 0.02),
+    "right_foot_joint": (0.06, 0.02),
+}
+LOWER_BODY = {
+    "left_leg_joint",
+    "right_leg_joint",
+    "left_foot_joint",
+    "right_foot_joint",
+}
+
+
+def person_joints(x, height, left_raise, right_raise, hidden, rng):
+    """Observation joints of one person standing at pixel x."""
+    joints = {}
+    for name, (dx, dy) in SKELETON.items():
+        if name in hidden:
+            continue
+        if name.startswith("left_leg") or name.startswith("left_foot"):
+            dy += left_raise
+        elif name.startswith("right_leg") or name.startswith("right_foot"):
+            dy += right_raise
+        px = x + dx * height + rng.normal(0, 3)
+        py = 60 + dy * height + rng.normal(0, 3)
+        nx = px / WIDTH
+        ny = py / HEIGHT
+        # Vision doesn't report what's out of the picture
+        if 0 < nx < 1 and 0 < ny < 1:
+            joints[name] = (nx, ny, 0.9)
+    return joints
+
+
+def make_scene(scene, n_people, n_frames, rng):
+    """List of frames, each a list of observations."""
+    x = rng.uniform(200, WIDTH - 200, n_people)
+    heights = rng.uniform(450, 600, n_people)
+    speed = rng.uniform(60, 200, n_people) * rng.choice([-1, 1], n_people)
+    phase = rng.uniform(0, 2 * math.pi, n_people)
+    if scene == "enter_leave":
+        # start outside the frame, half on each side
+        x = np.where(np.arange(n_people) % 2, -150.0, WIDTH + 150.0)
+        speed = np.where(np.arange(n_people) % 2, 1, -1) * np.abs(speed)
+        start_frame = rng.integers(0, n_frames // 2, n_people)
+    hidden_until = np.zeros(n_people, dtype=int)
+    lower_hidden_until = np.zeros(n_people, dtype=int)
+
+    frames = []
+    for f in range(n_frames):
+        t = f / FPS
+        observations = []
+        for p in range(n_people):
+            if scene == "walking" or scene == "occlusion":
+                x[p] += speed[p] / FPS
+                if not 150 < x[p] < WIDTH - 150:
+                    speed[p] = -speed[p]
+            elif scene == "enter_leave":
+                if f < start_frame[p]:
+                    continue
+                x[p] += speed[p] / FPS
+
+            left_raise = right_raise = 0.0
+            if scene == "foot_raises":
+                step = math.sin(2 * math.pi * 0.7 * t + phase[p])
+                left_raise = max(step, 0) * 0.12
+                right_raise = max(-step, 0) * 0.12
+            else:
+                # feet bob a little while walking
+                step = math.sin(2 * math.pi * 1.5 * t + phase[p])
+                left_raise = max(step, 0) * 0.03
+                right_raise = max(-step, 0) * 0.03
+
+            hidden = ()
+            if scene == "occlusion":
+                if f >= hidden_until[p] and rng.random() < 0.01:
+                    hidden_until[p] = f + rng.integers(2, 12)
+                if f >= lower_hidden_until[p] and rng.random() < 0.03:
+                    lower_hidden_until[p] = f + rng.integers(3, 20)
+                if f < hidden_until[p]:
+                    continue
+                if f < lower_hidden_until[p]:
+                    hidden = LOWER_BODY
+            joints = person_joints(
+                x[p], heights[p], left_raise, right_raise, hidden, rng
+            )
+            if joints:
+                observations.append({"confidence": 0.9, "joints": joints})
+        rng.shuffle(observations)
+        frames.append(observations)
+    return frames
+
+
+def new_arena():
+    arena = Arena("bench")
+    arena.calibration_config.update(CALIBRATION)
+    arena.frame_size = (WIDTH, HEIGHT)
+    return arena
+
+
+def run_scene(frames):
+    arena = new_arena()
+    stats = LatencyStats()
+    start = time.perf_counter()
+    for f, observations in enumerate(frames):
+        times = stats.new_frame()
+        arena.current_times = times
+        times.stamp("detect_start")
+        points, confidences = observations_to_array(observations)
+        times.stamp("detect_end")
+        arena.process_frame(points, confidences, f / FPS)
+        stats.frame_done(times)
+    elapsed = time.perf_counter() - start
+
+    histograms = stats.to_dict()["latency"]
+    stages = {}
+    for name, (first, last) in STAGES.items():
+        histogram = histograms.get(f"{first}->{last}")
+        if histogram is None:
+            continue
+        stages[name] = {
+            key: round(histogram[key], 4) for key in ("mean_ms", "p50_ms", "p99_ms")
+        }
+    return {
+        "fps": round(len(frames) / elapsed, 1),
+        "tracks_at_end": len(arena.tracked_observations),
+        "stages": stages,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    n_frames = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    results = []
+    for scene in SCENES:
+        for n_people in PEOPLE:
+            frames = make_scene(scene, n_people, n_frames, np.random.default_rng(0))
+            result = run_scene(frames)
+            result.update(scene=scene, people=n_people)
+            results.append(result)
+            print(
+                f"{scene:<12} {n_people:>2} people {result['fps']:>8.0f} fps",
+                file=sys.stderr,
+            )
+    json.dump(
+        {"commit": git_commit(), "frames": n_frames, "results": results},
+        sys.stdout,
+        indent=2,
+    )
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Encode/decode throughput of the players message formats.
+
+Compares the JSON players message with binary FULL and DELTA messages
+from protocol.py over a stream of slowly changing player states.
+
+    python bench_protocol.py [messages]
+"""
+
+import json
+import sys
+import time
+import uuid
+
+from protocol import PlayerIds, PlayersStream, decode, encode, slot_state
+
+
+def make_states(n):
+    uuids = [str(uuid.uuid4()) for _ in range(4)]
+    ids = PlayerIds()
+    states = []
+    dicts = []
+    for i in range(n):
+        # players swap every ~300 frames, feet move all the time
+        primary = uuids[(i // 300) % 4]
+        secondary = uuids[(i // 300 + 1) % 4] if i % 500 < 450 else None
+        primary_diff = ((i * 7) % 60 - 30) / 100
+        secondary_diff = ((i * 3) % 40 - 20) / 100 if i % 4 else None
+        states.append(
+            (
+                slot_state(primary, primary_diff, ids),
+                slot_state(secondary, secondary_diff, ids),
+            )
+        )
+        dicts.append(
+            {
+                "type": "players",
+                "primary": {"uuid": primary, "foot_diff": primary_diff},
+                "secondary": (
+                    {"uuid": secondary, "foot_diff": secondary_diff}
+                    if secondary
+                    else None
+                ),
+            }
+        )
+    return states, dicts
+
+
+def timed(fn, items):
+    start = time.perf_counter()
+    out = [fn(item) for item in items]
+    return time.perf_counter() - start, out
+
+
+def report(name, n, encode_s, decode_s, sizes):
+    print(
+        f"{name:<8} encode {n / encode_s:>10.0f} msg/s"
+        f"  decode {n / decode_s:>10.0f} msg/s"
+        f"  avg {sum(sizes) / len(sizes):>6.1f} bytes"
+    )
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    states, dicts = make_states(n)
+
+    encode_s, encoded = timed(json.dumps, dicts)
+    decode_s, _ = timed(json.loads, encoded)
+    report("json", n, encode_s, decode_s, [len(m) for m in encoded])
+
+    seqs = list(enumerate(states, 1))
+    encode_s, encoded = timed(lambda s: encode(s[0], s[1]), seqs)
+    decode_s, _ = timed(decode, encoded)
+    report("full", n, encode_s, decode_s, [len(m) for m in encoded])
+
+    # a client that acks everything right away, so every delta is against
+    # the previous state
+    stream = PlayersStream()
+
+    def encode_delta(item):
+        seq, state = item
+        message = stream.message_for(seq, state)
+        stream.ack(seq)
+        return message
+
+    encode_s, encoded = timed(encode_delta, seqs)
+    encoded = [m for m in encoded if m is not None]
+    base = [None]
+
+    def decode_delta(message):
+        seq, frame, state = decode(message, base[0])
+        base[0] = state
+        return state
+
+    decode_s, _ = timed(decode_delta, encoded)
+    report("delta", n, encode_s, decode_s, [len(m) for m in encoded])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Player slot selection with many tracked people in the scene.
+
+Fake tracks wander around with noisy bbox heights, a few tall ones up front
+and a crowd of smaller ones behind. Times slots.SlotManager against the
+primary/secondary selection gierka2.publish_players() used to do (two
+sorts by height, 80% rule, swap by x), and counts how often a slot went to
+a different track, which is what the hysteresis is for.
+
+    python bench_slots.py [frames]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from slots import SlotManager
+
+
+class FakeTrack:
+    __slots__ = ("age", "height", "x")
+
+    def __init__(self, height, x):
+        self.age = 100
+        self.height = height
+        self.x = x
+
+    def last_height(self):
+        return self.height
+
+    def last_bb_center_x(self):
+        return self.x
+
+
+def legacy_select(tracks):
+    """Old publish_players() selection, 2 slots only."""
+    filtered = [obs for obs in tracks if obs.age > 15]
+    if not filtered:
+        return [None, None]
+    filtered = sorted(filtered, key=lambda k: k.last_height(), reverse=True)
+    primary = filtered[0]
+    secondary = None
+    if len(filtered) > 1:
+        if filtered[1].last_height() > primary.last_height() * 0.8:
+            secondary = filtered[1]
+    if primary is not None and secondary is not None:
+        if primary.last_bb_center_x() > secondary.last_bb_center_x():
+            primary, secondary = secondary, primary
+    return [primary, secondary]
+
+
+def make_scene(rng, n_people, n_players):
+    """Heights and x per frame, players close to the camera and walking about.
+
+    There is one tall person more than there are slots, somebody waiting
+    for their turn right behind the players.
+    """
+    tall = rng.uniform(500, 560, n_players + 1)
+    small = rng.uniform(150, 420, n_people - n_players - 1)
+    base = np.concatenate([tall, small])
+    x0 = rng.uniform(100, 1180, n_people)
+    speed = rng.uniform(-3, 3, n_people)
+    return base, x0, speed
+
+
+def run(select, rng, n_frames, n_people, n_players):
+    base, x0, speed = make_scene(rng, n_people, n_players)
+    tracks = [FakeTrack(h, x) for h, x in zip(base, x0)]
+    noise = rng.normal(0, 15, (n_frames, n_people))
+    changes = 0
+    last = None
+    elapsed = 0.0
+    for frame in range(n_frames):
+        for i, track in enumerate(tracks):
+            track.height = base[i] + noise[frame, i]
+            # bounce between the edges, players cross each other
+            track.x = 100 + abs((x0[i] + speed[i] * frame) % 2160 - 1080)
+        start = time.perf_counter()
+        slots = select(tracks)
+        elapsed += time.perf_counter() - start
+        if last is not None:
+            changes += sum(
+                old is not None and new is not None and old is not new
+                for old, new in zip(last, slots)
+            )
+        last = slots
+    return n_frames / elapsed, changes
+
+
+def main():
+    n_frames = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(f"{'':>12} {'people':>6} {'slots':>5} {'frames/s':>10} {'changes':>8}")
+    for n_people in (10, 100, 1000):
+        for n_slots in (2, 6):
+            if n_slots == 2:
+                fps, changes = run(
+                    legacy_select, np.random.default_rng(0), n_frames, n_people, 2
+                )
+                print(f"{'legacy':>12} {n_people:>6} {2:>5} {fps:>10.0f} {changes:>8}")
+            manager = SlotManager(n_slots)
+            fps, changes = run(
+                manager.update, np.random.default_rng(0), n_frames, n_people, n_slots
+            )
+            print(
+                f"{'SlotManager':>12} {n_people:>6} {n_slots:>5} {fps:>10.0f} {changes:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Frame loop cost of handing player state to another process.
+
+Writes players-sized messages into a StateRing read by a spawned process,
+and puts the same messages on a multiprocessing Queue for comparison. The
+writer side is what the frame loop pays per message, the reader side says
+how much a server process would see (and lose) of them. Queue.put()
+returns before its feeder thread has pickled and sent the message, so the
+queue also reports how long until the reader had them all, on one core that
+is time the frame loop pays for too.
+
+    python bench_state_ring.py [messages]
+"""
+
+import json
+import multiprocessing
+import sys
+import time
+
+from state_ring import RingReader, StateRing
+
+SLOTS = 256
+SLOT_SIZE = 32 * 1024
+
+
+def make_messages(n):
+    return [
+        json.dumps(
+            [i, i, [[i % 7, (i % 60 - 30) / 100], [i % 5, (i % 40 - 20) / 100]]]
+        ).encode()
+        for i in range(n)
+    ]
+
+
+def read_ring(name, done, results):
+    reader = RingReader(StateRing(SLOTS, SLOT_SIZE, name=name))
+    results.put("ready")
+    while not done.is_set():
+        reader.read()
+    reader.read()
+    results.put((reader.read_count, reader.lost))
+    reader.close()
+
+
+def read_queue(messages, n, results):
+    for _ in range(n):
+        messages.get()
+    results.put(n)
+
+
+def bench_ring(context, messages):
+    ring = StateRing(SLOTS, SLOT_SIZE)
+    done = context.Event()
+    results = context.Queue()
+    reader = context.Process(target=read_ring, args=(ring.name, done, results))
+    reader.start()
+    results.get()
+    start = time.perf_counter()
+    for message in messages:
+        ring.write(2, message)
+    elapsed = time.perf_counter() - start
+    done.set()
+    read, lost = results.get()
+    reader.join()
+    ring.close()
+    return elapsed, None, read, lost
+
+
+def bench_queue(context, messages):
+    queue = context.Queue()
+    results = context.Queue()
+    reader = context.Process(target=read_queue, args=(queue, len(messages), results))
+    reader.start()
+    start = time.perf_counter()
+    for message in messages:
+        queue.put(message)
+    elapsed = time.perf_counter() - start
+    read = results.get()
+    drained = time.perf_counter() - start
+    reader.join()
+    return elapsed, drained, read, 0
+
+
+def report(name, n, elapsed, drained, read, lost):
+    line = (
+        f"{name:<6} write {n / elapsed:>10.0f} msg/s"
+        f"  {elapsed / n * 1e6:>6.2f} us/msg"
+        f"  read {read:>8}  lost {lost:>8}"
+    )
+    if drained is not None:
+        line += f"  all read after {drained / n * 1e6:.2f} us/msg"
+    print(line)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    messages = make_messages(n)
+    context = multiprocessing.get_context("spawn")
+    report("ring", n, *bench_ring(context, messages))
+    report("queue", n, *bench_queue(context, messages))
+
+
+if __name__ == "__main__":
+    main()
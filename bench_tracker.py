@@ -0,0 +1,123 @@
+"""Synthetic crowd benchmark for detection-to-track matching.
+
+Walks N people around a 1280x720 frame, jitters their boxes like the
+detector does and matches every frame with both the old greedy per
+detection matching and tracker.match_detections. Reports time per frame
+and how often a track jumped to a different person (a player swap), plus
+which of tracker.match_detections()' paths the frames took and whether
+the Hungarian method there was scipy's or the plain Python one.
+
+    python bench_tracker.py [frames]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import tracker
+from tracker import (
+    MATCH_MAX_BB_HEIGHT_DIST,
+    MATCH_MAX_BB_X_DIST,
+    MATCH_MAX_BB_Y_DIST,
+    match_detections,
+)
+
+
+def greedy_match(det_x, det_y, det_h, trk_x, trk_y, trk_h):
+    """What gierka2 used to do: every detection takes its closest track."""
+    rows = []
+    cols = []
+    for i in range(len(det_x)):
+        candidates = [
+            j
+            for j in range(len(trk_x))
+            if abs(det_x[i] - trk_x[j]) <= MATCH_MAX_BB_X_DIST
+            and abs(det_y[i] - trk_y[j]) <= MATCH_MAX_BB_Y_DIST
+            and abs(det_h[i] - trk_h[j]) <= MATCH_MAX_BB_HEIGHT_DIST
+        ]
+        if candidates:
+            candidates.sort(
+                key=lambda j: (det_x[i] - trk_x[j]) ** 2 + (det_y[i] - trk_y[j]) ** 2
+            )
+            rows.append(i)
+            cols.append(candidates[0])
+    return rows, cols
+
+
+def make_crowd(n_people, n_frames, rng):
+    """(frames, people, 3) true [center_x, center_y, height] per frame."""
+    pos = np.column_stack(
+        [
+            rng.uniform(100, 1180, n_people),
+            rng.uniform(300, 420, n_people),
+            rng.uniform(300, 500, n_people),
+        ]
+    )
+    vel = rng.normal(0, 6, (n_people, 3)) * (1, 0.3, 0.2)
+    frames = np.empty((n_frames, n_people, 3))
+    for f in range(n_frames):
+        vel += rng.normal(0, 1, (n_people, 3)) * (1, 0.3, 0.2)
+        vel *= 0.95
+        pos += vel
+        pos[:, 0] = np.clip(pos[:, 0], 50, 1230)
+        frames[f] = pos
+    return frames
+
+
+def run(match, crowd, rng):
+    n_frames, n_people, _ = crowd.shape
+    # tracks start on the true positions, track j belongs to person j
+    tracks = crowd[0].copy()
+    owner = np.arange(n_people)
+    swaps = 0
+    elapsed = 0.0
+    for f in range(1, n_frames):
+        dets = crowd[f] + rng.normal(0, 8, (n_people, 3))
+        # occasionally someone is not detected
+        seen = rng.random(n_people) > 0.05
+        people = np.nonzero(seen)[0]
+        rng.shuffle(people)
+        dets = dets[people]
+
+        start = time.perf_counter()
+        rows, cols = match(
+            dets[:, 0], dets[:, 1], dets[:, 2], tracks[:, 0], tracks[:, 1], tracks[:, 2]
+        )[:2]
+        elapsed += time.perf_counter() - start
+
+        for i, j in zip(rows, cols):
+            if owner[j] != people[i]:
+                swaps += 1
+                owner[j] = people[i]
+            tracks[j] = dets[i]
+    return elapsed / (n_frames - 1) * 1e6, swaps
+
+
+def main():
+    n_frames = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    solver = "scipy" if tracker.linear_sum_assignment is not None else "python"
+    print(f"Hungarian method: {solver}")
+    # first calls into numpy (BLAS setup in gate_groups() for one) take
+    # milliseconds, a crowd goes through every path once before timing
+    warm_up = make_crowd(20, 50, np.random.default_rng(0))
+    run(greedy_match, warm_up, np.random.default_rng(0))
+    run(match_detections, warm_up, np.random.default_rng(0))
+    print(
+        f"{'people':>6} {'greedy us':>10} {'swaps':>6} {'global us':>10} {'swaps':>6}"
+        "  paths"
+    )
+    for n_people in (2, 4, 6, 10, 20, 40):
+        crowd = make_crowd(n_people, n_frames, np.random.default_rng(n_people))
+        greedy_us, greedy_swaps = run(greedy_match, crowd, np.random.default_rng(0))
+        tracker.calls.clear()
+        global_us, global_swaps = run(match_detections, crowd, np.random.default_rng(0))
+        paths = " ".join(f"{name}={n}" for name, n in sorted(tracker.calls.items()))
+        print(
+            f"{n_people:>6} {greedy_us:>10.1f} {greedy_swaps:>6}"
+            f" {global_us:>10.1f} {global_swaps:>6}  {paths}"
+        )
+
+
+if __name__ == "__main__":
+    main()
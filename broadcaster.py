@@ -0,0 +1,155 @@
+"""Thread-safe websocket fan-out with a bounded outbox per client.
+
+The frame loop only ever appends to outboxes, the actual write_message
+calls happen on the IOLoop, one message in flight per client. When a
+client can't keep up its outbox drops the oldest messages (player state is
+only interesting when it's fresh), and a client whose outbox stays full for
+SLOW_CLIENT_TIMEOUT seconds gets disconnected. Messages sent with
+lossless=True (gesture events, calibration) are never dropped and keep
+their place in line, a client that lets more than LOSSLESS_BACKLOG of them
+pile up gets disconnected instead.
+
+tornado is only imported once a client shows up, a Broadcaster nobody
+connects to (replays, benchmarks) doesn't need it.
+"""
+
+import collections
+import threading
+import time
+
+OUTBOX_SIZE = 4
+SLOW_CLIENT_TIMEOUT = 5.0
+# lossless messages a client may have waiting before it gets disconnected
+LOSSLESS_BACKLOG = 1024
+
+
+class ClientOutbox:
+    def __init__(self, handler, maxsize):
+        self.handler = handler
+        # (message, binary, lossless) in sending order
+        self.messages = collections.deque()
+        self.maxsize = maxsize
+        # how many of messages may be dropped
+        self.droppable = 0
+        self.queued = 0
+        self.dropped = 0
+        self.sent = 0
+        self.flushing = False
+        self.closed = False
+        # when the outbox last ran full, None while it has room
+        self.full_since = None
+
+    def stats(self):
+        return {
+            "peer": self.handler.request.remote_ip,
+            "queued": self.queued,
+            "dropped": self.dropped,
+            "sent": self.sent,
+            "backlog": len(self.messages),
+        }
+
+
+class Broadcaster:
+    def __init__(self, outbox_size=OUTBOX_SIZE, slow_timeout=SLOW_CLIENT_TIMEOUT):
+        self.outbox_size = outbox_size
+        self.slow_timeout = slow_timeout
+        self.lock = threading.Lock()
+        self.outboxes = {}
+        self.ioloop = None
+
+    def add(self, handler):
+        """Call from the handler's open(), i.e. on the IOLoop."""
+        import tornado.ioloop
+
+        self.ioloop = tornado.ioloop.IOLoop.current()
+        with self.lock:
+            self.outboxes[handler] = ClientOutbox(handler, self.outbox_size)
+
+    def remove(self, handler):
+        with self.lock:
+            outbox = self.outboxes.pop(handler, None)
+            if outbox is not None:
+                outbox.closed = True
+
+    def clients(self):
+        with self.lock:
+            return list(self.outboxes)
+
+    def stats(self):
+        with self.lock:
+            return [outbox.stats() for outbox in self.outboxes.values()]
+
+    def send_to(self, handler, message, binary=False, lossless=False):
+        """Queue message for one client, safe to call from any thread."""
+        with self.lock:
+            outbox = self.outboxes.get(handler)
+            if outbox is None or outbox.closed:
+                return
+            self._enqueue(outbox, message, binary, lossless)
+
+    def send_all(self, message, binary=False, accept=None, lossless=False):
+        """Queue message for every client, or those where accept(handler)."""
+        with self.lock:
+            for handler, outbox in self.outboxes.items():
+                if outbox.closed or (accept is not None and not accept(handler)):
+                    continue
+                self._enqueue(outbox, message, binary, lossless)
+
+    def _enqueue(self, outbox, message, binary, lossless):
+        # lock is held
+        if lossless:
+            if len(outbox.messages) - outbox.droppable >= LOSSLESS_BACKLOG:
+                self._disconnect(outbox)
+                return
+        elif outbox.droppable == outbox.maxsize:
+            now = time.monotonic()
+            if outbox.full_since is None:
+                outbox.full_since = now
+            elif now - outbox.full_since > self.slow_timeout:
+                self._disconnect(outbox)
+                return
+            outbox.dropped += 1
+            # the oldest droppable message, lossless ones keep their place
+            for i, (_, _, queued_lossless) in enumerate(outbox.messages):
+                if not queued_lossless:
+                    del outbox.messages[i]
+                    outbox.droppable -= 1
+                    break
+        outbox.messages.append((message, binary, lossless))
+        if not lossless:
+            outbox.droppable += 1
+        outbox.queued += 1
+        if not outbox.flushing:
+            outbox.flushing = True
+            self.ioloop.add_callback(self._flush, outbox)
+
+    def _disconnect(self, outbox):
+        # lock is held
+        print(f"Dropping slow client {outbox.handler.request.remote_ip}")
+        outbox.closed = True
+        outbox.messages.clear()
+        outbox.droppable = 0
+        self.ioloop.add_callback(outbox.handler.close)
+
+    async def _flush(self, outbox):
+        import tornado.websocket
+
+        while True:
+            with self.lock:
+                if outbox.closed or not outbox.messages:
+                    outbox.flushing = False
+                    return
+                message, binary, lossless = outbox.messages.popleft()
+                if not lossless:
+                    outbox.droppable -= 1
+                outbox.full_since = None
+            try:
+                # resolves once tornado has handed the bytes to the socket,
+                # so a slow reader makes its own outbox back up
+                await outbox.handler.write_message(message, binary=binary)
+            except tornado.websocket.WebSocketClosedError:
+                with self.lock:
+                    outbox.closed = True
+                    outbox.flushing = False
+                return
+            outbox.sent += 1
@@ -0,0 +1,373 @@
+"""Calibration profiles on disk, and calibration proposed from what the camera sees.
+
+A profile is a JSON file:
+
+    {"version": 7, "saved_at": 1760000000.0, "config": {"min_bb_height": 400, ...}}
+
+version goes up by one with every save. Files from before profiles existed
+(just the config) load as version 0. Only the keys DEFAULTS has are kept,
+each as the type of its default, see check_config().
+
+CalibrationStore writes the profile from a background thread once edits
+have stopped for a moment, through a temporary file and a rename so a crash
+never leaves half a file behind, and notices when somebody else changed the
+file so another process or an editor can swap calibration on a running
+server.
+
+AutoCalibrator keeps histograms of everybody's bbox over the last
+window seconds. The people publish_players() would pick as players go in
+one set, everybody else in the other, and the proposal is the thresholds
+that keep the first and drop as much of the second as possible.
+"""
+
+import collections
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+DEFAULTS = {
+    "min_bb_height": 0,
+    "min_bb_width": 0,
+    "left_deadzone": 0,
+    "right_deadzone": 0,
+    # people the detector is less sure about than this are dropped before
+    # any per-person work, joints below min_joint_confidence count as missing.
+    # 0 keeps everybody like before there were confidence gates, raise them
+    # on the calibration page for a venue that needs it
+    "min_confidence": 0.0,
+    "min_joint_confidence": 0.0,
+}
+
+
+def check_config(config):
+    """The DEFAULTS keys of config, each as the type of its default.
+
+    Raises ValueError saying what is wrong if a value doesn't convert.
+    """
+    checked = {}
+    for key, value in config.items():
+        if key not in DEFAULTS:
+            continue
+        kind = type(DEFAULTS[key])
+        try:
+            if isinstance(value, bool):
+                raise TypeError
+            checked[key] = kind(value)
+            if not math.isfinite(checked[key]):
+                raise ValueError
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(f"{key} is {value!r}, not {kind.__name__}") from None
+    return checked
+
+
+def read_profile(path):
+    """(version, config) from path, None if there is no JSON file to read.
+
+    Raises ValueError when the JSON is no usable profile.
+    """
+    try:
+        with open(path, "r") as f:
+            text = f.read()
+    except OSError:
+        return None
+    try:
+        profile = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(profile, dict):
+        raise ValueError("not a JSON object")
+    if "config" not in profile:
+        return 0, check_config(profile)
+    version = profile.get("version", 0)
+    config = profile["config"]
+    if not isinstance(config, dict):
+        raise ValueError("config is not a JSON object")
+    if isinstance(version, bool) or not isinstance(version, int):
+        raise ValueError("version is not an int")
+    return version, check_config(config)
+
+
+def write_profile(path, version, config):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(
+                json.dumps(
+                    {"version": version, "saved_at": time.time(), "config": config}
+                )
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class CalibrationStore:
+    """The calibration in use and the profile file behind it.
+
+    config is edited in place by whoever owns it (the frame loop), changed()
+    after an edit schedules a save, take_reload() hands over a config that
+    changed on disk.
+    """
+
+    def __init__(self, path, debounce=1.0, poll_interval=1.0):
+        self.path = path
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.config = dict(DEFAULTS)
+        self.version = 0
+        self.lock = threading.Lock()
+        self.wake = threading.Condition(self.lock)
+        # copy of config waiting to be saved, and when it was last edited
+        self.pending = None
+        self.changed_at = 0.0
+        # config read from disk the frame loop hasn't taken yet
+        self.reloaded = None
+        # (mtime, size) of the file as we last wrote or read it
+        self.stamp = None
+        self.saves = 0
+        self.closed = False
+        self.thread = None
+
+    def load(self):
+        """Read the profile into config, False if there is none."""
+        try:
+            profile = read_profile(self.path)
+        except ValueError as e:
+            # hand edited into something else, better the defaults than a crash
+            print(f"Calibration profile {self.path}: {e}, using defaults")
+            profile = None
+        self.stamp = file_stamp(self.path)
+        if profile is None:
+            return False
+        self.version, config = profile
+        self.config.update(config)
+        return True
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self.run, name="calibration-store", daemon=True
+        )
+        self.thread.start()
+
+    def changed(self):
+        """Save config once it has been left alone for debounce seconds."""
+        with self.lock:
+            self.pending = dict(self.config)
+            self.changed_at = time.monotonic()
+            self.wake.notify()
+
+    def take_reload(self):
+        """Config somebody else saved since the last call, or None."""
+        with self.lock:
+            reloaded, self.reloaded = self.reloaded, None
+        return reloaded
+
+    def save(self, config):
+        self.version += 1
+        write_profile(self.path, self.version, config)
+        self.stamp = file_stamp(self.path)
+        self.saves += 1
+
+    def poll(self):
+        stamp = file_stamp(self.path)
+        if stamp is None or stamp == self.stamp:
+            return
+        self.stamp = stamp
+        try:
+            profile = read_profile(self.path)
+        except ValueError as e:
+            # keep what runs now, the next change to the file gets another look
+            print(f"Calibration change on disk ignored: {e}")
+            return
+        if profile is None:
+            # caught it mid-write by something that doesn't rename
+            self.stamp = None
+            return
+        version, config = profile
+        print(f"Calibration changed on disk, now version {version}")
+        self.version = max(self.version, version)
+        with self.lock:
+            self.reloaded = config
+
+    def run(self):
+        next_poll = time.monotonic() + self.poll_interval
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                save_at = (
+                    self.changed_at + self.debounce
+                    if self.pending is not None
+                    else math.inf
+                )
+                if self.closed:
+                    save_at = now
+                wait = min(save_at, next_poll) - now
+                if wait > 0:
+                    self.wake.wait(wait)
+                    continue
+                config = None
+                if save_at <= now:
+                    config, self.pending = self.pending, None
+                closed = self.closed
+            try:
+                if config is not None:
+                    self.save(config)
+                if closed:
+                    return
+                if next_poll <= now:
+                    next_poll = now + self.poll_interval
+                    self.poll()
+            except Exception as e:
+                print(f"Calibration store failed: {e!r}")
+
+    def close(self):
+        """Write what is still waiting for the debounce."""
+        with self.lock:
+            self.closed = True
+            self.wake.notify()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+        elif self.pending is not None:
+            self.save(self.pending)
+            self.pending = None
+
+
+def percentile(hist, q, bin_size):
+    """Lower edge of the bin the q-th percentile of hist falls in."""
+    cumulative = np.cumsum(hist)
+    return int(np.searchsorted(cumulative, q / 100 * cumulative[-1])) * bin_size
+
+
+def round_down(value, step):
+    return max(int(value // step * step), 0)
+
+
+class AutoCalibrator:
+    """bbox histograms over a sliding window and the calibration they suggest.
+
+    Histograms are kept per bucket_seconds and summed when asked, so
+    forgetting old frames is dropping a bucket. Bins are bin_size pixels,
+    the same step calibration.html adjusts in.
+    """
+
+    HISTOGRAMS = (
+        "player_height",
+        "player_width",
+        "player_center_x",
+        "other_height",
+        "other_width",
+    )
+
+    def __init__(
+        self,
+        frame_size,
+        window=30.0,
+        bin_size=10,
+        bucket_seconds=1.0,
+        n_players=2,
+        player_height_ratio=0.72,
+    ):
+        """n_players, player_height_ratio: who counts as a player, see add()"""
+        self.frame_size = frame_size
+        self.n_players = n_players
+        self.player_height_ratio = player_height_ratio
+        self.window = window
+        self.bin_size = bin_size
+        self.bucket_seconds = bucket_seconds
+        self.n_bins = max(frame_size) // bin_size + 1
+        # (start time, {name: histogram}), oldest first
+        self.buckets = collections.deque()
+        self.last_proposal = None
+
+    def add(self, t, bb_width, bb_height, bb_center_x):
+        """One frame's people, everybody with joints before any filtering.
+
+        The n_players tallest people that are at least player_height_ratio
+        of the tallest count as players. That is who slots.SlotManager
+        would let keep a slot, these people have no tracks to tell a
+        newcomer from somebody already playing.
+        """
+        if not self.buckets or t - self.buckets[-1][0] >= self.bucket_seconds:
+            self.buckets.append(
+                (t, {name: np.zeros(self.n_bins, np.int64) for name in self.HISTOGRAMS})
+            )
+        while t - self.buckets[0][0] > self.window:
+            self.buckets.popleft()
+        if not len(bb_height):
+            return
+        histograms = self.buckets[-1][1]
+        order = np.argsort(-bb_height)
+        tall = bb_height[order[: self.n_players]]
+        n_players = int((tall >= tall[0] * self.player_height_ratio).sum())
+        players, others = order[:n_players], order[n_players:]
+        for name, values in (
+            ("player_height", bb_height[players]),
+            ("player_width", bb_width[players]),
+            ("player_center_x", bb_center_x[players]),
+            ("other_height", bb_height[others]),
+            ("other_width", bb_width[others]),
+        ):
+            bins = np.clip(
+                (values // self.bin_size).astype(np.int64), 0, self.n_bins - 1
+            )
+            histograms[name] += np.bincount(bins, minlength=self.n_bins)
+
+    def histograms(self):
+        total = {name: np.zeros(self.n_bins, np.int64) for name in self.HISTOGRAMS}
+        for _, histograms in self.buckets:
+            for name, hist in histograms.items():
+                total[name] += hist
+        return total
+
+    def threshold(self, players, others):
+        """Size threshold that keeps 95% of players and drops most others."""
+        player_low = percentile(players, 5, self.bin_size)
+        if not others.any():
+            return round_down(player_low * 0.8, self.bin_size)
+        other_high = percentile(others, 95, self.bin_size) + self.bin_size
+        if other_high < player_low:
+            # the two don't overlap, split the gap
+            return round_down((other_high + player_low) / 2, self.bin_size)
+        # they do, keep the players and drop what can be dropped
+        return round_down(player_low * 0.9, self.bin_size)
+
+    def propose(self, min_samples=100):
+        """Calibration for the window, None if too few players were seen."""
+        histograms = self.histograms()
+        if histograms["player_height"].sum() < min_samples:
+            return None
+        width = self.frame_size[0]
+        # players move around, give them half a body of room at the edges
+        margin = percentile(histograms["player_width"], 50, self.bin_size) / 2
+        leftmost = percentile(histograms["player_center_x"], 1, self.bin_size)
+        rightmost = percentile(histograms["player_center_x"], 99, self.bin_size)
+        self.last_proposal = {
+            "min_bb_height": self.threshold(
+                histograms["player_height"], histograms["other_height"]
+            ),
+            "min_bb_width": self.threshold(
+                histograms["player_width"], histograms["other_width"]
+            ),
+            "left_deadzone": round_down(leftmost - margin, self.bin_size),
+            "right_deadzone": round_down(
+                width - rightmost - self.bin_size - margin, self.bin_size
+            ),
+        }
+        return self.last_proposal
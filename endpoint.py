@@ -0,0 +1,134 @@
+"""What an arena's frame loop sends its clients, and what they send back.
+
+The frame loop only talks to clients through an Endpoint:
+
+    send_json(text, lossless)        JSON messages for every /websocket client
+    send_players_json(text)          JSON players messages, for the clients
+                                     without the binary protocol
+    send_players(seq, state, frame)  binary player state, see protocol.py
+    send_thumbnail(slot, uuid, jpeg)
+    overlay_wanted()                 whether an /overlay client is waiting
+    send_overlay(jpeg)               to the /overlay clients that asked
+    send_snapshot(snapshot)          what /state serves
+    send_event(text)                 JSON gesture events, see gestures.py
+    take_events()                    client messages since the last call
+
+and the handlers in server.py only talk to it from the other side. This
+Endpoint hands everything straight to the Broadcasters of this process.
+
+Player state, thumbnails and overlays may get dropped on two hops, the
+newest one is all that matters: in a client's outbox when the client
+can't keep up (broadcaster.py), and between the processes when the server
+runs in one of its own (server_process.py). Gesture events and lossless
+JSON (calibration) are dropped on neither: the outbox keeps them and
+disconnects a client that lets too many pile up, and between the
+processes they go through a Queue.
+
+server_process.RingEndpoint has the same frame loop side but writes it all
+into shared memory for a server running in another process, which replays
+it onto an Endpoint of its own.
+"""
+
+import queue
+import threading
+
+from broadcaster import Broadcaster
+from thumbnails import pack_thumbnail
+
+
+class Endpoint:
+    def __init__(self, name):
+        self.name = name
+        # every frame loop -> websocket write goes through these, see
+        # broadcaster.py
+        self.clients = Broadcaster()
+        self.thumbnail_clients = Broadcaster()
+        self.overlay_clients = Broadcaster()
+        self.event_clients = Broadcaster()
+        # overlay clients that asked for a frame and haven't gotten it yet
+        self.overlay_requests_lock = threading.Lock()
+        self.overlay_requests = set()
+        # slot -> message of the last thumbnail sent for it, for new clients
+        self.sent_thumbnails = {}
+        # messages from clients, handled on the frame loop
+        self.events = queue.Queue()
+        self.snapshot = None
+        # the arena's latency.LatencyStats, served on /stats/latency
+        self.latency_stats = None
+
+    # frame loop side
+
+    def send_json(self, text, lossless=False):
+        # binary clients get these too, as text frames next to the binary ones
+        self.clients.send_all(text, lossless=lossless)
+
+    def send_players_json(self, text):
+        self.clients.send_all(text, accept=lambda client: client.players_stream is None)
+
+    def send_players(self, seq, state, frame):
+        """state: slot_state() per slot, every binary client gets its own delta"""
+        for client in self.clients.clients():
+            if client.players_stream is None:
+                continue
+            message = client.players_stream.message_for(seq, state, frame)
+            if message is not None:
+                self.clients.send_to(client, message, binary=True)
+
+    def send_thumbnail(self, slot, track_uuid, jpeg):
+        message = pack_thumbnail(slot, track_uuid, jpeg)
+        self.sent_thumbnails[slot] = message
+        self.thumbnail_clients.send_all(message, binary=True)
+
+    def overlay_wanted(self):
+        with self.overlay_requests_lock:
+            return bool(self.overlay_requests)
+
+    def send_overlay(self, jpeg):
+        with self.overlay_requests_lock:
+            requests = self.overlay_requests
+            self.overlay_requests = set()
+        for client in requests:
+            self.overlay_clients.send_to(client, jpeg, binary=True)
+
+    def send_snapshot(self, snapshot):
+        # a plain assignment, the snapshot itself never changes
+        self.snapshot = snapshot
+
+    def send_event(self, text):
+        self.event_clients.send_all(text, lossless=True)
+
+    def take_events(self):
+        events = []
+        while not self.events.empty():
+            events.append(self.events.get())
+        return events
+
+    def close(self):
+        pass
+
+    # server side
+
+    def post_event(self, event):
+        self.events.put(event)
+
+    def request_overlay(self, handler):
+        with self.overlay_requests_lock:
+            self.overlay_requests.add(handler)
+
+    def forget_overlay_client(self, handler):
+        with self.overlay_requests_lock:
+            self.overlay_requests.discard(handler)
+
+    def thumbnails(self):
+        return list(self.sent_thumbnails.values())
+
+    def state(self):
+        snapshot = self.snapshot
+        return snapshot.to_dict() if snapshot is not None else {}
+
+    def relay_stats(self):
+        """What got lost between the frame loop and here, see server_process.py"""
+        return {}
+
+    def latency(self):
+        return self.latency_stats.to_dict() if self.latency_stats is not None else {}
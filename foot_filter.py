@@ -0,0 +1,99 @@
+"""Per-track foot_diff smoothing, short-horizon prediction and gap filling.
+
+foot_diff goes through a One-Euro filter (Casiez et al. 2012), a low-pass
+whose cutoff goes up with how fast the value changes: a player standing
+still gets the jitter smoothed away, a quick foot raise comes through with
+little lag. The filter's velocity estimate is what the prediction and the
+gap filling extrapolate with, never further than MAX_EXTRAPOLATION.
+"""
+
+import math
+import os
+
+# Hz, cutoff while the value holds still
+FOOT_DIFF_MIN_CUTOFF = float(os.environ.get("STUPKI_FOOT_DIFF_MIN_CUTOFF", "1.5"))
+# how much the cutoff goes up per foot_diff/s of speed
+FOOT_DIFF_BETA = float(os.environ.get("STUPKI_FOOT_DIFF_BETA", "5.0"))
+# Hz, cutoff of the velocity estimate itself
+DERIVATIVE_CUTOFF = 1.0
+# frames without a foot_diff that get filled in before the value goes None
+MAX_GAP_FRAMES = 5
+# seconds, longest stretch the velocity gets extrapolated over
+MAX_EXTRAPOLATION = 0.2
+
+
+def smoothing_factor(dt, cutoff):
+    r = 2 * math.pi * cutoff * dt
+    return r / (r + 1)
+
+
+class OneEuroFilter:
+    def __init__(self, min_cutoff, beta, d_cutoff=DERIVATIVE_CUTOFF):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        # filtered value, its velocity per second and when it was measured
+        self.x = None
+        self.dx = 0.0
+        self.t = None
+
+    def update(self, x, t):
+        if self.x is None:
+            self.x = x
+            self.t = t
+            return x
+        dt = t - self.t
+        if dt <= 0:
+            return self.x
+        self.dx += smoothing_factor(dt, self.d_cutoff) * ((x - self.x) / dt - self.dx)
+        cutoff = self.min_cutoff + self.beta * abs(self.dx)
+        self.x += smoothing_factor(dt, cutoff) * (x - self.x)
+        self.t = t
+        return self.x
+
+
+class FootDiffFilter:
+    """Filtered foot_diff of one track, fed once per frame."""
+
+    def __init__(self):
+        self.euro = OneEuroFilter(FOOT_DIFF_MIN_CUTOFF, FOOT_DIFF_BETA)
+        # frames in a row without a foot_diff
+        self.missed = 0
+        # time of the latest frame, measured or not
+        self.t = None
+
+    def update(self, foot_diff, t):
+        """foot_diff is None on frames where the track had none."""
+        self.advance(t)
+        if foot_diff is not None:
+            self.euro.update(foot_diff, t)
+            self.missed = 0
+        elif self.euro.x is not None:
+            self.missed += 1
+            if self.missed > MAX_GAP_FRAMES:
+                self.euro.reset()
+
+    def advance(self, t):
+        """Move to a frame that skipped detection, not counted as a miss."""
+        # a detection can finish after frames captured later got published
+        if self.t is None or t > self.t:
+            self.t = t
+
+    def value_at(self, t):
+        if self.euro.x is None:
+            return None
+        ahead = min(max(t - self.euro.t, 0.0), MAX_EXTRAPOLATION)
+        return self.euro.x + self.euro.dx * ahead
+
+    def smoothed(self):
+        """Value at the latest frame, extrapolated if it had no foot_diff."""
+        return self.value_at(self.t)
+
+    def predicted(self, horizon):
+        """Value horizon seconds after the latest frame."""
+        if self.t is None:
+            return None
+        return self.value_at(self.t + horizon)
@@ -0,0 +1,377 @@
+"""Headless version of the game rules in static/index.js.
+
+Same play area, speed, steering and collision rules, minus the drawing.
+Match steps one tick at a time for when the inputs arrive live, play()
+plays a whole match from foot_diff streams known up front, which is what
+tuning the steering offline needs:
+
+    python game.py [--matches 1000] [--set steering_gain=6,10,14]
+        [--set dead_zone=0,0.05] [session.stupki ...]
+
+Without sessions every match gets random synthetic streams, with sessions
+each one becomes a match, the primary player steering player B and the
+secondary player A like in index.js.
+
+index.js checks a player's trail collision by filtering the whole combined
+trail for points in a 30x30 box around the head, and if there are more
+than 10, looking for a consecutive pair the head lies (almost) between.
+The head is always the last trail point and the one before it is
+MOVE_DISTANCE behind, so that pair always passes: the rule boils down to
+"more than 10 trail points in the box". Both versions here answer that
+from the grid cells under the box instead of the whole trail.
+"""
+
+import argparse
+import itertools
+import json
+import math
+import time
+
+import numpy as np
+
+PLAY_AREA_WIDTH = 3000
+PLAY_AREA_HEIGHT = 3000
+# how close to the edge counts as out of bounds
+BORDER = 30
+MOVE_DISTANCE = 5
+# degrees of turn per tick for a foot_diff of 1
+STEERING_GAIN = 10
+# trail points closer than this on both axes are near the head
+NEAR = 15
+# more than this many near points is a collision
+MAX_NEAR_POINTS = 10
+# index.js moves every animation frame, i.e. at 60 Hz
+TICK_RATE = 60
+# grid cell size, has to divide 2 * NEAR
+CELL_SIZE = NEAR
+# a box 2 * NEAR wide covers this many cells along each axis
+CELLS_PER_BOX = 2 * NEAR // CELL_SIZE + 1
+
+START_POSITIONS = [
+    (PLAY_AREA_WIDTH / 2 - 500, PLAY_AREA_HEIGHT / 2),
+    (PLAY_AREA_WIDTH / 2 + 500, PLAY_AREA_HEIGHT / 2),
+]
+
+
+def cell_key(cx, cy):
+    # cells are never negative, a player gets there out of bounds first
+    return cx * 65536 + cy
+
+
+class TrailGrid:
+    """Every trail point of a match, bucketed by cell."""
+
+    def __init__(self):
+        # cell key -> [x0, y0, x1, y1, ...]
+        self.cells = {}
+
+    def add(self, x, y):
+        key = cell_key(int(x // CELL_SIZE), int(y // CELL_SIZE))
+        cell = self.cells.get(key)
+        if cell is None:
+            self.cells[key] = [x, y]
+        else:
+            cell.append(x)
+            cell.append(y)
+
+    def count_near(self, x, y, limit):
+        """Points with |dx| and |dy| < NEAR, stops counting past limit."""
+        cx = int((x - NEAR) // CELL_SIZE)
+        cy = int((y - NEAR) // CELL_SIZE)
+        count = 0
+        for dx in range(CELLS_PER_BOX):
+            for dy in range(CELLS_PER_BOX):
+                cell = self.cells.get(cell_key(cx + dx, cy + dy))
+                if cell is None:
+                    continue
+                for i in range(0, len(cell), 2):
+                    if abs(cell[i] - x) < NEAR and abs(cell[i + 1] - y) < NEAR:
+                        count += 1
+                        if count > limit:
+                            return count
+        return count
+
+
+def out_of_bounds(x, y):
+    return (
+        (x > PLAY_AREA_WIDTH - BORDER)
+        | (y > PLAY_AREA_HEIGHT - BORDER)
+        | (x < BORDER)
+        | (y < BORDER)
+    )
+
+
+class Player:
+    __slots__ = ("x", "y", "angle", "trail_length")
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.angle = 0.0
+        self.trail_length = 0
+
+
+class Match:
+    """One round from the start positions, stepped a tick at a time."""
+
+    def __init__(self, n_players=2, steering_gain=STEERING_GAIN, dead_zone=0.0):
+        self.players = [Player(*START_POSITIONS[i]) for i in range(n_players)]
+        self.steering = math.radians(steering_gain)
+        self.dead_zone = dead_zone
+        self.grid = TrailGrid()
+        self.ticks = 0
+        # index of the player that crashed, None while the match is on
+        self.loser = None
+
+    def step(self, foot_diffs):
+        """Advance one tick, foot_diffs per player (None keeps going straight).
+
+        Returns the loser's index once somebody crashed, None otherwise.
+        """
+        for player, foot_diff in zip(self.players, foot_diffs):
+            # updateMove()
+            if foot_diff is not None and abs(foot_diff) > self.dead_zone:
+                player.angle += self.steering * foot_diff
+            player.x += math.cos(player.angle) * MOVE_DISTANCE
+            player.y += math.sin(player.angle) * MOVE_DISTANCE
+            # updateTrail()
+            self.grid.add(player.x, player.y)
+            player.trail_length += 1
+        self.ticks += 1
+        # detectCollisions(), first player first like index.js does
+        for i, player in enumerate(self.players):
+            if player.trail_length < 2:
+                continue
+            near = self.grid.count_near(player.x, player.y, MAX_NEAR_POINTS)
+            if near > MAX_NEAR_POINTS or out_of_bounds(player.x, player.y):
+                self.loser = i
+                return i
+        return None
+
+
+def stack_streams(matches, dead_zone):
+    """(matches, players, frames) foot_diff, 0 where a player goes straight.
+
+    Shorter streams are padded with their last value.
+    """
+    length = max(len(stream) for streams in matches for stream in streams) or 1
+    inputs = np.zeros((len(matches), len(matches[0]), length))
+    for m, streams in enumerate(matches):
+        for i, stream in enumerate(streams):
+            if len(stream):
+                inputs[m, i, : len(stream)] = stream
+                inputs[m, i, len(stream) :] = stream[-1]
+    inputs[np.isnan(inputs) | (np.abs(inputs) <= dead_zone)] = 0.0
+    return inputs
+
+
+def count_near(points, heads):
+    """count_near() for many heads at once.
+
+    points and heads are (x, y, tick, match) arrays, a head only counts
+    points of its own match from ticks up to its own. Points are sorted by
+    cell key and each head looks up the cells under its box, so the
+    work is the points in those cells, not the trails.
+    """
+    xs, ys, ts, ms = points
+    head_x, head_y, head_t, head_m = heads
+    keys = (ms << 32) + cell_key(
+        (xs // CELL_SIZE).astype(np.int64), (ys // CELL_SIZE).astype(np.int64)
+    )
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    cx = ((head_x - NEAR) // CELL_SIZE).astype(np.int64)
+    cy = ((head_y - NEAR) // CELL_SIZE).astype(np.int64)
+    counts = np.zeros(len(head_x), dtype=np.int64)
+    for dx in range(CELLS_PER_BOX):
+        # the cells of one column have consecutive keys, one range covers them
+        key = (head_m << 32) + cell_key(cx + dx, cy)
+        lo = np.searchsorted(sorted_keys, key)
+        lengths = np.searchsorted(sorted_keys, key + CELLS_PER_BOX) - lo
+        total = lengths.sum()
+        if not total:
+            continue
+        owner = np.repeat(np.arange(len(head_x)), lengths)
+        # lo[head], lo[head] + 1, ... for every head
+        offsets = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        found = order[np.repeat(lo, lengths) + offsets]
+        near = (
+            (np.abs(xs[found] - head_x[owner]) < NEAR)
+            & (np.abs(ys[found] - head_y[owner]) < NEAR)
+            & (ts[found] <= head_t[owner])
+        )
+        counts += np.bincount(owner[near], minlength=len(head_x))
+    return counts
+
+
+def play_many(
+    matches,
+    stream_rate=30,
+    max_ticks=20000,
+    steering_gain=STEERING_GAIN,
+    dead_zone=0.0,
+    chunk=128,
+):
+    """Play matches, each a list of per player foot_diff streams.
+
+    Same results as stepping a Match per match, but since nobody's steering
+    depends on anybody else, every trajectory of every match still on gets
+    worked out with numpy a chunk of ticks at a time. Streams are at
+    stream_rate, NaN means no foot_diff for that frame and a stream that
+    runs out holds its last value. All matches need the same number of
+    players. Returns (loser, ticks) per match, loser None if nobody crashed
+    within max_ticks.
+    """
+    if not matches:
+        return []
+    inputs = stack_streams(matches, dead_zone)
+    n_players = inputs.shape[1]
+    steering = math.radians(steering_gain)
+    results = [(None, max_ticks)] * len(matches)
+    live = np.arange(len(matches))
+    # position and angle after the last tick so far, per live match and player
+    x = np.tile([START_POSITIONS[i][0] for i in range(n_players)], (len(live), 1))
+    y = np.tile([START_POSITIONS[i][1] for i in range(n_players)], (len(live), 1))
+    angle = np.zeros_like(x)
+    # trail points of the live matches as (x, y, tick, match)
+    points = [np.zeros(0), np.zeros(0), np.zeros(0, np.int64), np.zeros(0, np.int64)]
+    start = 0
+    while start < max_ticks and len(live):
+        ticks = np.arange(start, min(start + chunk, max_ticks))
+        frames = np.minimum(
+            (ticks * (stream_rate / TICK_RATE)).astype(np.int64), inputs.shape[2] - 1
+        )
+        turns = steering * inputs[live][:, :, frames]
+        # the running sums start from the previous chunk's values, adding
+        # them in the same order as Match.step() gives the same floats
+        angles = np.cumsum(np.concatenate([angle[..., None], turns], axis=2), axis=2)
+        angles = angles[..., 1:]
+        steps = np.cos(angles) * MOVE_DISTANCE
+        chunk_x = np.cumsum(np.concatenate([x[..., None], steps], axis=2), axis=2)
+        chunk_x = chunk_x[..., 1:]
+        steps = np.sin(angles) * MOVE_DISTANCE
+        chunk_y = np.cumsum(np.concatenate([y[..., None], steps], axis=2), axis=2)
+        chunk_y = chunk_y[..., 1:]
+        angle, x, y = angles[..., -1], chunk_x[..., -1], chunk_y[..., -1]
+
+        shape = chunk_x.shape
+        heads = (
+            chunk_x.ravel(),
+            chunk_y.ravel(),
+            np.broadcast_to(ticks, shape).ravel(),
+            np.broadcast_to(live[:, None, None], shape).ravel(),
+        )
+        points = [np.concatenate(pair) for pair in zip(points, heads)]
+        near = count_near(points, heads).reshape(shape)
+        crashed = ((near > MAX_NEAR_POINTS) & (ticks >= 1)) | out_of_bounds(
+            chunk_x, chunk_y
+        )
+        # first crashing tick per player, ties go to the first player
+        first = np.where(crashed.any(axis=2), crashed.argmax(axis=2), len(ticks))
+        losers = first.argmin(axis=1)
+        done = crashed.any(axis=(1, 2))
+        for m, loser in zip(np.flatnonzero(done), losers[done]):
+            results[live[m]] = (int(loser), start + int(first[m, loser]) + 1)
+        if done.any():
+            live, x, y, angle = live[~done], x[~done], y[~done], angle[~done]
+            keep = np.isin(points[3], live)
+            points = [column[keep] for column in points]
+        start += len(ticks)
+    for m in live:
+        results[m] = (None, start)
+    return results
+
+
+def play(streams, stream_rate=30, **match_args):
+    """Play one match, see play_many()."""
+    return play_many([streams], stream_rate, **match_args)[0]
+
+
+def synthetic_stream(rng, n_frames, raise_every=45, amplitude=0.3, noise=0.02):
+    """foot_diff of somebody raising one foot or the other now and then."""
+    values = np.zeros(n_frames)
+    frame = int(rng.integers(0, raise_every))
+    while frame < n_frames:
+        length = int(rng.integers(8, 30))
+        side = rng.choice([-1, 1])
+        values[frame : frame + length] = side * amplitude * rng.uniform(0.5, 1.0)
+        frame += length + int(rng.integers(raise_every // 2, raise_every * 2))
+    return values + rng.normal(0, noise, n_frames)
+
+
+def session_streams(path):
+    """(streams, stream_rate) of the two players in a recorded session.
+
+    Runs it through the same tracking and player selection as the server,
+    so the streams are what index.js would have been sent.
+    """
+    # imported here, the server should be able to use this module too
+    import sweep
+    from pose_backends import make_backend
+
+    backend = make_backend("replay", path=path)
+    session = sweep.new_arena(backend.frame_size)
+    times = []
+    # [player A, player B] = [secondary, primary]
+    streams = ([], [])
+    for points, confidences in backend.frames():
+        session.process_frame(points, confidences, backend.t)
+        times.append(backend.t)
+        for stream, player in zip(streams, session.snapshot.players[1::-1]):
+            foot_diff = player.foot_diff if player is not None else None
+            stream.append(np.nan if foot_diff is None else foot_diff)
+    backend.close()
+    duration = times[-1] - times[0] if len(times) > 1 else 0
+    stream_rate = (len(times) - 1) / duration if duration > 0 else 30
+    return [np.array(stream) for stream in streams], stream_rate
+
+
+def run(matches, params):
+    losers = [0, 0, 0]
+    ticks = []
+    start = time.perf_counter()
+    # sessions can each have their own rate, synthetic matches all share one
+    for stream_rate in set(rate for _, rate in matches):
+        group = [streams for streams, rate in matches if rate == stream_rate]
+        for loser, n_ticks in play_many(group, stream_rate, **params):
+            losers[2 if loser is None else loser] += 1
+            ticks.append(n_ticks)
+    elapsed = time.perf_counter() - start
+    return {
+        "params": params,
+        "matches": len(matches),
+        "matches_per_second": round(len(matches) / max(elapsed, 1e-9), 1),
+        "a_lost": losers[0],
+        "b_lost": losers[1],
+        "unfinished": losers[2],
+        "mean_seconds": round(float(np.mean(ticks)) / TICK_RATE, 2),
+    }
+
+
+def main():
+    # imported here, sweep.py pulls in the whole server
+    from sweep import parse_set
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sessions", nargs="*")
+    parser.add_argument("--matches", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--set", type=parse_set, action="append", default=[])
+    args = parser.parse_args()
+
+    if args.sessions:
+        matches = [session_streams(path) for path in args.sessions]
+    else:
+        rng = np.random.default_rng(args.seed)
+        # a minute of foot_diff per player is more than any match lasts
+        matches = [
+            ([synthetic_stream(rng, 30 * 60) for _ in range(2)], 30)
+            for _ in range(args.matches)
+        ]
+    names = [name for name, _ in args.set]
+    for values in itertools.product(*(values for _, values in args.set)):
+        print(json.dumps(run(matches, dict(zip(names, values)))), flush=True)
+
+
+if __name__ == "__main__":
+    main()
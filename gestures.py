@@ -0,0 +1,94 @@
+"""Discrete foot events of a player, for clients that don't want every foot_diff.
+
+A GestureDetector follows one track's foot_diff and turns it into
+
+    foot_raised    side "left" or "right", the foot joint of that side is
+                   the higher one by more than GESTURE_RAISE bbox heights
+    feet_level     both feet within GESTURE_LEVEL of each other again
+    start_gesture  side as above, a foot raised after the feet were level
+                   for at least GESTURE_START_LEVEL seconds
+
+Between GESTURE_LEVEL and GESTURE_RAISE nothing changes, that band is the
+hysteresis that keeps a foot hovering around one threshold from flapping
+between raised and level. A new state also has to hold for GESTURE_HOLD
+seconds before its event goes out, so a single noisy frame never makes one.
+Frames without a foot_diff leave everything as it is.
+
+player_entered / player_left come from the player slots, see
+Arena.publish_gestures().
+"""
+
+import os
+
+# bbox heights the feet have to be apart for foot_raised
+GESTURE_RAISE = float(os.environ.get("STUPKI_GESTURE_RAISE", "0.15"))
+# and how close they have to come back for feet_level
+GESTURE_LEVEL = float(os.environ.get("STUPKI_GESTURE_LEVEL", "0.08"))
+# seconds a new state has to hold before it counts
+GESTURE_HOLD = float(os.environ.get("STUPKI_GESTURE_HOLD", "0.1"))
+# seconds of level feet before a raise counts as start_gesture
+GESTURE_START_LEVEL = float(os.environ.get("STUPKI_GESTURE_START_LEVEL", "0.5"))
+
+
+class GestureDetector:
+    """Foot events of one track, fed once per frame."""
+
+    def __init__(
+        self,
+        raise_threshold=GESTURE_RAISE,
+        level_threshold=GESTURE_LEVEL,
+        hold=GESTURE_HOLD,
+        start_level=GESTURE_START_LEVEL,
+    ):
+        self.raise_threshold = raise_threshold
+        self.level_threshold = level_threshold
+        self.hold = hold
+        self.start_level = start_level
+        # "level", "left" or "right" as last confirmed, None before that
+        self.state = None
+        # state seen since candidate_since that isn't confirmed yet
+        self.candidate = None
+        self.candidate_since = None
+        # when the feet went level, if that is the confirmed state
+        self.level_since = None
+
+    def classify(self, foot_diff):
+        # foot_diff is left foot y - right foot y in image rows, which go
+        # down, so the left foot is the higher one when it's negative
+        if foot_diff <= -self.raise_threshold:
+            return "left"
+        if foot_diff >= self.raise_threshold:
+            return "right"
+        if abs(foot_diff) < self.level_threshold:
+            return "level"
+        return self.state
+
+    def update(self, foot_diff, t):
+        """[(event, side)] confirmed by this frame, side None for feet_level.
+
+        foot_diff is None on frames where the track had none.
+        """
+        if foot_diff is None:
+            return []
+        observed = self.classify(foot_diff)
+        if observed is None or observed == self.state:
+            self.candidate = None
+            return []
+        if observed != self.candidate:
+            self.candidate = observed
+            self.candidate_since = t
+        if t - self.candidate_since < self.hold:
+            return []
+
+        # the state changed when it was first seen, not when the hold ran out
+        changed_at = self.candidate_since
+        level_since = self.level_since if self.state == "level" else None
+        self.state = observed
+        self.candidate = None
+        if observed == "level":
+            self.level_since = changed_at
+            return [("feet_level", None)]
+        events = [("foot_raised", observed)]
+        if level_since is not None and changed_at - level_since >= self.start_level:
+            events.append(("start_gesture", observed))
+        return events
@@ -0,0 +1,180 @@
+"""Pose detection in worker processes, frames passed through shared memory.
+
+Frames get copied into a ring of slots in one multiprocessing.shared_memory
+block and only (seq, slot) goes through the task queue, so pixels are never
+pickled. Every slot can hold a frame in flight. Workers finish in whatever
+order they finish, results get put back in submit order before on_result
+sees them, so the tracker never goes back in time.
+
+Workers are spawned, not forked (Vision and fork don't mix), so
+backend_factory has to be a picklable module level callable and the module
+it lives in gets imported again in every worker.
+"""
+
+import math
+import multiprocessing
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from pose_backends import empty_points
+
+
+class FrameRing:
+    """n_slots frames of one shape in a shared memory block."""
+
+    def __init__(self, shape, n_slots, dtype=np.uint8, name=None):
+        self.shape = tuple(shape)
+        self.n_slots = n_slots
+        self.dtype = np.dtype(dtype)
+        size = n_slots * math.prod(self.shape) * self.dtype.itemsize
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.array = np.ndarray(
+            (n_slots,) + self.shape, dtype=self.dtype, buffer=self.shm.buf
+        )
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def slot(self, i):
+        return self.array[i]
+
+    def close(self):
+        # the numpy view has to go before the buffer can be released
+        del self.array
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def worker_main(ring_name, shape, n_slots, tasks, results, backend_factory):
+    ring = FrameRing(shape, n_slots, name=ring_name)
+    backend = backend_factory()
+    # only RoiBackend cares where to look
+    set_regions = getattr(backend, "set_regions", None)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        seq, slot, regions = task
+        started = time.monotonic()
+        try:
+            if set_regions is not None:
+                set_regions(regions)
+            points, confidences = backend.detect_array(ring.slot(slot))
+        except Exception as e:
+            print(f"Inference worker failed on frame {seq}: {e!r}")
+            points, confidences = empty_points(0), np.zeros(0, dtype=np.float32)
+        results.put((seq, slot, started, time.monotonic(), points, confidences))
+    backend.close()
+    ring.close()
+
+
+class InferencePool:
+    """Runs backend_factory() backends in worker processes.
+
+    on_result(meta, started, ended, (points, confidences)) gets called from
+    a collector thread, in the order the frames were submitted. started and
+    ended are the worker's time.monotonic(), which is the same clock as
+    ours.
+    """
+
+    def __init__(self, frame_shape, workers, backend_factory, on_result, slots=None):
+        context = multiprocessing.get_context("spawn")
+        self.workers = workers
+        self.on_result = on_result
+        n_slots = slots or workers * 2
+        self.ring = FrameRing(frame_shape, n_slots)
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        self.lock = threading.Lock()
+        self.free_slots = list(range(n_slots))
+        # seq -> meta of frames in flight
+        self.pending = {}
+        # seq -> result that came back before an earlier frame did
+        self.finished = {}
+        self.next_seq = 0
+        self.next_result = 0
+        self.dropped = 0
+        self.processes = [
+            context.Process(
+                target=worker_main,
+                args=(
+                    self.ring.name,
+                    self.ring.shape,
+                    n_slots,
+                    self.tasks,
+                    self.results,
+                    backend_factory,
+                ),
+                name=f"inference-{i}",
+                daemon=True,
+            )
+            for i in range(workers)
+        ]
+        for process in self.processes:
+            process.start()
+        self.collector = threading.Thread(
+            target=self.collect, name="inference-results", daemon=True
+        )
+        self.collector.start()
+
+    def in_flight(self):
+        with self.lock:
+            return len(self.pending)
+
+    def submit(self, frame, meta, regions=None):
+        """Queue frame for detection, False if every slot is busy."""
+        with self.lock:
+            if not self.free_slots:
+                self.dropped += 1
+                return False
+            slot = self.free_slots.pop()
+            seq = self.next_seq
+            self.next_seq += 1
+            self.pending[seq] = meta
+        self.ring.slot(slot)[...] = frame
+        self.tasks.put((seq, slot, regions))
+        return True
+
+    def collect(self):
+        while True:
+            try:
+                item = self.results.get(timeout=1.0)
+            except queue.Empty:
+                if self.pending and not any(p.is_alive() for p in self.processes):
+                    print("All inference workers are gone")
+                    return
+                continue
+            if item is None:
+                return
+            seq, slot, started, ended, points, confidences = item
+            ready = []
+            with self.lock:
+                self.free_slots.append(slot)
+                self.finished[seq] = (started, ended, (points, confidences))
+                while self.next_result in self.finished:
+                    result = self.finished.pop(self.next_result)
+                    ready.append((self.pending.pop(self.next_result),) + result)
+                    self.next_result += 1
+            for meta, started, ended, detection in ready:
+                self.on_result(meta, started, ended, detection)
+
+    def close(self):
+        for _ in self.processes:
+            self.tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.results.put(None)
+        self.collector.join(timeout=5)
+        self.ring.close()
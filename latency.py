@@ -0,0 +1,156 @@
+"""Where the time goes between the camera and the screen.
+
+Every captured frame gets a FrameTimes with a sequence id, and each step
+that touches it stamps a time.monotonic() time on it, in STAGES order.
+LatencyStats turns finished frames into per-step histograms, so a frame
+that skipped detection simply has no detect_* stamps. Screens report back
+when they received and rendered the players message of a frame, those
+reports add the last two steps after the frame is done on our side.
+"""
+
+import bisect
+import collections
+import threading
+import time
+
+STAGES = [
+    "capture",
+    "detect_start",
+    "detect_end",
+    "filtered",
+    "tracked",
+    "selected",
+    "broadcast",
+    "client_receive",
+    "client_render",
+]
+# histogram bucket upper bounds in milliseconds, the last bucket is open
+BUCKETS_MS = [1, 2, 5, 10, 20, 35, 50, 75, 100, 150, 200, 300, 500, 1000]
+# latencies kept per step for the percentiles
+SAMPLES = 1000
+# finished frames kept around for client reports to find
+RECENT_FRAMES = 256
+
+
+class FrameTimes:
+    __slots__ = ("seq", "stamps")
+
+    def __init__(self, seq):
+        self.seq = seq
+        self.stamps = {"capture": time.monotonic()}
+
+    @property
+    def captured_at(self):
+        return self.stamps["capture"]
+
+    def stamp(self, stage, t=None):
+        self.stamps[stage] = time.monotonic() if t is None else t
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.total_ms = 0.0
+        self.samples = collections.deque(maxlen=SAMPLES)
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.total_ms += ms
+        self.samples.append(ms)
+
+    def percentile(self, p):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+    def to_dict(self):
+        count = sum(self.counts)
+        return {
+            "count": count,
+            "mean_ms": self.total_ms / count if count else None,
+            "p50_ms": self.percentile(0.5),
+            "p99_ms": self.percentile(0.99),
+            "buckets": [[le, n] for le, n in zip(BUCKETS_MS + [None], self.counts)],
+        }
+
+
+class LatencyStats:
+    """Thread-safe, frames come from the frame loop, reports from the IOLoop."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.next_seq = 0
+        # "capture->detect_start" etc., plus "capture->broadcast" and
+        # "capture->client_render" end to end
+        self.histograms = collections.defaultdict(Histogram)
+        # stage -> recent stamp times, for the per-stage fps
+        self.recent = collections.defaultdict(lambda: collections.deque(maxlen=256))
+        self.frames = collections.OrderedDict()
+
+    def new_frame(self):
+        with self.lock:
+            self.next_seq += 1
+            return FrameTimes(self.next_seq)
+
+    def _add_interval(self, name, start, end):
+        self.histograms[name].add((end - start) * 1000)
+
+    def frame_done(self, times):
+        """Call once the frame's players message is queued for broadcast."""
+        with self.lock:
+            previous = None
+            for stage in STAGES:
+                t = times.stamps.get(stage)
+                if t is None:
+                    continue
+                self.recent[stage].append(t)
+                if previous is not None:
+                    self._add_interval(f"{previous[0]}->{stage}", previous[1], t)
+                previous = (stage, t)
+            if "broadcast" in times.stamps:
+                self._add_interval(
+                    "capture->broadcast", times.captured_at, times.stamps["broadcast"]
+                )
+            self.frames[times.seq] = times
+            while len(self.frames) > RECENT_FRAMES:
+                self.frames.popitem(last=False)
+
+    def client_report(self, seq, receive_to_render):
+        """A screen rendered frame seq receive_to_render seconds after getting it.
+
+        The report is sent right after rendering and on localhost the trip
+        back is negligible, so its arrival is taken as the render time.
+        """
+        rendered_at = time.monotonic()
+        with self.lock:
+            times = self.frames.get(seq)
+            if times is None or "broadcast" not in times.stamps:
+                return
+            received_at = rendered_at - receive_to_render
+            self._add_interval(
+                "broadcast->client_receive", times.stamps["broadcast"], received_at
+            )
+            self._add_interval(
+                "client_receive->client_render", received_at, rendered_at
+            )
+            self._add_interval("capture->client_render", times.captured_at, rendered_at)
+            self.recent["client_render"].append(rendered_at)
+
+    def fps(self):
+        result = {}
+        for stage, stamps in self.recent.items():
+            if len(stamps) > 1 and stamps[-1] > stamps[0]:
+                result[stage] = (len(stamps) - 1) / (stamps[-1] - stamps[0])
+        return result
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "frames": self.next_seq,
+                "fps": self.fps(),
+                "latency": {
+                    name: histogram.to_dict()
+                    for name, histogram in self.histograms.items()
+                },
+            }
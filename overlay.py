@@ -0,0 +1,119 @@
+"""Debug overlay drawn straight onto the BGR camera frame with cv2.
+
+The frame loop only collects what to draw into an Overlay (a handful of
+tuples per person) on the frames where somebody will actually look at the
+result; render() does the drawing afterwards on a copy of the frame.
+"""
+
+import cv2
+import numpy as np
+
+# BGR
+RED = (0, 0, 255)
+BLACK = (0, 0, 0)
+MAGENTA = (255, 0, 255)
+GREEN = (0, 255, 0)
+BLUE = (255, 0, 0)
+PINK = (130, 0, 255)
+
+JPEG_QUALITY = 70
+
+
+class Overlay:
+    def __init__(self):
+        # (box, is_valid) for every detected person
+        self.boxes = []
+        # boxes that just started a new track
+        self.new_tracks = []
+        # (x, y, text)
+        self.labels = []
+        self.foot_boxes = []
+
+
+def _int_box(box):
+    return tuple(int(round(v)) for v in box)
+
+
+def fill_rect(frame, box, color, alpha):
+    height, width = frame.shape[:2]
+    x0, y0, x1, y1 = _int_box(box)
+    x0, y0 = max(x0, 0), max(y0, 0)
+    x1, y1 = min(x1, width), min(y1, height)
+    if x1 <= x0 or y1 <= y0:
+        return
+    roi = frame[y0:y1, x0:x1]
+    solid = np.empty_like(roi)
+    solid[:] = color
+    cv2.addWeighted(solid, alpha, roi, 1 - alpha, 0, dst=roi)
+
+
+def draw_history(frame, track):
+    centers = np.array(
+        [(state.bb_center_x, state.bb_center_y) for state in track.last_states],
+        dtype=np.int32,
+    )
+    if len(centers) < 2:
+        return
+    cv2.polylines(frame, [centers], False, BLUE, 3)
+    for x, y in centers[1:]:
+        cv2.circle(frame, (int(x), int(y)), 10, BLUE, -1)
+
+
+def draw_calibration(frame, calibration_config):
+    height, width = frame.shape[:2]
+    # min bb height as a line top right, min bb width bottom left
+    cv2.line(
+        frame,
+        (width - 10, 0),
+        (width - 10, int(calibration_config["min_bb_height"])),
+        BLACK,
+        3,
+    )
+    cv2.line(
+        frame,
+        (0, height - 10),
+        (int(calibration_config["min_bb_width"]), height - 10),
+        BLACK,
+        3,
+    )
+    # deadzones
+    fill_rect(frame, (0, 0, calibration_config["left_deadzone"], height), BLACK, 0.4)
+    fill_rect(
+        frame,
+        (width - calibration_config["right_deadzone"], 0, width, height),
+        BLACK,
+        0.4,
+    )
+
+
+def render(frame, overlay, tracks, calibration_config):
+    """Copy of frame with the overlay, calibration and track history on it."""
+    out = frame.copy()
+    for track in tracks:
+        draw_history(out, track)
+    draw_calibration(out, calibration_config)
+    for box, is_valid in overlay.boxes:
+        x0, y0, x1, y1 = _int_box(box)
+        cv2.rectangle(out, (x0, y0), (x1, y1), RED if is_valid else BLACK, 3)
+    for box in overlay.new_tracks:
+        fill_rect(out, box, GREEN, 0.4)
+    for x, y, text in overlay.labels:
+        cv2.putText(
+            out,
+            text,
+            (int(x), int(y) + 30),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            1.2,
+            MAGENTA,
+            2,
+            cv2.LINE_AA,
+        )
+    for box in overlay.foot_boxes:
+        x0, y0, x1, y1 = _int_box(box)
+        cv2.rectangle(out, (x0, y0), (x1, y1), PINK, 2)
+    return out
+
+
+def encode_jpeg(frame):
+    ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    return jpeg.tobytes() if ok else None
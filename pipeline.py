@@ -0,0 +1,178 @@
+"""Tiny threaded pipeline: stages connected by latest-frame queues.
+
+Every queue is bounded and throws away the oldest item when it is full, so
+a slow stage always picks up the newest frame instead of working through a
+backlog of stale ones.
+"""
+
+import collections
+import math
+import threading
+import time
+
+
+class LatestQueue:
+    def __init__(self, maxsize=1):
+        self.items = collections.deque(maxlen=maxsize)
+        self.cond = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, item):
+        with self.cond:
+            if len(self.items) == self.items.maxlen:
+                self.dropped += 1
+            self.items.append(item)
+            self.cond.notify()
+
+    def get(self, timeout=None):
+        """Oldest item still queued, None on timeout or once closed and empty."""
+        with self.cond:
+            if not self.items and not self.closed:
+                self.cond.wait(timeout)
+            if not self.items:
+                return None
+            return self.items.popleft()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+class StageCounter:
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.busy_time = 0.0
+        self.last_count = 0
+        self.last_report = time.monotonic()
+
+    def add(self, busy_time):
+        self.count += 1
+        self.busy_time += busy_time
+
+    def fps(self):
+        """Items per second since the previous call."""
+        now = time.monotonic()
+        elapsed = now - self.last_report
+        fps = (self.count - self.last_count) / elapsed if elapsed > 0 else 0.0
+        self.last_count = self.count
+        self.last_report = now
+        return fps
+
+
+class Stage(threading.Thread):
+    """Runs fn on every item from inbox, puts the result in outbox.
+
+    fn returning None means "nothing to pass on". A stage without an inbox is
+    a source and calls fn(None) in a loop until it returns StopIteration.
+    """
+
+    def __init__(self, name, fn, inbox=None, outbox=None):
+        super().__init__(name=name, daemon=True)
+        self.fn = fn
+        self.inbox = inbox
+        self.outbox = outbox
+        self.counter = StageCounter(name)
+        self.running = True
+
+    def run(self):
+        try:
+            self.loop()
+        finally:
+            # also when fn raised, so the stages after this one and whoever
+            # waits on the last outbox see the pipeline end
+            if self.outbox is not None:
+                self.outbox.close()
+
+    def loop(self):
+        while self.running:
+            item = None
+            if self.inbox is not None:
+                item = self.inbox.get(timeout=0.1)
+                if item is None:
+                    if self.inbox.closed:
+                        break
+                    continue
+            start = time.perf_counter()
+            result = self.fn(item)
+            if result is StopIteration:
+                break
+            self.counter.add(time.perf_counter() - start)
+            if result is not None and self.outbox is not None:
+                self.outbox.put(result)
+
+    def stop(self):
+        self.running = False
+
+
+class InferenceScheduler:
+    """Picks the captured frames that go through detection.
+
+    Detection runs on every nth frame, with n picked from the measured
+    detection latency so that detection keeps up with target_fps, the
+    frames in between only get interpolated. A frame that comes due while
+    max_in_flight detections are still running gets interpolated as well.
+    """
+
+    def __init__(self, target_fps, max_every=8, max_in_flight=1):
+        self.frame_budget = 1.0 / target_fps
+        self.max_every = max_every
+        self.max_in_flight = max_in_flight
+        self.every = 1
+        self.latency = None
+        self.since_detection = 0
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self.detected = 0
+        self.interpolated = 0
+
+    def should_detect(self):
+        """Call once per captured frame."""
+        with self.lock:
+            self.since_detection += 1
+            busy = self.in_flight >= self.max_in_flight
+            if busy or self.since_detection < self.every:
+                self.interpolated += 1
+                return False
+            self.since_detection = 0
+            self.in_flight += 1
+            self.detected += 1
+            return True
+
+    def done(self, latency):
+        """Call when a detection finished, with how long it took."""
+        with self.lock:
+            self.in_flight -= 1
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += 0.2 * (latency - self.latency)
+            # max_in_flight detections share the work
+            needed = self.latency / (self.frame_budget * self.max_in_flight)
+            # some slack before going back down so n doesn't flip every frame
+            if needed > self.every:
+                self.every = min(math.ceil(needed), self.max_every)
+            elif needed < (self.every - 1) * 0.8:
+                self.every -= 1
+
+    def detection_interval(self):
+        """Roughly the seconds from one detected frame's capture to the next."""
+        return self.every * self.frame_budget
+
+    def format_stats(self):
+        return (
+            f"detecting every {self.every} frames,"
+            f" {self.detected} detected, {self.interpolated} interpolated"
+        )
+
+
+def format_stats(counters, queues):
+    parts = []
+    for counter in counters:
+        busy_ms = counter.busy_time / counter.count * 1000 if counter.count else 0.0
+        parts.append(f"{counter.name} {counter.fps():.1f} fps {busy_ms:.1f} ms")
+    for name, q in queues.items():
+        parts.append(f"{name} dropped {q.dropped}")
+    return ", ".join(parts)
@@ -0,0 +1,231 @@
+"""Pose backends.
+
+A backend turns a camera frame into a plain list of observations:
+
+    [
+        {
+            "confidence": 0.87,
+            "joints": {"left_foot_joint": (x, y, confidence), ...},
+        },
+        ...
+    ]
+
+x and y are normalized like Vision does it (0..1, origin bottom left), so
+everything after detection does not care where the points came from.
+
+The hot path uses detect_array() instead, which packs the same data into
+one (people, len(JOINT_NAMES), 3) float array of [x, y, confidence] with
+NaN for joints that were not reported, plus a (people,) confidence array.
+
+Sessions are stored as JSON lines: a header line with the frame size and
+then one line per frame.
+
+    {"type": "session", "width": 1280, "height": 720}
+    {"type": "frame", "t": 0.033, "observations": [...]}
+
+Paths ending in .stupki use the binary format from session_file.py instead.
+"""
+
+import json
+import time
+
+import numpy as np
+
+JOINT_NAMES = [
+    "head_joint",
+    "left_eye_joint",
+    "right_eye_joint",
+    "left_ear_joint",
+    "right_ear_joint",
+    "neck_1_joint",
+    "left_shoulder_1_joint",
+    "right_shoulder_1_joint",
+    "left_forearm_joint",
+    "right_forearm_joint",
+    "left_hand_joint",
+    "right_hand_joint",
+    "root",
+    "left_upLeg_joint",
+    "right_upLeg_joint",
+    "left_leg_joint",
+    "right_leg_joint",
+    "left_foot_joint",
+    "right_foot_joint",
+]
+JOINT_INDEX = {name: i for i, name in enumerate(JOINT_NAMES)}
+
+LEFT_FOOT = JOINT_INDEX["left_foot_joint"]
+RIGHT_FOOT = JOINT_INDEX["right_foot_joint"]
+# Vision calls the knee "leg"
+LEFT_KNEE = JOINT_INDEX["left_leg_joint"]
+
+
+def empty_points(n_people):
+    return np.full((n_people, len(JOINT_NAMES), 3), np.nan)
+
+
+def observations_to_array(observations):
+    points = empty_points(len(observations))
+    confidences = np.zeros(len(observations), dtype=np.float32)
+    for i, obs in enumerate(observations):
+        confidences[i] = obs["confidence"]
+        for name, point in obs["joints"].items():
+            j = JOINT_INDEX.get(name)
+            if j is not None:
+                points[i, j] = point
+    return points, confidences
+
+
+def array_to_observations(points, confidences):
+    observations = []
+    for person, confidence in zip(points, confidences):
+        joints = {
+            JOINT_NAMES[j]: tuple(float(v) for v in person[j])
+            for j in range(len(JOINT_NAMES))
+            if not np.isnan(person[j, 0])
+        }
+        observations.append({"confidence": float(confidence), "joints": joints})
+    return observations
+
+
+class PoseBackend:
+    # frame size the observations are relative to, None if it comes from
+    # the camera frame itself
+    frame_size = None
+
+    def detect(self, frame):
+        """Return the list of observations for a BGR numpy frame."""
+        raise NotImplementedError
+
+    def detect_array(self, frame):
+        """Return (points, confidences) for a BGR numpy frame."""
+        return observations_to_array(self.detect(frame))
+
+    def close(self):
+        pass
+
+
+class ReplayBackend(PoseBackend):
+    """Streams a recorded session from disk, ignores the frame it is given."""
+
+    def __init__(self, path, loop=False):
+        self.path = path
+        self.loop = loop
+        self.file = open(path, "r")
+        header = json.loads(self.file.readline())
+        if header.get("type") != "session":
+            raise ValueError(f"{path} is not a recorded session")
+        self.frame_size = (header["width"], header["height"])
+        self.data_start = self.file.tell()
+        self.finished = False
+        # session time of the frame read last
+        self.t = None
+
+    def next_frame(self):
+        line = self.file.readline()
+        if not line and self.loop:
+            self.file.seek(self.data_start)
+            line = self.file.readline()
+        if not line:
+            self.finished = True
+            return None
+        parsed = json.loads(line)
+        self.t = parsed["t"]
+        return parsed
+
+    def detect(self, frame=None):
+        parsed = self.next_frame()
+        if parsed is None:
+            return []
+        return parsed["observations"]
+
+    def frames(self):
+        """Yield (points, confidences) until the recording runs out."""
+        while True:
+            observations = self.detect()
+            if self.finished:
+                return
+            yield observations_to_array(observations)
+
+    def close(self):
+        self.file.close()
+
+
+class RecordingBackend(PoseBackend):
+    """Wraps another backend and writes everything it detects to a session.
+
+    image_width: binary sessions only, also keep the camera frames scaled
+    down to this width
+    """
+
+    def __init__(self, backend, path, image_width=0):
+        # backend can be None if detection happens elsewhere and results
+        # only come in through record()
+        self.backend = backend
+        self.frame_size = backend.frame_size if backend is not None else None
+        self.file = None
+        self.writer = None
+        if path.endswith(".stupki"):
+            from session_file import SessionWriter
+
+            self.writer = SessionWriter(path, image_width=image_width)
+        else:
+            self.file = open(path, "w")
+        self.start = None
+
+    def detect(self, frame):
+        return array_to_observations(*self.detect_array(frame))
+
+    def detect_array(self, frame):
+        points, confidences = self.backend.detect_array(frame)
+        self.record(frame, points, confidences)
+        return points, confidences
+
+    def record(self, frame, points, confidences):
+        if self.writer is not None:
+            if self.start is None:
+                self.start = time.monotonic()
+            t = round(time.monotonic() - self.start, 4)
+            self.writer.write(t, points, confidences, frame)
+            return
+        observations = array_to_observations(points, confidences)
+        if self.start is None:
+            # the frame size is only known once the first frame shows up
+            self.start = time.monotonic()
+            height, width = frame.shape[:2]
+            self.file.write(
+                json.dumps({"type": "session", "width": width, "height": height}) + "\n"
+            )
+        self.file.write(
+            json.dumps(
+                {
+                    "type": "frame",
+                    "t": round(time.monotonic() - self.start, 4),
+                    "observations": observations,
+                }
+            )
+            + "\n"
+        )
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        else:
+            self.file.close()
+        if self.backend is not None:
+            self.backend.close()
+
+
+def make_backend(name, **kwargs):
+    if name == "vision":
+        # macOS only, so only import it when someone asks for it
+        from vision_backend import VisionBackend
+
+        return VisionBackend(**kwargs)
+    if name == "replay":
+        if kwargs["path"].endswith(".stupki"):
+            from session_file import MappedReplayBackend
+
+            return MappedReplayBackend(**kwargs)
+        return ReplayBackend(**kwargs)
+    raise ValueError(f"unknown pose backend {name}")
@@ -0,0 +1,194 @@
+"""Binary players protocol, version 3.
+
+Clients opt in by asking for the SUBPROTOCOL websocket subprotocol,
+everyone else keeps getting the JSON players messages. Only those are
+replaced, every other JSON message (calibration replies and such) still
+comes to binary clients as a text frame on the same socket.
+
+Server -> client, little endian:
+
+    header  u8 version, u8 type (FULL or DELTA), u32 seq, u32 base_seq,
+            u32 camera frame id, u8 number of slots, u8 number of slot entries
+    entry   u8 slot, u8 flags, u16 player id,
+            i16 foot_diff * FOOT_DIFF_SCALE
+            followed by the 36 byte track uuid if flags has FLAG_UUID
+
+FLAG_INTERPOLATED marks a foot_diff extrapolated from the track's history
+on a frame that skipped detection, instead of one measured on it.
+
+The number of slots is however many players the server picks (see
+slots.py), 2 unless it runs with STUPKI_PLAYERS. A FULL message lists every
+slot. A DELTA lists only the slots that differ
+from the state the client acknowledged as base_seq. The frame id is the
+camera frame the state comes from, clients report render times against it
+(see latency.py). Client -> server acks are 5 bytes: u8 ACK, u32 seq of
+the message it just applied.
+"""
+
+import struct
+import threading
+
+PROTOCOL_VERSION = 3
+SUBPROTOCOL = "stupki.players.v3"
+
+MSG_FULL = 1
+MSG_DELTA = 2
+MSG_ACK = 3
+
+FLAG_PRESENT = 1
+FLAG_FOOT_DIFF = 2
+FLAG_UUID = 4
+FLAG_INTERPOLATED = 8
+
+# foot_diff goes out as an int16, this gives 0.0001 steps up to +-3.27
+FOOT_DIFF_SCALE = 10000
+# if a client falls this far behind on acks it gets a full message again
+MAX_UNACKED = 64
+
+HEADER = struct.Struct("<BBIIIBB")
+ENTRY = struct.Struct("<BBHh")
+ACK = struct.Struct("<BI")
+UUID_LEN = 36
+
+EMPTY_SLOT = (0, 0, 0, None)
+
+
+class PlayerIds:
+    """Hands out small ints for track uuids."""
+
+    def __init__(self):
+        self.ids = {}
+        self.next_id = 1
+
+    def get(self, track_uuid):
+        player_id = self.ids.get(track_uuid)
+        if player_id is None:
+            player_id = self.next_id
+            self.next_id = self.next_id % 0xFFFF + 1
+            self.ids[track_uuid] = player_id
+        return player_id
+
+    def forget_except(self, track_uuids):
+        self.ids = {k: v for k, v in self.ids.items() if k in track_uuids}
+
+
+def quantize_foot_diff(foot_diff):
+    q = int(round(foot_diff * FOOT_DIFF_SCALE))
+    return max(-32768, min(32767, q))
+
+
+def slot_state(track_uuid, foot_diff, ids, interpolated=False):
+    """Wire-level (flags, player id, foot_diff, uuid) of one slot."""
+    if track_uuid is None:
+        return EMPTY_SLOT
+    flags = FLAG_PRESENT
+    if interpolated:
+        flags |= FLAG_INTERPOLATED
+    q = 0
+    if foot_diff is not None:
+        flags |= FLAG_FOOT_DIFF
+        q = quantize_foot_diff(foot_diff)
+    return (flags, ids.get(track_uuid), q, track_uuid)
+
+
+def encode(seq, state, base_seq=0, base_state=None, frame=0):
+    """state: a slot_state() tuple per slot. Without base_state it's a FULL."""
+    parts = []
+    n_entries = 0
+    for slot, current in enumerate(state):
+        base = base_state[slot] if base_state is not None else None
+        if current == base:
+            continue
+        flags, player_id, q, track_uuid = current
+        # the uuid only travels when a slot changes hands
+        send_uuid = track_uuid is not None and (base is None or base[1] != player_id)
+        if send_uuid:
+            flags |= FLAG_UUID
+        parts.append(ENTRY.pack(slot, flags, player_id, q))
+        if send_uuid:
+            parts.append(track_uuid.encode("ascii"))
+        n_entries += 1
+    msg_type = MSG_FULL if base_state is None else MSG_DELTA
+    header = HEADER.pack(
+        PROTOCOL_VERSION, msg_type, seq, base_seq, frame, len(state), n_entries
+    )
+    return header + b"".join(parts)
+
+
+def decode(data, base_state=None):
+    """Inverse of encode(), returns (seq, frame, state).
+
+    Slots the message does not mention are taken from base_state, like a
+    client would do. Mostly here for benchmarks and debugging, the real
+    decoder lives in static/index.js.
+    """
+    header = HEADER.unpack_from(data, 0)
+    version, msg_type, seq, base_seq, frame, n_slots, n_entries = header
+    if version != PROTOCOL_VERSION:
+        raise ValueError(f"unsupported players protocol version {version}")
+    if msg_type == MSG_FULL or base_state is None:
+        state = [EMPTY_SLOT] * n_slots
+    else:
+        state = list(base_state)
+    offset = HEADER.size
+    for _ in range(n_entries):
+        slot, flags, player_id, q = ENTRY.unpack_from(data, offset)
+        offset += ENTRY.size
+        if flags & FLAG_UUID:
+            track_uuid = data[offset : offset + UUID_LEN].decode("ascii")
+            offset += UUID_LEN
+        elif flags & FLAG_PRESENT:
+            track_uuid = state[slot][3]
+        else:
+            track_uuid = None
+        state[slot] = (flags & ~FLAG_UUID, player_id, q, track_uuid)
+    return seq, frame, tuple(state)
+
+
+def encode_ack(seq):
+    return ACK.pack(MSG_ACK, seq)
+
+
+def decode_ack(data):
+    msg_type, seq = ACK.unpack(data)
+    if msg_type != MSG_ACK:
+        raise ValueError(f"not an ack: {msg_type}")
+    return seq
+
+
+class PlayersStream:
+    """Per-client delta bookkeeping for the binary protocol."""
+
+    def __init__(self):
+        # acks come in on the IOLoop, messages get built on the frame loop
+        self.lock = threading.Lock()
+        self.acked_seq = 0
+        self.acked_state = None
+        # seq -> state for everything sent but not acked yet
+        self.pending = {}
+        self.last_state = None
+
+    def message_for(self, seq, state, frame=0):
+        """Bytes to send this client for state, None if it has it already."""
+        with self.lock:
+            if state == self.last_state:
+                return None
+            if self.acked_state is None or len(self.pending) >= MAX_UNACKED:
+                self.pending.clear()
+                message = encode(seq, state, frame=frame)
+            else:
+                message = encode(
+                    seq, state, self.acked_seq, self.acked_state, frame=frame
+                )
+            self.pending[seq] = state
+            self.last_state = state
+            return message
+
+    def ack(self, seq):
+        with self.lock:
+            state = self.pending.get(seq)
+            if state is None:
+                return
+            self.acked_seq = seq
+            self.acked_state = state
+            self.pending = {k: v for k, v in self.pending.items() if k > seq}
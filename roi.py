@@ -0,0 +1,164 @@
+"""Run the detector on crops around the players instead of the whole frame.
+
+Between full-frame rescans every ROI_RESCAN_INTERVAL frames, RoiBackend only
+looks at the regions the frame loop last handed it with set_regions(): the
+tracked players grown by a margin, plus strips around the deadzone edges
+where new players walk into the playing area. Overlapping regions get
+merged so nobody is detected twice, and joints come back normalized to the
+full frame like from any other backend.
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+from pose_backends import PoseBackend, array_to_observations, empty_points
+
+# frames between two full-frame scans
+ROI_RESCAN_INTERVAL = int(os.environ.get("STUPKI_ROI_RESCAN", "15"))
+# longest side of a crop in pixels before it goes to the detector, 0 keeps
+# the full camera resolution
+ROI_MAX_SIZE = int(os.environ.get("STUPKI_ROI_MAX_SIZE", "0"))
+# how far a track's region reaches around its bbox center, in bbox heights
+TRACK_MARGIN_X = 0.6
+TRACK_MARGIN_Y = 0.65
+# entry strips reach this far to both sides of a deadzone edge, as a
+# fraction of the frame width
+ENTRY_STRIP_WIDTH = 0.12
+
+
+def track_region(center_x, center_y, height):
+    return (
+        center_x - height * TRACK_MARGIN_X,
+        center_y - height * TRACK_MARGIN_Y,
+        center_x + height * TRACK_MARGIN_X,
+        center_y + height * TRACK_MARGIN_Y,
+    )
+
+
+def entry_regions(frame_width, frame_height, left_deadzone, right_deadzone):
+    strip = frame_width * ENTRY_STRIP_WIDTH
+    left = left_deadzone
+    right = frame_width - right_deadzone
+    return [
+        (left - strip, 0, left + strip, frame_height),
+        (right - strip, 0, right + strip, frame_height),
+    ]
+
+
+def clip_region(region, width, height):
+    """Integer pixel region inside the frame, None if nothing is left."""
+    x0 = max(int(region[0]), 0)
+    y0 = max(int(region[1]), 0)
+    x1 = min(int(region[2] + 1), width)
+    y1 = min(int(region[3] + 1), height)
+    if x1 - x0 < 2 or y1 - y0 < 2:
+        return None
+    return (x0, y0, x1, y1)
+
+
+def merge_regions(regions):
+    """Replace overlapping regions with their bounding box until none overlap."""
+    merged = list(regions)
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(i + 1, len(merged)):
+                a, b = merged[i], merged[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    merged[i] = (
+                        min(a[0], b[0]),
+                        min(a[1], b[1]),
+                        max(a[2], b[2]),
+                        max(a[3], b[3]),
+                    )
+                    del merged[j]
+                    changed = True
+                    break
+            if changed:
+                break
+    return merged
+
+
+class RoiBackend(PoseBackend):
+    """Wraps another backend and only shows it the interesting parts."""
+
+    def __init__(
+        self, backend, rescan_interval=ROI_RESCAN_INTERVAL, max_size=ROI_MAX_SIZE
+    ):
+        self.backend = backend
+        self.rescan_interval = rescan_interval
+        self.max_size = max_size
+        # pixel (x0, y0, x1, y1) regions, None scans the full frame
+        self.regions = None
+        self.n_frames = 0
+        self.full_scans = 0
+        self.frame_pixels = 0
+        self.scanned_pixels = 0
+
+    def set_regions(self, regions):
+        """Where to look until the next call, safe to call from any thread."""
+        self.regions = None if regions is None else list(regions)
+
+    def detect(self, frame):
+        return array_to_observations(*self.detect_array(frame))
+
+    def detect_array(self, frame):
+        height, width = frame.shape[:2]
+        regions = self.regions
+        rescan = regions is None or self.n_frames % self.rescan_interval == 0
+        self.n_frames += 1
+        self.frame_pixels += width * height
+        if rescan:
+            self.full_scans += 1
+            self.scanned_pixels += width * height
+            return self.backend.detect_array(frame)
+
+        clipped = [clip_region(region, width, height) for region in regions]
+        crops = merge_regions([region for region in clipped if region is not None])
+        if not crops:
+            return empty_points(0), np.zeros(0, dtype=np.float32)
+        results = [self.detect_region(frame, region) for region in crops]
+        points = np.concatenate([points for points, _ in results])
+        confidences = np.concatenate([confidences for _, confidences in results])
+        return points, confidences
+
+    def detect_region(self, frame, region):
+        height, width = frame.shape[:2]
+        x0, y0, x1, y1 = region
+        self.scanned_pixels += (x1 - x0) * (y1 - y0)
+        crop = frame[y0:y1, x0:x1]
+        longest = max(x1 - x0, y1 - y0)
+        if self.max_size and longest > self.max_size:
+            scale = self.max_size / longest
+            crop = cv2.resize(
+                crop,
+                (max(int((x1 - x0) * scale), 1), max(int((y1 - y0) * scale), 1)),
+                interpolation=cv2.INTER_AREA,
+            )
+        points, confidences = self.backend.detect_array(crop)
+        # Vision puts joints it didn't find at the crop corner with
+        # confidence 0, moved into the frame below they would look like
+        # real ones. Same for joints on the crop edge, the frame edge check
+        # in arena.observation_boxes() can't catch those either.
+        with np.errstate(invalid="ignore"):
+            missing = (points[:, :, 2] == 0) | ~(
+                np.abs(points[:, :, :2] - 0.5) < 0.49
+            ).all(axis=2)
+        points[missing] = np.nan
+        # normalized to the crop with the origin bottom left, scaling doesn't
+        # matter here, only where the crop sits in the frame
+        points[:, :, 0] = (x0 + points[:, :, 0] * (x1 - x0)) / width
+        points[:, :, 1] = (height - y1 + points[:, :, 1] * (y1 - y0)) / height
+        return points, confidences
+
+    def scanned_fraction(self):
+        """Share of camera pixels that actually went through the detector."""
+        if not self.frame_pixels:
+            return 1.0
+        return self.scanned_pixels / self.frame_pixels
+
+    def close(self):
+        self.backend.close()
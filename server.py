@@ -0,0 +1,183 @@
+"""Websocket and HTTP endpoints of the arenas.
+
+Every arena gets an Application of its own on its own port, the handlers
+get the arena's Endpoint (see endpoint.py) through initialize():
+
+    /websocket        players, calibration and client events, see protocol.py
+    /thumbnails       foot thumbnails, see thumbnails.py
+    /overlay          debug overlay JPEGs
+    /events           gesture events only, see gestures.py
+    /stats/clients    per-client outbox counters
+    /stats/latency    per-stage latency, see latency.py
+    /state            the last FrameSnapshot
+
+The endpoints are the arenas' own when the server runs on a thread of the
+pipeline process, or relayed ones when it has a process of its own (see
+server_process.py). The handlers can't tell the difference.
+"""
+
+import json
+import os
+
+import tornado
+from tornado.websocket import WebSocketHandler
+
+import startup
+from protocol import SUBPROTOCOL, PlayersStream, decode_ack
+
+# port of the first arena, the nth one listens on PORT + n
+PORT = int(os.environ.get("STUPKI_PORT", "8888"))
+
+
+class WebSocketHandler(WebSocketHandler):
+    def initialize(self, endpoint):
+        self.endpoint = endpoint
+
+    def select_subprotocol(self, subprotocols):
+        if SUBPROTOCOL in subprotocols:
+            return SUBPROTOCOL
+        return None
+
+    def open(self):
+        print("WebSocket opened")
+        # None means the client gets plain JSON players messages
+        self.players_stream = None
+        if self.selected_subprotocol == SUBPROTOCOL:
+            self.players_stream = PlayersStream()
+        self.endpoint.clients.add(self)
+        self.write_message("{}")
+
+    def on_message(self, message):
+        if isinstance(message, bytes):
+            if self.players_stream is not None:
+                self.players_stream.ack(decode_ack(message))
+            return
+        parsed = json.loads(message)
+        if parsed.get("type") != "frame_report":
+            print("Message received: {}".format(message))
+        self.endpoint.post_event(parsed)
+
+    def on_close(self):
+        print("WebSocket closed")
+        self.endpoint.clients.remove(self)
+
+    def check_origin(self, origin):
+        return True
+
+
+class ThumbnailSocketHandler(tornado.websocket.WebSocketHandler):
+    """Binary foot thumbnails of the current players, see thumbnails.py"""
+
+    def initialize(self, endpoint):
+        self.endpoint = endpoint
+
+    def open(self):
+        self.endpoint.thumbnail_clients.add(self)
+        # new screens get whatever we have right away
+        for message in self.endpoint.thumbnails():
+            self.write_message(message, binary=True)
+
+    def on_close(self):
+        self.endpoint.thumbnail_clients.remove(self)
+
+    def check_origin(self, origin):
+        return True
+
+
+class OverlaySocketHandler(tornado.websocket.WebSocketHandler):
+    """Debug overlay as JPEG, one frame for every message the client sends."""
+
+    def initialize(self, endpoint):
+        self.endpoint = endpoint
+
+    def open(self):
+        self.endpoint.overlay_clients.add(self)
+
+    def on_message(self, message):
+        self.endpoint.request_overlay(self)
+
+    def on_close(self):
+        self.endpoint.overlay_clients.remove(self)
+        self.endpoint.forget_overlay_client(self)
+
+    def check_origin(self, origin):
+        return True
+
+
+class EventSocketHandler(tornado.websocket.WebSocketHandler):
+    """JSON gesture events, for clients that don't need every foot_diff."""
+
+    def initialize(self, endpoint):
+        self.endpoint = endpoint
+
+    def open(self):
+        self.endpoint.event_clients.add(self)
+
+    def on_close(self):
+        self.endpoint.event_clients.remove(self)
+
+    def check_origin(self, origin):
+        return True
+
+
+class ClientStatsHandler(tornado.web.RequestHandler):
+    """Per-client queued/dropped/sent counters of every websocket."""
+
+    def initialize(self, endpoint):
+        self.endpoint = endpoint
+
+    def get(self):
+        self.write(
+            {
+                "players": self.endpoint.clients.stats(),
+                "thumbnails": self.endpoint.thumbnail_clients.stats(),
+                "overlay": self.endpoint.overlay_clients.stats(),
+                "events": self.endpoint.event_clients.stats(),
+                "relay": self.endpoint.relay_stats(),
+            }
+        )
+
+
+class LatencyStatsHandler(tornado.web.RequestHandler):
+    """Per-stage latency histograms and fps, see latency.py"""
+
+    def initialize(self, endpoint):
+        self.endpoint = endpoint
+
+    def get(self):
+        self.write(self.endpoint.latency())
+
+
+class StateHandler(tornado.web.RequestHandler):
+    """The arena's last published frame, see arena.FrameSnapshot"""
+
+    def initialize(self, endpoint):
+        self.endpoint = endpoint
+
+    def get(self):
+        self.write(dict(self.endpoint.state(), arena=self.endpoint.name))
+
+
+def make_app(endpoint):
+    handler_args = {"endpoint": endpoint}
+    return tornado.web.Application(
+        [
+            (r"/websocket", WebSocketHandler, handler_args),
+            (r"/thumbnails", ThumbnailSocketHandler, handler_args),
+            (r"/overlay", OverlaySocketHandler, handler_args),
+            (r"/events", EventSocketHandler, handler_args),
+            (r"/stats/clients", ClientStatsHandler, handler_args),
+            (r"/stats/latency", LatencyStatsHandler, handler_args),
+            (r"/state", StateHandler, handler_args),
+            (r"/(.*)", tornado.web.StaticFileHandler, {"path": "./static"}),
+        ]
+    )
+
+
+def start_tornado(endpoints, port=PORT):
+    """Serve every endpoint on its own port, port + its index."""
+    for i, endpoint in enumerate(endpoints):
+        with startup.timed(f"{endpoint.name} listen"):
+            make_app(endpoint).listen(port + i)
+        print(f"{endpoint.name} on port {port + i}")
+    tornado.ioloop.IOLoop.current().start()
@@ -0,0 +1,259 @@
+"""The websocket server in a process of its own.
+
+With the server on a thread of the pipeline process, tornado and the frame
+loop share one GIL: a burst of tracking work holds up websocket writes,
+and a busy websocket holds up the detector. In this mode every arena gets
+a RingEndpoint instead of an Endpoint, and the server runs in a spawned
+process that only does websockets:
+
+    frame loop --state ring---> server process   players, JSON, thumbnails,
+               --overlay ring->                  /state, /stats/latency
+               --queue-------->                  gesture events, calibration
+    frame loop <----pipe------- server process   client messages: calibration
+                                                 commands, frame reports,
+                                                 overlay requests
+
+The rings are state_ring.StateRing blocks, the frame loop never waits for
+the server. A reader that falls a whole ring behind skips ahead, fine for
+player state where only the newest message matters, so what must not get
+lost (gesture events, calibration) goes through a multiprocessing Queue
+instead. put() doesn't wait for the server either. Overlay JPEGs get a
+ring of their own with a few big slots so they can't push player state out
+of the small ones. Client messages are rare and small, a multiprocessing
+Pipe is plenty for those. What the rings lost shows up on /stats/clients.
+
+The server process replays what comes out of the rings onto an Endpoint of
+its own (RelayedEndpoint), the same calls the frame loop makes on an
+in-process one, so server.py serves both modes the same way.
+"""
+
+import json
+import math
+import multiprocessing
+import queue
+import threading
+import time
+
+from endpoint import Endpoint
+from state_ring import RingReader, StateRing
+from thumbnails import pack_thumbnail, unpack_thumbnail
+
+KIND_JSON = 1
+KIND_PLAYERS = 2
+KIND_THUMBNAIL = 3
+KIND_SNAPSHOT = 4
+KIND_LATENCY = 5
+KIND_OVERLAY = 6
+KIND_EVENT = 7
+KIND_PLAYERS_JSON = 8
+
+# a players message is ~100 bytes, a thumbnail a few kB
+STATE_SLOTS = 256
+STATE_SLOT_SIZE = 32 * 1024
+OVERLAY_SLOTS = 4
+OVERLAY_SLOT_SIZE = 1024 * 1024
+# seconds between /stats/latency updates
+LATENCY_INTERVAL = 1.0
+# seconds the relay sleeps when both rings were empty
+POLL_INTERVAL = 0.001
+
+
+class RingEndpoint:
+    """Frame loop side of an Endpoint, for a server in another process."""
+
+    def __init__(self, name):
+        self.name = name
+        self.state_ring = StateRing(STATE_SLOTS, STATE_SLOT_SIZE)
+        self.overlay_ring = StateRing(OVERLAY_SLOTS, OVERLAY_SLOT_SIZE)
+        context = multiprocessing.get_context("spawn")
+        self.events, self.commands = context.Pipe(duplex=False)
+        self.messages = context.Queue()
+        # client messages read off the pipe and not taken yet
+        self.pending = []
+        self.overlay_requested = False
+        self.latency_stats = None
+        self.latency_sent_at = -math.inf
+
+    def spec(self):
+        """What server_main() needs to serve this endpoint."""
+        return {
+            "name": self.name,
+            "state_ring": (self.state_ring.name, STATE_SLOTS, STATE_SLOT_SIZE),
+            "overlay_ring": (self.overlay_ring.name, OVERLAY_SLOTS, OVERLAY_SLOT_SIZE),
+            "commands": self.commands,
+            "messages": self.messages,
+        }
+
+    def send_json(self, text, lossless=False):
+        if lossless:
+            self.messages.put((KIND_JSON, text.encode()))
+        else:
+            self.state_ring.write(KIND_JSON, text.encode())
+
+    def send_players_json(self, text):
+        self.state_ring.write(KIND_PLAYERS_JSON, text.encode())
+
+    def send_players(self, seq, state, frame):
+        self.state_ring.write(KIND_PLAYERS, json.dumps([seq, frame, state]).encode())
+
+    def send_thumbnail(self, slot, track_uuid, jpeg):
+        self.state_ring.write(KIND_THUMBNAIL, pack_thumbnail(slot, track_uuid, jpeg))
+
+    def overlay_wanted(self):
+        self.receive()
+        return self.overlay_requested
+
+    def send_overlay(self, jpeg):
+        self.overlay_requested = False
+        self.overlay_ring.write(KIND_OVERLAY, jpeg)
+
+    def send_snapshot(self, snapshot):
+        self.state_ring.write(KIND_SNAPSHOT, json.dumps(snapshot.to_dict()).encode())
+        now = time.monotonic()
+        if self.latency_stats is not None and now - self.latency_sent_at > (
+            LATENCY_INTERVAL
+        ):
+            self.latency_sent_at = now
+            self.state_ring.write(
+                KIND_LATENCY, json.dumps(self.latency_stats.to_dict()).encode()
+            )
+
+    def receive(self):
+        while self.events.poll():
+            try:
+                event = self.events.recv()
+            except EOFError:
+                # the server process is gone, nothing more to hear
+                return
+            if event.get("type") == "overlay_request":
+                self.overlay_requested = True
+            else:
+                self.pending.append(event)
+
+    def send_event(self, text):
+        self.messages.put((KIND_EVENT, text.encode()))
+
+    def take_events(self):
+        self.receive()
+        events, self.pending = self.pending, []
+        return events
+
+    def close(self):
+        self.events.close()
+        self.commands.close()
+        # whatever the server didn't take by now is for nobody
+        self.messages.cancel_join_thread()
+        self.messages.close()
+        self.state_ring.close()
+        self.overlay_ring.close()
+
+
+class RelayedEndpoint(Endpoint):
+    """Server process side, fed from a RingEndpoint's rings."""
+
+    def __init__(self, name, commands, readers):
+        """readers: RingReaders of the state and the overlay ring"""
+        super().__init__(name)
+        self.commands = commands
+        self.readers = readers
+        self.commands_lock = threading.Lock()
+        self.last_state = {}
+        self.last_latency = {}
+
+    def deliver(self, kind, payload, lossless=False):
+        if kind == KIND_JSON:
+            self.send_json(payload.decode(), lossless=lossless)
+        elif kind == KIND_PLAYERS_JSON:
+            self.send_players_json(payload.decode())
+        elif kind == KIND_PLAYERS:
+            seq, frame, state = json.loads(payload)
+            # slot states get compared to the acked ones, those are tuples
+            self.send_players(seq, tuple(tuple(slot) for slot in state), frame)
+        elif kind == KIND_THUMBNAIL:
+            self.send_thumbnail(*unpack_thumbnail(payload))
+        elif kind == KIND_OVERLAY:
+            self.send_overlay(payload)
+        elif kind == KIND_EVENT:
+            self.send_event(payload.decode())
+        elif kind == KIND_SNAPSHOT:
+            self.last_state = json.loads(payload)
+        elif kind == KIND_LATENCY:
+            self.last_latency = json.loads(payload)
+
+    def post_event(self, event):
+        with self.commands_lock:
+            self.commands.send(event)
+
+    def request_overlay(self, handler):
+        super().request_overlay(handler)
+        self.post_event({"type": "overlay_request"})
+
+    def relay_stats(self):
+        state_reader, overlay_reader = self.readers
+        return {
+            "state_lost": state_reader.lost,
+            "overlay_lost": overlay_reader.lost,
+        }
+
+    def state(self):
+        return self.last_state
+
+    def latency(self):
+        return self.last_latency
+
+
+def relay(feeds):
+    """feeds: (endpoint, messages Queue), polled until the process ends."""
+    while True:
+        idle = True
+        for endpoint, messages in feeds:
+            while True:
+                try:
+                    kind, payload = messages.get_nowait()
+                except queue.Empty:
+                    break
+                idle = False
+                endpoint.deliver(kind, payload, lossless=True)
+            for reader in endpoint.readers:
+                for kind, payload in reader.read():
+                    idle = False
+                    endpoint.deliver(kind, payload)
+        if idle:
+            time.sleep(POLL_INTERVAL)
+
+
+def server_main(specs, port=None):
+    # tornado only gets imported here, in the server process
+    from server import PORT, start_tornado
+
+    feeds = []
+    for spec in specs:
+        readers = [
+            RingReader(StateRing(n_slots, slot_size, name=name))
+            for name, n_slots, slot_size in (spec["state_ring"], spec["overlay_ring"])
+        ]
+        endpoint = RelayedEndpoint(spec["name"], spec["commands"], readers)
+        feeds.append((endpoint, spec["messages"]))
+    threading.Thread(target=relay, args=(feeds,), name="relay", daemon=True).start()
+    start_tornado([endpoint for endpoint, _ in feeds], port or PORT)
+
+
+class ServerProcess:
+    """Runs server_main() for the endpoints, closing it closes them too."""
+
+    def __init__(self, endpoints, port=None):
+        context = multiprocessing.get_context("spawn")
+        self.endpoints = endpoints
+        self.process = context.Process(
+            target=server_main,
+            args=([endpoint.spec() for endpoint in endpoints], port),
+            name="server",
+            daemon=True,
+        )
+        self.process.start()
+
+    def close(self):
+        self.process.terminate()
+        self.process.join(timeout=5)
+        for endpoint in self.endpoints:
+            endpoint.close()
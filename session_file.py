@@ -0,0 +1,251 @@
+"""Binary columnar session files, replayed straight from a memory map.
+
+The JSON lines sessions from pose_backends.py are easy to read but slow to
+parse, this is the same data laid out for numpy:
+
+    8 bytes   MAGIC
+    u32       header length, then the JSON header
+    columns   each starting on an ALIGN boundary, offsets in the header
+              are relative to the first one
+
+    t              float64 (frames,)        seconds since the first frame
+    starts         int64 (frames + 1,)      frame i is people starts[i]:starts[i + 1]
+    points         float32 (people, joints, 3)
+    confidences    float32 (people,)
+    images         uint8 (frames, h, w, 3)  optional downscaled camera frames
+
+Opening a session maps the file and wraps the columns in numpy arrays
+without reading them, a frame is two slices.
+
+    python session_file.py convert session.jsonl session.stupki
+"""
+
+import json
+import math
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+
+import numpy as np
+
+from pose_backends import (
+    JOINT_NAMES,
+    PoseBackend,
+    ReplayBackend,
+    array_to_observations,
+)
+
+MAGIC = b"STUPKIS1"
+SUFFIX = ".stupki"
+ALIGN = 64
+HEADER_LENGTH = struct.Struct("<I")
+
+
+def aligned(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+class SessionWriter:
+    """Collects frames in temporary column files, writes the session on close.
+
+    image_width: also keep every camera frame scaled down to this width,
+    0 for observations only
+    """
+
+    def __init__(self, path, frame_size=None, image_width=0):
+        self.path = path
+        self.frame_size = frame_size
+        self.image_width = image_width
+        self.image_size = None
+        directory = os.path.dirname(os.path.abspath(path))
+        self.points_file = tempfile.TemporaryFile(dir=directory)
+        self.confidences_file = tempfile.TemporaryFile(dir=directory)
+        self.images_file = tempfile.TemporaryFile(dir=directory)
+        self.t = []
+        self.starts = [0]
+
+    def write(self, t, points, confidences, frame=None):
+        if self.frame_size is None:
+            height, width = frame.shape[:2]
+            self.frame_size = (width, height)
+        self.t.append(t)
+        self.starts.append(self.starts[-1] + len(points))
+        self.points_file.write(np.ascontiguousarray(points, dtype=np.float32))
+        self.confidences_file.write(np.ascontiguousarray(confidences, dtype=np.float32))
+        if self.image_width and frame is not None:
+            # the replay side never needs cv2, don't load it for that
+            import cv2
+
+            if self.image_size is None:
+                height, width = frame.shape[:2]
+                self.image_size = (
+                    self.image_width,
+                    max(round(height * self.image_width / width), 1),
+                )
+            image = cv2.resize(frame, self.image_size, interpolation=cv2.INTER_AREA)
+            self.images_file.write(np.ascontiguousarray(image))
+
+    def close(self):
+        n_frames = len(self.t)
+        n_people = self.starts[-1]
+        columns = [
+            ("t", np.array(self.t, dtype=np.float64)),
+            ("starts", np.array(self.starts, dtype=np.int64)),
+            ("points", (self.points_file, "float32", (n_people, len(JOINT_NAMES), 3))),
+            ("confidences", (self.confidences_file, "float32", (n_people,))),
+        ]
+        if self.image_size is not None:
+            width, height = self.image_size
+            columns.append(
+                ("images", (self.images_file, "uint8", (n_frames, height, width, 3)))
+            )
+
+        layout = {}
+        offset = 0
+        for name, column in columns:
+            if isinstance(column, np.ndarray):
+                dtype, shape = column.dtype.name, column.shape
+            else:
+                _, dtype, shape = column
+            layout[name] = {"offset": offset, "dtype": dtype, "shape": list(shape)}
+            offset = aligned(offset + math.prod(shape) * np.dtype(dtype).itemsize)
+        header = json.dumps(
+            {
+                "version": 1,
+                "width": self.frame_size[0] if self.frame_size else 0,
+                "height": self.frame_size[1] if self.frame_size else 0,
+                "frames": n_frames,
+                "joints": JOINT_NAMES,
+                "columns": layout,
+            }
+        ).encode()
+
+        with open(self.path, "wb") as out:
+            out.write(MAGIC + HEADER_LENGTH.pack(len(header)) + header)
+            data_start = aligned(out.tell())
+            for name, column in columns:
+                out.seek(data_start + layout[name]["offset"])
+                if isinstance(column, np.ndarray):
+                    out.write(column.tobytes())
+                else:
+                    column[0].seek(0)
+                    shutil.copyfileobj(column[0], out)
+            # pad so the last column's alignment holds on disk too
+            out.truncate(data_start + offset)
+        for temp in (self.points_file, self.confidences_file, self.images_file):
+            temp.close()
+
+
+class SessionFile:
+    """Memory-mapped session, arrays are read-only views into the file."""
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mmap[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a binary session")
+        (header_length,) = HEADER_LENGTH.unpack_from(self.mmap, len(MAGIC))
+        header_start = len(MAGIC) + HEADER_LENGTH.size
+        self.header = json.loads(self.mmap[header_start : header_start + header_length])
+        if self.header["joints"] != JOINT_NAMES:
+            raise ValueError(f"{path} was recorded with a different joint layout")
+        self.frame_size = (self.header["width"], self.header["height"])
+        data_start = aligned(header_start + header_length)
+        self.columns = {}
+        for name, column in self.header["columns"].items():
+            shape = tuple(column["shape"])
+            self.columns[name] = np.frombuffer(
+                self.mmap,
+                dtype=column["dtype"],
+                count=math.prod(shape),
+                offset=data_start + column["offset"],
+            ).reshape(shape)
+        self.t = self.columns["t"]
+        self.starts = self.columns["starts"]
+        self.points = self.columns["points"]
+        self.confidences = self.columns["confidences"]
+        self.images = self.columns.get("images")
+
+    def __len__(self):
+        return len(self.t)
+
+    def frame(self, i):
+        """(points, confidences) of frame i."""
+        start, end = self.starts[i], self.starts[i + 1]
+        return self.points[start:end], self.confidences[start:end]
+
+    def close(self):
+        # the arrays hold on to the map, they have to go first
+        self.columns = self.t = self.starts = None
+        self.points = self.confidences = self.images = None
+        try:
+            self.mmap.close()
+        except BufferError:
+            # somebody still has a frame, the map goes when that does
+            pass
+        self.file.close()
+
+
+class MappedReplayBackend(PoseBackend):
+    """ReplayBackend for binary sessions."""
+
+    def __init__(self, path):
+        self.path = path
+        self.session = SessionFile(path)
+        self.frame_size = self.session.frame_size
+        self.index = 0
+        # session time of the frame read last
+        self.t = None
+
+    def next_frame(self):
+        if self.index >= len(self.session):
+            return None
+        points, confidences = self.session.frame(self.index)
+        self.t = float(self.session.t[self.index])
+        self.index += 1
+        return points, confidences
+
+    def detect(self, frame=None):
+        detection = self.next_frame()
+        if detection is None:
+            return []
+        return array_to_observations(*detection)
+
+    def frames(self):
+        """Yield (points, confidences) until the recording runs out."""
+        while True:
+            detection = self.next_frame()
+            if detection is None:
+                return
+            yield detection
+
+    def close(self):
+        self.session.close()
+
+
+def convert(jsonl_path, out_path):
+    """Turn a JSON lines session into a binary one."""
+    replay = ReplayBackend(jsonl_path)
+    writer = SessionWriter(out_path, frame_size=replay.frame_size)
+    n_frames = 0
+    for points, confidences in replay.frames():
+        writer.write(replay.t, points, confidences)
+        n_frames += 1
+    writer.close()
+    replay.close()
+    return n_frames
+
+
+def main():
+    if len(sys.argv) != 4 or sys.argv[1] != "convert":
+        print(__doc__.strip().splitlines()[-1].strip())
+        sys.exit(1)
+    n_frames = convert(sys.argv[2], sys.argv[3])
+    print(f"wrote {n_frames} frames to {sys.argv[3]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Which tracked people are players, and which slot each of them plays in.
+
+A track keeps its slot for as long as it stays a player, nobody gets
+reshuffled because they walked past somebody else. Who is a player is
+decided with some hysteresis, so two people of about the same height at the
+edge of the selection don't trade places every frame:
+
+- players are the n_slots tallest tracks older than min_age that are at
+  least height_ratio as tall as the tallest one
+- tracks that already hold a slot only need height_ratio * (1 - hysteresis)
+  and count as (1 + hysteresis) times as tall when there are more
+  candidates than slots
+- new players take the free slots left to right by bbox center x, the way
+  primary and secondary used to be ordered
+- a lone player always plays in slot 0, so one person in front of the
+  camera is the primary player, like before there were slots
+
+With n_slots=2 slot 0 is what used to be the primary player and slot 1 the
+secondary one.
+"""
+
+
+def center_x(track):
+    x = track.last_bb_center_x()
+    return x if x is not None else track.last_state().bb_center_x
+
+
+class SlotManager:
+    def __init__(self, n_slots, min_age=15, height_ratio=0.8, hysteresis=0.1):
+        self.n_slots = n_slots
+        self.min_age = min_age
+        self.height_ratio = height_ratio
+        self.hysteresis = hysteresis
+        self.slots = [None] * n_slots
+        # times a slot went from one track to another
+        self.changes = 0
+
+    def reset(self):
+        self.slots = [None] * self.n_slots
+
+    def keep_ratio(self):
+        """Fraction of the tallest a slot holder has to stay above."""
+        return self.height_ratio * (1 - self.hysteresis)
+
+    def update(self, tracks):
+        """Assign slots for this frame, returns n_slots tracks or None."""
+        holders = {
+            id(track): slot
+            for slot, track in enumerate(self.slots)
+            if track is not None
+        }
+        candidates = []
+        tallest = 0.0
+        for track in tracks:
+            if track.age <= self.min_age:
+                continue
+            height = track.last_height()
+            if height is None:
+                continue
+            candidates.append((height, track))
+            if height > tallest:
+                tallest = height
+
+        keep_height = tallest * self.keep_ratio()
+        join_height = tallest * self.height_ratio
+        boost = 1 + self.hysteresis
+        ranked = []
+        for height, track in candidates:
+            if id(track) in holders:
+                if height >= keep_height:
+                    ranked.append((height * boost, track))
+            elif height >= join_height:
+                ranked.append((height, track))
+        # the one sort per frame
+        ranked.sort(key=lambda item: item[0], reverse=True)
+
+        slots = [None] * self.n_slots
+        newcomers = []
+        for _, track in ranked[: self.n_slots]:
+            slot = holders.get(id(track))
+            if slot is None:
+                newcomers.append(track)
+            else:
+                slots[slot] = track
+        if newcomers:
+            newcomers.sort(key=center_x)
+            free = [slot for slot, track in enumerate(slots) if track is None]
+            for slot, track in zip(free, newcomers):
+                slots[slot] = track
+        occupied = [slot for slot, track in enumerate(slots) if track is not None]
+        if len(occupied) == 1 and occupied[0] != 0:
+            slots[0], slots[occupied[0]] = slots[occupied[0]], None
+        for old, new in zip(self.slots, slots):
+            if old is not None and new is not None and old is not new:
+                self.changes += 1
+        self.slots = slots
+        return list(slots)
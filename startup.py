@@ -0,0 +1,62 @@
+"""Where startup time goes, per component.
+
+    STUPKI_STARTUP_REPORT=1 python gierka2.py serve
+    python gierka2.py --startup-report replay session.stupki
+
+Imports and initialization get wrapped in timed(), done() prints what they
+took once the mode is up, for the camera that is the first published frame.
+Steps nest (importing arena.py imports numpy), so they don't add up to the
+total.
+"""
+
+import contextlib
+import os
+import threading
+import time
+
+# STUPKI_STARTUP_REPORT=1: print the report once startup is done
+ENABLED = os.environ.get("STUPKI_STARTUP_REPORT") == "1"
+
+# close enough to when the interpreter got to our code
+started_at = time.perf_counter()
+# (name, seconds, depth) in the order the steps started
+steps = []
+# how deep in timed() each thread is
+nesting = threading.local()
+reported = False
+
+
+@contextlib.contextmanager
+def timed(name):
+    depth = getattr(nesting, "depth", 0)
+    start = time.perf_counter()
+    step = [name, None, depth]
+    steps.append(step)
+    nesting.depth = depth + 1
+    try:
+        yield
+    finally:
+        nesting.depth = depth
+        step[1] = time.perf_counter() - start
+
+
+def format_report(what):
+    lines = [
+        f"startup: {what} after {(time.perf_counter() - started_at) * 1000:.0f} ms"
+    ]
+    for name, seconds, step_depth in steps:
+        if seconds is None:
+            continue
+        label = "  " * step_depth + name
+        lines.append(f"  {label:<28} {seconds * 1000:>8.1f} ms")
+    return "\n".join(lines)
+
+
+def done(what="ready"):
+    """Startup is over, only the first call counts."""
+    global reported
+    if reported:
+        return
+    reported = True
+    if ENABLED:
+        print(format_report(what), flush=True)
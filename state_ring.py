@@ -0,0 +1,129 @@
+"""Single writer, any number of readers, messages in shared memory, no locks.
+
+The block is a u64 head, the seq of the last message published (0 before
+the first), followed by n_slots slots of
+
+    u64 seq, u32 length, u32 crc32 of the payload, u8 kind, padding
+    slot_size bytes of payload
+
+Message seq goes into slot seq % n_slots. The writer zeroes the slot's seq,
+writes the payload, the slot header and finally head. Readers never wait
+for the writer and the writer never waits for anybody: a reader copies the
+payload out, then checks the slot seq and the crc. If the slot seq moved on
+the writer lapped the reader while it was copying and the message is
+counted as lost. A reader more than n_slots behind skips straight to the
+oldest message still in the ring. For player state only the newest message
+matters anyway.
+
+Python makes no promise in which order another core sees our stores, and
+ARM doesn't either, so head can show up before the slot it points at. A
+slot that isn't there yet, or whose crc doesn't match what it claims to
+be, gets read again on the next poll instead.
+"""
+
+import struct
+import zlib
+from multiprocessing import shared_memory
+
+HEAD = struct.Struct("<Q")
+SLOT_SEQ = struct.Struct("<Q")
+SLOT_HEADER = struct.Struct("<QIIB")
+# payloads start 8 byte aligned
+SLOT_HEADER_SIZE = 24
+
+
+class StateRing:
+    """The shared memory block, write() is for the one process that writes."""
+
+    def __init__(self, n_slots, slot_size, name=None):
+        self.n_slots = n_slots
+        self.slot_size = slot_size
+        self.stride = SLOT_HEADER_SIZE + (slot_size + 7) // 8 * 8
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(
+                create=True, size=HEAD.size + n_slots * self.stride
+            )
+            self.shm.buf[: HEAD.size] = bytes(HEAD.size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.buf = self.shm.buf
+        # seq of the last message this process wrote
+        self.written = 0
+        self.too_big = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def slot_offset(self, seq):
+        return HEAD.size + seq % self.n_slots * self.stride
+
+    def head(self):
+        return HEAD.unpack_from(self.buf, 0)[0]
+
+    def write(self, kind, payload):
+        """Publish payload (bytes), False if it is bigger than a slot."""
+        if len(payload) > self.slot_size:
+            self.too_big += 1
+            return False
+        seq = self.written + 1
+        offset = self.slot_offset(seq)
+        start = offset + SLOT_HEADER_SIZE
+        SLOT_SEQ.pack_into(self.buf, offset, 0)
+        self.buf[start : start + len(payload)] = payload
+        SLOT_HEADER.pack_into(
+            self.buf, offset, seq, len(payload), zlib.crc32(payload), kind
+        )
+        HEAD.pack_into(self.buf, 0, seq)
+        self.written = seq
+        return True
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingReader:
+    """One reader's position in a StateRing, starting at the next message."""
+
+    def __init__(self, ring):
+        self.ring = ring
+        self.next_seq = ring.head() + 1
+        self.read_count = 0
+        self.lost = 0
+
+    def read(self):
+        """[(kind, payload)] of the messages published since the last call."""
+        ring = self.ring
+        head = ring.head()
+        oldest = head - ring.n_slots + 1
+        if self.next_seq < oldest:
+            self.lost += oldest - self.next_seq
+            self.next_seq = oldest
+        messages = []
+        while self.next_seq <= head:
+            seq = self.next_seq
+            offset = ring.slot_offset(seq)
+            slot_seq, length, crc, kind = SLOT_HEADER.unpack_from(ring.buf, offset)
+            if slot_seq < seq or length > ring.slot_size:
+                # not there yet, see the module docstring
+                break
+            if slot_seq == seq:
+                start = offset + SLOT_HEADER_SIZE
+                payload = bytes(ring.buf[start : start + length])
+                slot_seq = SLOT_SEQ.unpack_from(ring.buf, offset)[0]
+                if slot_seq == seq and zlib.crc32(payload) != crc:
+                    break
+            if slot_seq != seq:
+                self.lost += 1
+            else:
+                messages.append((kind, payload))
+            self.next_seq += 1
+        self.read_count += len(messages)
+        return messages
+
+    def close(self):
+        self.ring.close()
@@ -6,6 +6,9 @@ const stopaBImg = document.getElementById('stopB');
 const playAreaWidth = 3000;
 const playAreaHeight = 3000;
 var feetRisenDown = false;
+// while the /events socket is open the server's start_gesture starts the
+// game, the raise check in handlePlayers() is the fallback without it
+var eventsOpen = false;
 
 var canvasWidth = window.innerWidth / 2;
 var canvasHeight = window.innerHeight;
@@ -417,8 +420,146 @@ const stoopkarzURL = "ws://localhost:8888/websocket";
 
 let stoopkarzWS;
 
+function handlePlayers(jsonMSG) {
+    if (jsonMSG['secondary']) {
+        if (!eventsOpen) {
+            if (jsonMSG.secondary.foot_diff > 0.15) {
+                ensureGameStart()
+                feetRisenDown = false;
+            } else if (jsonMSG.secondary.foot_diff < -0.15) {
+                ensureGameStart();
+                feetRisenDown = false;
+            } else {
+                feetRisenDown = true;
+            }
+        }
+        playerAState.feetDiff = jsonMSG.secondary.foot_diff;
+    }
+
+    if (jsonMSG['primary']) {
+        if (!eventsOpen) {
+            if (jsonMSG.primary.foot_diff > 0.15) {
+                feetRisenDown = false;
+                ensureGameStart()
+            } else if (jsonMSG.primary.foot_diff < -0.15) {
+                feetRisenDown = false;
+                ensureGameStart();
+            } else {
+                feetRisenDown = true;
+            }
+        }
+        playerBState.feetDiff = jsonMSG.primary.foot_diff;
+    }
+}
+
+// Binary players protocol, see protocol.py for the layout
+const PLAYERS_SUBPROTOCOL = "stupki.players.v3";
+const PLAYERS_VERSION = 3;
+const MSG_FULL = 1;
+const MSG_ACK = 3;
+const FLAG_PRESENT = 1;
+const FLAG_FOOT_DIFF = 2;
+const FLAG_UUID = 4;
+const FLAG_INTERPOLATED = 8;
+const FOOT_DIFF_SCALE = 10000;
+
+// seq -> slots, deltas are applied on top of the state they name as base
+var playersStates = new Map();
+
+function emptySlots(nSlots) {
+    const slots = [];
+    for (var i = 0; i < nSlots; i++) {
+        slots.push({ flags: 0, id: 0, footDiff: 0, uuid: null });
+    }
+    return slots;
+}
+
+function decodePlayers(buffer) {
+    const view = new DataView(buffer);
+    const version = view.getUint8(0);
+    if (version != PLAYERS_VERSION) {
+        console.log("Unsupported players protocol version", version);
+        return null;
+    }
+    const type = view.getUint8(1);
+    const seq = view.getUint32(2, true);
+    const baseSeq = view.getUint32(6, true);
+    const frame = view.getUint32(10, true);
+    const nSlots = view.getUint8(14);
+    const nEntries = view.getUint8(15);
+
+    var slots;
+    if (type == MSG_FULL) {
+        slots = emptySlots(nSlots);
+    } else {
+        const base = playersStates.get(baseSeq);
+        if (!base) {
+            console.log("Missing players base state", baseSeq);
+            return null;
+        }
+        slots = base.map((slot) => Object.assign({}, slot));
+        // the server never goes back further than the base it used
+        for (const knownSeq of playersStates.keys()) {
+            if (knownSeq < baseSeq) {
+                playersStates.delete(knownSeq);
+            }
+        }
+    }
+
+    var offset = 16;
+    for (var i = 0; i < nEntries; i++) {
+        const slot = view.getUint8(offset);
+        const flags = view.getUint8(offset + 1);
+        const id = view.getUint16(offset + 2, true);
+        const footDiff = view.getInt16(offset + 4, true) / FOOT_DIFF_SCALE;
+        offset += 6;
+        var uuid = null;
+        if (flags & FLAG_UUID) {
+            uuid = new TextDecoder().decode(new Uint8Array(buffer, offset, 36));
+            offset += 36;
+        } else if (flags & FLAG_PRESENT) {
+            uuid = slots[slot].uuid;
+        }
+        slots[slot] = { flags: flags & ~FLAG_UUID, id, footDiff, uuid };
+    }
+    playersStates.set(seq, slots);
+    return { seq, frame, slots };
+}
+
+function slotToPlayer(slot) {
+    if (!(slot.flags & FLAG_PRESENT)) {
+        return null;
+    }
+    return {
+        uuid: slot.uuid,
+        foot_diff: (slot.flags & FLAG_FOOT_DIFF) ? slot.footDiff : null,
+        measured: !(slot.flags & FLAG_INTERPOLATED),
+    };
+}
+
+// tells the server when the players state of a camera frame made it to the
+// screen, it turns that into glass-to-glass latency, see latency.py
+function reportFrame(frame) {
+    if (!frame) {
+        return;
+    }
+    const receivedAt = performance.now();
+    requestAnimationFrame(() => {
+        if (stoopkarzWS.readyState != WebSocket.OPEN) {
+            return;
+        }
+        stoopkarzWS.send(JSON.stringify({
+            type: 'frame_report',
+            frame: frame,
+            receive_to_render: (performance.now() - receivedAt) / 1000,
+        }));
+    });
+}
+
 function reconnect() {
-    stoopkarzWS = new WebSocket(stoopkarzURL);
+    stoopkarzWS = new WebSocket(stoopkarzURL, [PLAYERS_SUBPROTOCOL]);
+    stoopkarzWS.binaryType = "arraybuffer";
+    playersStates = new Map();
 
     stoopkarzWS.onopen = ((ev) => {
         console.log("Connected");
@@ -426,41 +567,32 @@ function reconnect() {
     })
 
     stoopkarzWS.onmessage = ((msg) => {
+        if (msg.data instanceof ArrayBuffer) {
+            const decoded = decodePlayers(msg.data);
+            if (!decoded) {
+                return;
+            }
+            const ack = new DataView(new ArrayBuffer(5));
+            ack.setUint8(0, MSG_ACK);
+            ack.setUint32(1, decoded.seq, true);
+            stoopkarzWS.send(ack.buffer);
+
+            handlePlayers({
+                type: 'players',
+                primary: slotToPlayer(decoded.slots[0]),
+                secondary: decoded.slots.length > 1 ? slotToPlayer(decoded.slots[1]) : null,
+                slots: decoded.slots.map(slotToPlayer),
+            });
+            reportFrame(decoded.frame);
+            return;
+        }
+
         const jsonMSG = JSON.parse(msg.data)
 
         switch (jsonMSG.type) {
             case 'players':
-                if (jsonMSG['secondary']) {
-                    if (jsonMSG?.secondary?.foot_image_data) {
-                        stopaAImg.src = jsonMSG?.secondary?.foot_image_data;
-                    }
-                    if (jsonMSG.secondary.foot_diff > 0.15) {
-                        ensureGameStart()
-                        feetRisenDown = false;
-                    } else if (jsonMSG.secondary.foot_diff < -0.15) {
-                        ensureGameStart();
-                        feetRisenDown = false;
-                    } else {
-                        feetRisenDown = true;
-                    }
-                    playerAState.feetDiff = jsonMSG.secondary.foot_diff;
-                }
-
-                if (jsonMSG['primary']) {
-                    if (jsonMSG?.primary?.foot_image_data) {
-                        stopaBImg.src = jsonMSG?.primary?.foot_image_data;
-                    }
-                    if (jsonMSG.primary.foot_diff > 0.15) {
-                        feetRisenDown = false;
-                        ensureGameStart()
-                    } else if (jsonMSG.primary.foot_diff < -0.15) {
-                        feetRisenDown = false;
-                        ensureGameStart();
-                    } else {
-                        feetRisenDown = true;
-                    }
-                    playerBState.feetDiff = jsonMSG.primary.foot_diff;
-                }
+                handlePlayers(jsonMSG);
+                reportFrame(jsonMSG.frame);
                 break;
         }
     })
@@ -471,3 +603,60 @@ function reconnect() {
 }
 
 reconnect();
+
+// Foot thumbnails come on their own socket as binary messages:
+// byte 0 slot (0 primary, 1 secondary), 36 bytes uuid, then a JPEG
+const thumbnailsURL = "ws://localhost:8888/thumbnails";
+const thumbnailImgs = [stopaBImg, stopaAImg];
+
+function reconnectThumbnails() {
+    const ws = new WebSocket(thumbnailsURL);
+    ws.binaryType = "arraybuffer";
+
+    ws.onmessage = ((msg) => {
+        const slot = new Uint8Array(msg.data, 0, 1)[0];
+        const target = thumbnailImgs[slot];
+        if (!target) {
+            return;
+        }
+        const jpeg = new Blob([msg.data.slice(37)], { type: "image/jpeg" });
+        if (target.src) {
+            URL.revokeObjectURL(target.src);
+        }
+        target.src = URL.createObjectURL(jpeg);
+    })
+
+    ws.onclose = (msg) => {
+        setTimeout(reconnectThumbnails, 1000)
+    }
+}
+
+reconnectThumbnails();
+
+// Gesture events come on their own socket, the server does the thresholds
+// and the debouncing, see gestures.py
+const eventsURL = "ws://localhost:8888/events";
+
+function reconnectEvents() {
+    const ws = new WebSocket(eventsURL);
+
+    ws.onopen = ((ev) => {
+        eventsOpen = true;
+    })
+
+    ws.onmessage = ((msg) => {
+        const event = JSON.parse(msg.data);
+        if (event.event == 'start_gesture') {
+            // start_gesture already means the feet were down before the raise
+            feetRisenDown = true;
+            ensureGameStart();
+        }
+    })
+
+    ws.onclose = (msg) => {
+        eventsOpen = false;
+        setTimeout(reconnectEvents, 1000)
+    }
+}
+
+reconnectEvents();
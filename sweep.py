@@ -0,0 +1,127 @@
+"""Replay recorded sessions against a grid of tracker/calibration settings.
+
+Every combination of --set values runs all sessions through the tracker and
+player selection as fast as they go, one JSON line per combination on
+stdout. Names are looked up in the calibration (min_bb_height, ...), then
+in tracker.py (MATCH_MAX_BB_X_DIST, ...), then in arena.py
+(TRACK_N_FRAMES, ...). Every session gets a fresh arena. Binary .stupki
+sessions (see session_file.py) load much faster than JSON lines ones.
+
+    python sweep.py session.stupki [...] \\
+        --set MATCH_MAX_BB_X_DIST=120,180,240 --set min_bb_height=300,400
+
+Metrics per combination:
+    fps             frames per second over all sessions
+    tracks          tracks started
+    player_changes  times a player slot went to a different track
+    present         share of frames with at least one player
+"""
+
+import argparse
+import itertools
+import json
+import time
+
+import arena
+import calibration
+import tracker
+from pose_backends import make_backend
+
+
+def parse_set(text):
+    name, _, values = text.partition("=")
+    if not values:
+        raise argparse.ArgumentTypeError(f"expected NAME=V1,V2,... got {text}")
+    return name, [json.loads(value) for value in values.split(",")]
+
+
+def apply(params):
+    """Set module params, returns what has to be set to undo it.
+
+    Calibration params are left out, those go on the arenas run() makes.
+    """
+    previous = {}
+    for name, value in params.items():
+        if name in calibration.DEFAULTS:
+            continue
+        elif hasattr(tracker, name):
+            previous[name] = getattr(tracker, name)
+            setattr(tracker, name, value)
+        elif hasattr(arena, name):
+            previous[name] = getattr(arena, name)
+            setattr(arena, name, value)
+        else:
+            raise ValueError(f"unknown parameter {name}")
+    return previous
+
+
+def new_arena(frame_size, config=None):
+    """Arena for replaying one session, config overrides the default calibration."""
+    session = arena.Arena("sweep")
+    if config is not None:
+        session.calibration_config.update(config)
+    session.frame_size = frame_size
+    return session
+
+
+def run(paths, params, config=None):
+    """config: calibration the params are applied on top of"""
+    previous = apply(params)
+    config = dict(config or calibration.DEFAULTS)
+    config.update(
+        (name, value) for name, value in params.items() if name in calibration.DEFAULTS
+    )
+    n_frames = 0
+    present = 0
+    player_changes = 0
+    uuids = set()
+    start = time.perf_counter()
+    try:
+        for path in paths:
+            backend = make_backend("replay", path=path)
+            session = new_arena(backend.frame_size, config)
+            last = [None] * len(session.current_players)
+            for points, confidences in backend.frames():
+                session.process_frame(points, confidences, backend.t)
+                n_frames += 1
+                for track in session.tracked_observations:
+                    uuids.add(track.uuid)
+                players = [
+                    player.uuid if player is not None else None
+                    for player in session.snapshot.players
+                ]
+                present += any(track_uuid is not None for track_uuid in players)
+                for slot, track_uuid in enumerate(players):
+                    if track_uuid is not None and track_uuid != last[slot]:
+                        player_changes += last[slot] is not None
+                    last[slot] = track_uuid or last[slot]
+            backend.close()
+    finally:
+        apply(previous)
+    elapsed = time.perf_counter() - start
+    return {
+        "params": params,
+        "frames": n_frames,
+        "fps": round(n_frames / max(elapsed, 1e-9), 1),
+        "tracks": len(uuids),
+        "player_changes": player_changes,
+        "present": round(present / max(n_frames, 1), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sessions", nargs="+")
+    parser.add_argument("--set", type=parse_set, action="append", default=[])
+    args = parser.parse_args()
+
+    store = calibration.CalibrationStore(arena.CALIBRATION_PATH)
+    store.load()
+    names = [name for name, _ in args.set]
+    for values in itertools.product(*(values for _, values in args.set)):
+        result = run(args.sessions, dict(zip(names, values)), store.config)
+        print(json.dumps(result), flush=True)
+
+
+if __name__ == "__main__":
+    main()
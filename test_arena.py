@@ -0,0 +1,55 @@
+import random
+
+from arena import TRACK_N_FRAMES, ObservationState, TrackedObservation
+
+
+def walk_back(states, field):
+    """What the last_* lookups did before the ring: search the history."""
+    for state in reversed(states):
+        value = getattr(state, field)
+        if value is not None:
+            return value
+    return None
+
+
+def test_history_keeps_the_last_frames_in_order():
+    track = TrackedObservation()
+    pushed = []
+    for i in range(TRACK_N_FRAMES * 2 + 5):
+        state = ObservationState(i, i, 100, 0.0, t=i / 30)
+        track.push_state(state)
+        pushed.append(state)
+        assert track.last_states == pushed[-TRACK_N_FRAMES:]
+        assert track.last_state() is state
+
+
+def test_last_values_match_a_walk_through_the_history():
+    rng = random.Random(6)
+    track = TrackedObservation()
+    pushed = []
+    for i in range(TRACK_N_FRAMES * 4):
+        # long stretches without feet, so values age out of the window too
+        missing = rng.random() < (0.98 if i // TRACK_N_FRAMES % 2 else 0.3)
+        state = ObservationState(
+            None if missing else float(i),
+            float(i),
+            None if missing else 200.0 + i,
+            None if missing else rng.uniform(-0.2, 0.2),
+        )
+        track.push_state(state)
+        pushed.append(state)
+        history = pushed[-TRACK_N_FRAMES:]
+        assert track.last_bb_center_x() == walk_back(history, "bb_center_x")
+        assert track.last_height() == walk_back(history, "bb_height")
+        assert track.last_foot_diff() == walk_back(history, "foot_diff")
+
+
+def test_value_older_than_the_history_is_gone():
+    track = TrackedObservation()
+    track.push_state(ObservationState(10.0, 5.0, 300.0, 0.1))
+    for _ in range(TRACK_N_FRAMES - 1):
+        track.push_state(ObservationState(None, 5.0, None, None))
+    assert track.last_foot_diff() == 0.1
+    track.push_state(ObservationState(None, 5.0, None, None))
+    assert track.last_foot_diff() is None
+    assert track.last_height() is None
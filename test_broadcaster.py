@@ -0,0 +1,110 @@
+import asyncio
+import types
+
+import broadcaster
+from broadcaster import Broadcaster
+
+
+class Loop:
+    """Collects what would run on the IOLoop."""
+
+    def __init__(self):
+        self.callbacks = []
+
+    def add_callback(self, callback, *args):
+        self.callbacks.append((callback, args))
+
+
+class Handler:
+    def __init__(self):
+        self.request = types.SimpleNamespace(remote_ip="127.0.0.1")
+        self.written = []
+        self.closed = False
+
+    async def write_message(self, message, binary=False):
+        self.written.append(message)
+
+    def close(self):
+        self.closed = True
+
+
+def connect(outbox_size=2, slow_timeout=100.0):
+    broadcast = Broadcaster(outbox_size=outbox_size, slow_timeout=slow_timeout)
+    broadcast.ioloop = Loop()
+    handler = Handler()
+    broadcast.outboxes[handler] = broadcaster.ClientOutbox(handler, outbox_size)
+    return broadcast, handler, broadcast.outboxes[handler]
+
+
+def queued(outbox):
+    return [message for message, _, _ in outbox.messages]
+
+
+def test_full_outbox_drops_the_oldest():
+    broadcast, handler, outbox = connect()
+    for i in range(5):
+        broadcast.send_all(f"players {i}")
+    assert queued(outbox) == ["players 3", "players 4"]
+    assert (outbox.queued, outbox.dropped) == (5, 3)
+    # one flush scheduled, not one per message
+    assert len(broadcast.ioloop.callbacks) == 1
+
+
+def test_lossless_messages_keep_their_place():
+    broadcast, handler, outbox = connect()
+    for i in range(4):
+        broadcast.send_all(f"players {i}")
+        broadcast.send_all(f"event {i}", lossless=True)
+    # the two newest player messages, every event in between
+    assert queued(outbox) == [
+        "event 0",
+        "event 1",
+        "players 2",
+        "event 2",
+        "players 3",
+        "event 3",
+    ]
+    assert (outbox.droppable, outbox.dropped) == (2, 2)
+
+
+def test_flush_sends_in_order():
+    broadcast, handler, outbox = connect()
+    broadcast.send_all("players", binary=True)
+    broadcast.send_to(handler, "event", lossless=True)
+    callback, args = broadcast.ioloop.callbacks.pop()
+    asyncio.run(callback(*args))
+    assert handler.written == ["players", "event"]
+    assert (outbox.sent, outbox.flushing, len(outbox.messages)) == (2, False, 0)
+
+
+def test_client_full_for_too_long_is_disconnected(monkeypatch):
+    broadcast, handler, outbox = connect(slow_timeout=5.0)
+    now = [100.0]
+    monkeypatch.setattr(broadcaster.time, "monotonic", lambda: now[0])
+    for i in range(3):
+        broadcast.send_all(f"players {i}")
+    assert outbox.full_since == 100.0
+    now[0] += 4.0
+    broadcast.send_all("players 3")
+    assert not outbox.closed
+    now[0] += 2.0
+    broadcast.send_all("players 4")
+    assert outbox.closed and not outbox.messages
+    callback, args = broadcast.ioloop.callbacks[-1]
+    callback(*args)
+    assert handler.closed
+    # nothing more gets queued for it
+    broadcast.send_all("players 5")
+    broadcast.send_to(handler, "event", lossless=True)
+    assert not outbox.messages
+
+
+def test_too_many_lossless_messages_disconnect(monkeypatch):
+    monkeypatch.setattr(broadcaster, "LOSSLESS_BACKLOG", 3)
+    broadcast, handler, outbox = connect()
+    for i in range(3):
+        broadcast.send_all(f"event {i}", lossless=True)
+    assert not outbox.closed
+    broadcast.send_all("event 3", lossless=True)
+    assert outbox.closed
+    assert outbox.handler.close in [cb for cb, _ in broadcast.ioloop.callbacks]
@@ -0,0 +1,126 @@
+import json
+import os
+import time
+
+import pytest
+
+from calibration import (
+    DEFAULTS,
+    CalibrationStore,
+    check_config,
+    read_profile,
+    write_profile,
+)
+
+
+def write_json(path, data):
+    path.write_text(json.dumps(data))
+    # a new mtime even within the file system's timestamp resolution
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_profile_round_trip(tmp_path):
+    path = tmp_path / "calibration.json"
+    config = dict(DEFAULTS, min_bb_height=400, min_confidence=0.25)
+    write_profile(str(path), 7, config)
+    assert read_profile(str(path)) == (7, config)
+    # written through a temporary file, nothing else is left behind
+    assert os.listdir(tmp_path) == ["calibration.json"]
+
+
+def test_profile_from_before_versions(tmp_path):
+    path = tmp_path / "calibration.json"
+    write_json(path, {"min_bb_height": 400, "left_deadzone": 110})
+    assert read_profile(str(path)) == (0, {"min_bb_height": 400, "left_deadzone": 110})
+
+
+def test_no_file_or_no_json_is_no_profile(tmp_path):
+    path = tmp_path / "calibration.json"
+    assert read_profile(str(path)) is None
+    path.write_text('{"version": 3, "con')
+    assert read_profile(str(path)) is None
+
+
+@pytest.mark.parametrize(
+    "profile",
+    [
+        [1, 2],
+        {"version": 1, "config": [400]},
+        {"version": "1", "config": {}},
+        {"version": 1, "config": {"min_bb_height": "tall"}},
+    ],
+)
+def test_unusable_profile_raises(tmp_path, profile):
+    path = tmp_path / "calibration.json"
+    write_json(path, profile)
+    with pytest.raises(ValueError):
+        read_profile(str(path))
+
+
+def test_check_config_keeps_known_keys_as_their_default_type():
+    checked = check_config(
+        {"min_bb_height": "400", "min_confidence": 1, "left_deadzone": 12.0, "x": 1}
+    )
+    assert checked == {"min_bb_height": 400, "min_confidence": 1.0, "left_deadzone": 12}
+    assert type(checked["min_confidence"]) is float
+    for bad in (True, float("nan"), None, "abc"):
+        with pytest.raises(ValueError):
+            check_config({"min_bb_height": bad})
+
+
+def test_unusable_file_loads_defaults(tmp_path):
+    path = tmp_path / "calibration.json"
+    write_json(path, {"version": 2, "config": "nope"})
+    store = CalibrationStore(str(path))
+    assert not store.load()
+    assert store.config == DEFAULTS
+
+
+def test_store_saves_once_edits_stop(tmp_path):
+    path = tmp_path / "calibration.json"
+    store = CalibrationStore(str(path), debounce=0.2, poll_interval=0.05)
+    store.load()
+    store.start()
+    try:
+        for height in range(300, 400, 10):
+            store.config["min_bb_height"] = height
+            store.changed()
+        wait_for(lambda: store.saves)
+        time.sleep(0.3)
+        assert store.saves == 1
+        assert read_profile(str(path)) == (1, dict(DEFAULTS, min_bb_height=390))
+        # our own write doesn't come back as a reload
+        assert store.take_reload() is None
+    finally:
+        store.close()
+
+
+def test_store_reloads_changes_from_disk(tmp_path):
+    path = tmp_path / "calibration.json"
+    write_profile(str(path), 1, dict(DEFAULTS))
+    store = CalibrationStore(str(path), poll_interval=0.05)
+    store.load()
+    store.start()
+    try:
+        write_json(path, {"version": 5, "config": {"left_deadzone": 80}})
+        wait_for(lambda: store.reloaded is not None)
+        assert store.take_reload() == {"left_deadzone": 80}
+        assert store.version == 5
+
+        # a hand edit that doesn't convert leaves what runs alone
+        write_json(path, {"version": 6, "config": {"left_deadzone": "wide"}})
+        stamp = os.stat(path).st_mtime_ns
+        wait_for(lambda: store.stamp is not None and store.stamp[0] == stamp)
+        time.sleep(0.1)
+        assert store.take_reload() is None
+        assert store.version == 5
+    finally:
+        store.close()
@@ -0,0 +1,36 @@
+import pytest
+
+import gierka2
+
+
+def test_bare_call_serves():
+    assert gierka2.legacy_argv([]) == ["serve"]
+    args = gierka2.make_parser().parse_args(gierka2.legacy_argv([]))
+    assert args.run is gierka2.serve
+
+
+def test_session_file_replays(tmp_path):
+    session = tmp_path / "session.jsonl"
+    session.write_text("")
+    argv = gierka2.legacy_argv([str(session), "--serve", "--port", "9000"])
+    assert argv == ["replay", "--serve", str(session), "--serve", "--port", "9000"]
+    args = gierka2.make_parser().parse_args(argv)
+    assert args.run is gierka2.replay
+    assert args.paths == [str(session)]
+    assert args.serve and args.port == 9000
+
+
+def test_session_file_alone_serves_the_replay(tmp_path):
+    session = tmp_path / "session.jsonl"
+    session.write_text("")
+    args = gierka2.make_parser().parse_args(gierka2.legacy_argv([str(session)]))
+    assert args.run is gierka2.replay
+    assert args.serve
+
+
+@pytest.mark.parametrize(
+    "argv",
+    [["--headless"], ["--port", "9000"], ["missing.jsonl"], ["serve", "--headless"]],
+)
+def test_everything_else_is_left_alone(argv):
+    assert gierka2.legacy_argv(argv) == argv
@@ -0,0 +1,123 @@
+import uuid
+
+import pytest
+
+from protocol import (
+    EMPTY_SLOT,
+    HEADER,
+    MAX_UNACKED,
+    MSG_DELTA,
+    MSG_FULL,
+    PlayerIds,
+    PlayersStream,
+    decode,
+    decode_ack,
+    encode,
+    encode_ack,
+    quantize_foot_diff,
+    slot_state,
+)
+
+
+def header(message):
+    version, msg_type, seq, base_seq, frame, n_slots, n_entries = HEADER.unpack_from(
+        message, 0
+    )
+    return msg_type, base_seq, n_entries
+
+
+class Client:
+    """What index.js does: decode against the acked state, ack everything."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.states = {}
+
+    def receive(self, message):
+        msg_type, base_seq, _ = header(message)
+        base = self.states[base_seq] if msg_type == MSG_DELTA else None
+        seq, frame, state = decode(message, base)
+        self.states[seq] = state
+        self.stream.ack(decode_ack(encode_ack(seq)))
+        return state
+
+
+def states(n_frames):
+    ids = PlayerIds()
+    a, b, c = (str(uuid.uuid4()) for _ in range(3))
+    for f in range(n_frames):
+        # b walks off half way and c takes the slot, a's feet keep moving
+        second = b if f < n_frames // 2 else c
+        yield (
+            slot_state(a, (f % 7 - 3) / 10, ids, interpolated=f % 3 == 0),
+            slot_state(second, None if f % 5 == 0 else 0.02, ids),
+            slot_state(None, None, ids),
+        )
+
+
+def test_full_message_round_trip():
+    state = next(states(1))
+    seq, frame, decoded = decode(encode(7, state, frame=42))
+    assert (seq, frame, decoded) == (7, 42, state)
+
+
+def test_stream_sends_deltas_that_decode_to_the_state():
+    stream = PlayersStream()
+    client = Client(stream)
+    types = []
+    for seq, state in enumerate(states(40), start=1):
+        message = stream.message_for(seq, state, frame=seq)
+        if message is None:
+            continue
+        types.append(header(message)[0])
+        assert client.receive(message) == state
+    assert types[0] == MSG_FULL
+    assert set(types[1:]) == {MSG_DELTA}
+
+
+def test_delta_only_carries_changed_slots():
+    ids = PlayerIds()
+    a = str(uuid.uuid4())
+    before = (slot_state(a, 0.1, ids), EMPTY_SLOT)
+    after = (slot_state(a, 0.2, ids), EMPTY_SLOT)
+    message = encode(2, after, 1, before)
+    assert header(message)[2] == 1
+    # the uuid stays home while the slot keeps its player
+    assert a.encode() not in message
+    assert decode(message, before)[2] == after
+
+
+def test_unchanged_state_sends_nothing():
+    stream = PlayersStream()
+    state = next(states(1))
+    assert stream.message_for(1, state) is not None
+    assert stream.message_for(2, state) is None
+
+
+def test_client_too_far_behind_gets_a_full_message():
+    stream = PlayersStream()
+    client = Client(stream)
+    all_states = list(states(MAX_UNACKED + 3))
+    client.receive(stream.message_for(1, all_states[0]))
+    fulls = []
+    # never acked, at some point the stream has to stop relying on the
+    # state the client acked long ago
+    for seq, state in enumerate(all_states[1:], start=2):
+        message = stream.message_for(seq, state)
+        if header(message)[0] == MSG_FULL:
+            fulls.append((message, state))
+    assert len(fulls) == 1
+    message, state = fulls[0]
+    assert decode(message)[2] == state
+
+
+def test_foot_diff_is_clamped_to_int16():
+    assert quantize_foot_diff(10.0) == 32767
+    assert quantize_foot_diff(-10.0) == -32768
+    assert quantize_foot_diff(-0.1234) == -1234
+
+
+def test_ack_round_trip_and_rejects_other_messages():
+    assert decode_ack(encode_ack(123456)) == 123456
+    with pytest.raises(ValueError):
+        decode_ack(bytes([MSG_FULL, 0, 0, 0, 0]))
@@ -0,0 +1,65 @@
+import itertools
+
+import numpy as np
+
+from tracker import GATED, cost_matrix, hungarian, match_detections
+
+
+def best_matching(cost):
+    """Most pairs inside the gate, then the least cost, by trying everything."""
+    n, m = cost.shape
+    size = max(n, m)
+    square = np.full((size, size), GATED)
+    square[:n, :m] = cost
+    best = (0, 0.0)
+    for perm in itertools.permutations(range(size)):
+        pairs = square[np.arange(size), perm]
+        pairs = pairs[pairs < GATED]
+        best = max(best, (len(pairs), -pairs.sum()))
+    return best[0], -best[1]
+
+
+def people(rng, n):
+    return (
+        rng.uniform(0, 600, n),
+        rng.uniform(300, 500, n),
+        rng.uniform(300, 500, n),
+    )
+
+
+def test_match_detections_is_as_good_as_trying_everything():
+    rng = np.random.default_rng(5)
+    for _ in range(500):
+        detections = people(rng, rng.integers(0, 6))
+        tracks = people(rng, rng.integers(0, 6))
+        cost = cost_matrix(*detections, *tracks)
+        rows, cols, lonely = match_detections(*detections, *tracks)
+        assert len(set(rows.tolist())) == len(rows)
+        assert len(set(cols.tolist())) == len(cols)
+        assert (cost[rows, cols] < GATED).all()
+        assert (lonely == ~(cost < GATED).any(axis=1)).all()
+        n_pairs, total = best_matching(cost)
+        assert len(rows) == n_pairs
+        assert np.isclose(cost[rows, cols].sum(), total)
+
+
+def test_crowd_walking_past_keeps_everybody_matched():
+    rng = np.random.default_rng(7)
+    tracks = (
+        np.arange(20) * 100.0,
+        np.full(20, 400.0),
+        rng.uniform(300, 400, 20),
+    )
+    shuffle = rng.permutation(20)
+    detections = tuple((values + rng.normal(0, 5, 20))[shuffle] for values in tracks)
+    rows, cols, lonely = match_detections(*detections, *tracks)
+    assert dict(zip(rows.tolist(), cols.tolist())) == dict(enumerate(shuffle.tolist()))
+    assert not lonely.any()
+
+
+def test_hungarian_on_a_square_matrix():
+    rng = np.random.default_rng(3)
+    for _ in range(200):
+        cost = rng.uniform(0, 100, (4, 4))
+        cols = hungarian(cost)
+        assert np.isclose(cost[np.arange(4), cols].sum(), best_matching(cost)[1])
@@ -0,0 +1,81 @@
+"""Foot thumbnails for the selected players.
+
+Crops are cut from the raw camera frame only for players that are actually
+shown, at most once every THUMBNAIL_INTERVAL seconds per track, and go out
+as binary websocket messages on /thumbnails:
+
+    byte 0       slot (0 primary, 1 secondary)
+    bytes 1-36   track uuid, ascii
+    rest         JPEG
+"""
+
+import os
+
+# seconds between two thumbnails of the same track
+THUMBNAIL_INTERVAL = float(os.environ.get("STUPKI_THUMBNAIL_INTERVAL", "0.5"))
+# longest side of a thumbnail in pixels, bigger crops get scaled down
+THUMBNAIL_MAX_SIZE = 160
+THUMBNAIL_JPEG_QUALITY = 80
+
+
+def foot_box(foot_x, foot_y, knee_x, knee_y):
+    """Square around the foot, as big as the shin is long."""
+    rect_size = ((foot_x - knee_x) ** 2 + (foot_y - knee_y) ** 2) ** 0.5
+    return (
+        foot_x - rect_size / 2,
+        foot_y - rect_size / 2,
+        foot_x + rect_size / 2,
+        foot_y + rect_size / 2,
+    )
+
+
+def encode_thumbnail(frame, box):
+    """JPEG bytes of box cut out of a BGR frame, None if it is off screen."""
+    # only camera frames get here, replays shouldn't have to load cv2
+    import cv2
+
+    height, width = frame.shape[:2]
+    x0 = max(int(box[0]), 0)
+    y0 = max(int(box[1]), 0)
+    x1 = min(int(box[2]), width)
+    y1 = min(int(box[3]), height)
+    if x1 - x0 < 2 or y1 - y0 < 2:
+        return None
+    crop = frame[y0:y1, x0:x1]
+    longest = max(x1 - x0, y1 - y0)
+    if longest > THUMBNAIL_MAX_SIZE:
+        scale = THUMBNAIL_MAX_SIZE / longest
+        crop = cv2.resize(
+            crop,
+            (max(int((x1 - x0) * scale), 1), max(int((y1 - y0) * scale), 1)),
+            interpolation=cv2.INTER_AREA,
+        )
+    ok, jpeg = cv2.imencode(
+        ".jpg", crop, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_JPEG_QUALITY]
+    )
+    if not ok:
+        return None
+    return jpeg.tobytes()
+
+
+def refresh_thumbnail(track, frame, now):
+    """Re-crop the track's foot if it is due, returns True if it changed."""
+    if frame is None or track.foot_box is None:
+        return False
+    if now - track.foot_thumbnail_at < THUMBNAIL_INTERVAL:
+        return False
+    jpeg = encode_thumbnail(frame, track.foot_box)
+    if jpeg is None:
+        return False
+    track.foot_thumbnail = jpeg
+    track.foot_thumbnail_at = now
+    return True
+
+
+def pack_thumbnail(slot, track_uuid, jpeg):
+    return bytes([slot]) + track_uuid.encode("ascii") + jpeg
+
+
+def unpack_thumbnail(message):
+    """(slot, track uuid, jpeg) of a pack_thumbnail() message."""
+    return message[0], message[1:37].decode("ascii"), message[37:]
@@ -0,0 +1,252 @@
+"""Frame-to-frame matching of detections to tracked people.
+
+Detections are matched to tracks as one global assignment on the center
+distance between them, gated with the MATCH_MAX_BB_* limits, so two
+detections can never claim the same track.
+
+Usually every detection's nearest track is in its gate and nobody else's
+nearest, and then that already is the global assignment: no matching can
+beat every detection at its own minimum. Checking that takes one distance
+matrix and an argmin in numpy, so the common frame never builds the gated
+cost matrix, let alone reaches a solver. Otherwise the same check runs on
+the gated matrix, for detections and then for tracks, and only what is
+left competing is split into independent groups and solved exactly, with
+scipy's linear_sum_assignment() when scipy is installed. calls counts
+which way each match went, see bench_tracker.py.
+"""
+
+import collections
+import itertools
+import math
+
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+MATCH_MAX_BB_X_DIST = 180
+MATCH_MAX_BB_Y_DIST = 180
+MATCH_MAX_BB_HEIGHT_DIST = 140
+
+# cost for pairs outside the gate, anything at or above this is not a match
+GATED = 1e9
+# sub-problems with at most this many candidate assignments are solved by
+# scoring every permutation at once instead of running the Hungarian method
+BRUTE_FORCE_MAX_PERMUTATIONS = 5040
+
+# how many matches took which path: "nearest" when every detection took
+# its nearest track, "nearest_detection" when every track took its nearest
+# detection, "groups" otherwise, and which solver the groups went to:
+# "brute_force", "hungarian" or "scipy"
+calls = collections.Counter()
+
+_permutations = {}
+
+
+def cost_matrix(det_x, det_y, det_h, trk_x, trk_y, trk_h):
+    """(detections, tracks) center distances, GATED where they can't match."""
+    dx = np.subtract.outer(det_x, trk_x)
+    dy = np.subtract.outer(det_y, trk_y)
+    dh = np.subtract.outer(det_h, trk_h)
+    cost = np.hypot(dx, dy)
+    gated = (
+        (np.abs(dx) > MATCH_MAX_BB_X_DIST)
+        | (np.abs(dy) > MATCH_MAX_BB_Y_DIST)
+        | (np.abs(dh) > MATCH_MAX_BB_HEIGHT_DIST)
+    )
+    cost[gated] = GATED
+    return cost
+
+
+def hungarian(cost):
+    """Minimum cost assignment for a (rows, cols) matrix with rows <= cols.
+
+    Shortest augmenting path version of the Hungarian method, O(rows^2 *
+    cols) with the inner scan over columns done in numpy. Returns the column
+    picked for every row.
+    """
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    # row (1-based) assigned to each column, 0 means free; column 0 is the
+    # virtual start column of the current augmenting path
+    p = np.zeros(m + 1, dtype=np.int64)
+    way = np.zeros(m + 1, dtype=np.int64)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used
+            free[0] = False
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free[1:] & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+            candidates = np.where(free, minv, np.inf)
+            j1 = int(np.argmin(candidates))
+            delta = candidates[j1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        # flip the augmenting path
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    cols_for_rows = np.empty(n, dtype=np.int64)
+    assigned = np.nonzero(p[1:])[0]
+    cols_for_rows[p[1:][assigned] - 1] = assigned
+    return cols_for_rows
+
+
+def brute_force(cost):
+    """Same as hungarian(), by scoring all permutations in one go."""
+    n, m = cost.shape
+    perms = _permutations.get((n, m))
+    if perms is None:
+        perms = np.array(list(itertools.permutations(range(m), n)))
+        _permutations[(n, m)] = perms
+    totals = cost[np.arange(n), perms].sum(axis=1)
+    return perms[np.argmin(totals)]
+
+
+def solve_assignment(cost):
+    """(rows, cols) index arrays of the cheapest one-to-one matching."""
+    n, m = cost.shape
+    if n == 0 or m == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    small = math.perm(max(n, m), min(n, m)) <= BRUTE_FORCE_MAX_PERMUTATIONS
+    if not small and linear_sum_assignment is not None:
+        calls["scipy"] += 1
+        return linear_sum_assignment(cost)
+    solve = brute_force if small else hungarian
+    calls[solve.__name__] += 1
+    if n <= m:
+        return np.arange(n), solve(cost)
+    cols = np.arange(m)
+    rows = solve(cost.T)
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
+
+def all_in_gate(det_x, det_y, det_h, trk_x, trk_y, trk_h, cols):
+    """Whether detection i and track cols[i] are inside the gate, for all i."""
+    for x, y, h, j in zip(det_x, det_y, det_h, cols):
+        if (
+            abs(x - trk_x[j]) > MATCH_MAX_BB_X_DIST
+            or abs(y - trk_y[j]) > MATCH_MAX_BB_Y_DIST
+            or abs(h - trk_h[j]) > MATCH_MAX_BB_HEIGHT_DIST
+        ):
+            return False
+    return True
+
+
+def match_detections(det_x, det_y, det_h, trk_x, trk_y, trk_h):
+    """Match detections to tracks.
+
+    Returns (detection_idx, track_idx, lonely): the matched pairs, plus a
+    per-detection mask of the ones with no track anywhere inside the gate.
+    Only those should start a new track; a detection that lost its track to
+    a closer one is usually a duplicate of the same person.
+    """
+    n = len(det_x)
+    if n == 0 or len(trk_x) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.ones(n, dtype=bool)
+    # the usual frame: every detection's nearest track is in its gate and
+    # nobody else's nearest, then no matching can do better. Only the
+    # distances go through numpy, the gate is checked for those n pairs.
+    nearest = np.hypot(
+        np.subtract.outer(det_x, trk_x), np.subtract.outer(det_y, trk_y)
+    ).argmin(axis=1)
+    cols = nearest.tolist()
+    if len(set(cols)) == n and all_in_gate(
+        det_x.tolist(),
+        det_y.tolist(),
+        det_h.tolist(),
+        trk_x.tolist(),
+        trk_y.tolist(),
+        trk_h.tolist(),
+        cols,
+    ):
+        calls["nearest"] += 1
+        return np.arange(n), nearest, np.zeros(n, dtype=bool)
+
+    cost = cost_matrix(det_x, det_y, det_h, trk_x, trk_y, trk_h)
+    nearest = cost.argmin(axis=1)
+    rows = np.arange(n)
+    lonely = cost[rows, nearest] >= GATED
+    if lonely.any():
+        rows = rows[~lonely]
+        nearest = nearest[rows]
+    # same with the gate applied, detections with no track in it left out
+    cols = nearest.tolist()
+    if len(set(cols)) == len(cols):
+        calls["nearest"] += 1
+        return rows, nearest, lonely
+    # or every track at its own minimum, when two detections want one
+    # track and only one of them can have it
+    nearest = cost.argmin(axis=0)
+    cols = np.flatnonzero(cost[nearest, np.arange(len(trk_x))] < GATED)
+    nearest = nearest[cols]
+    if len(set(nearest.tolist())) == len(cols):
+        order = np.argsort(nearest)
+        calls["nearest_detection"] += 1
+        return nearest[order], cols[order], lonely
+
+    calls["groups"] += 1
+    feasible = cost < GATED
+    rows = []
+    cols = []
+    # players usually stand far apart, so the gate splits the frame into
+    # small independent groups that are each cheap to solve exactly
+    for group_rows, group_cols in gate_groups(feasible):
+        if len(group_rows) == 1 and len(group_cols) == 1:
+            rows.append(group_rows)
+            cols.append(group_cols)
+            continue
+        sub = cost[np.ix_(group_rows, group_cols)]
+        sub_rows, sub_cols = solve_assignment(sub)
+        ok = sub[sub_rows, sub_cols] < GATED
+        rows.append(group_rows[sub_rows[ok]])
+        cols.append(group_cols[sub_cols[ok]])
+    if not rows:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), lonely
+    return np.concatenate(rows), np.concatenate(cols), lonely
+
+
+def gate_groups(feasible):
+    """Split the gate into connected groups of detections and tracks.
+
+    Yields (detection_idx, track_idx) per group, detections/tracks without
+    any feasible pair are left out.
+    """
+    has_track = feasible.any(axis=1)
+    has_det = feasible.any(axis=0)
+    dets = np.nonzero(has_track)[0]
+    if len(dets) == 0:
+        return
+    f = feasible[dets].astype(np.float32)
+    # detections sharing a track are neighbours, square the reachability
+    # matrix until it stops growing
+    reach = (f @ f.T) > 0
+    while True:
+        grown = (reach.astype(np.float32) @ reach.astype(np.float32)) > 0
+        if (grown == reach).all():
+            break
+        reach = grown
+    # label every detection with the first detection it can reach
+    labels = np.argmax(reach, axis=1)
+    track_labels = labels[np.argmax(feasible[dets], axis=0)]
+    for label in np.unique(labels):
+        yield dets[labels == label], np.nonzero(has_det & (track_labels == label))[0]
@@ -0,0 +1,126 @@
+"""macOS Vision pose backend (VNDetectHumanBodyPoseRequest)."""
+
+import AVFoundation
+import cv2
+import numpy as np
+import Quartz
+import Vision
+from Cocoa import NSURL
+from Foundation import NSData, NSDictionary
+
+# needed to capture system-level stderr
+from wurlitzer import pipes
+
+from pose_backends import (
+    JOINT_INDEX,
+    PoseBackend,
+    array_to_observations,
+    empty_points,
+)
+
+
+class VisionBackend(PoseBackend):
+    def __init__(self, use_file_frames=False, img_path="/tmp/ddd.jpg"):
+        self.use_file_frames = use_file_frames
+        self.img_path = img_path
+
+    def detect(self, frame):
+        return array_to_observations(*self.detect_array(frame))
+
+    def detect_array(self, frame):
+        if self.use_file_frames:
+            cv2.imwrite(self.img_path, frame)
+            return detect_points(self.img_path)
+        return detect_points_in_frame(cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA))
+
+
+def detect_points(img_path, lang="eng"):
+    """Slow path: decode a JPEG from disk, kept as a fallback."""
+    input_url = NSURL.fileURLWithPath_(img_path)
+
+    with pipes() as (out, err):
+        # capture stdout and stderr from system calls
+        # otherwise, Quartz.CIImage.imageWithContentsOfURL_
+        # prints to stderr something like:
+        # 2020-09-20 20:55:25.538 python[73042:5650492] Creating client/daemon connection: B8FE995E-3F27-47F4-9FA8-559C615FD774
+        # 2020-09-20 20:55:25.652 python[73042:5650492] Got the query meta data reply for: com.apple.MobileAsset.RawCamera.Camera, response: 0
+        input_image = Quartz.CIImage.imageWithContentsOfURL_(input_url)
+
+    return run_pose_request(input_image)
+
+
+def detect_points_in_frame(bgra):
+    """Fast path: run detection straight on a BGRA numpy frame.
+
+    The CIImage wraps the array memory without copying it, so `bgra` must
+    stay alive until this returns.
+    """
+    height, width = bgra.shape[:2]
+    data = NSData.dataWithBytesNoCopy_length_freeWhenDone_(bgra, bgra.nbytes, False)
+    input_image = Quartz.CIImage.imageWithBitmapData_bytesPerRow_size_format_colorSpace_(
+        data,
+        bgra.strides[0],
+        Quartz.CGSizeMake(width, height),
+        Quartz.kCIFormatBGRA8,
+        Quartz.CGColorSpaceCreateDeviceRGB(),
+    )
+    return run_pose_request(input_image)
+
+
+def run_pose_request(input_image):
+    vision_options = NSDictionary.dictionaryWithDictionary_({})
+    vision_handler = Vision.VNImageRequestHandler.alloc().initWithCIImage_options_(
+        input_image, vision_options
+    )
+    results = []
+    handler = make_request_handler(results)
+    vision_request = (
+        Vision.VNDetectHumanBodyPoseRequest.alloc().initWithCompletionHandler_(handler)
+    )
+    error = vision_handler.performRequests_error_([vision_request], None)
+
+    if not results:
+        return empty_points(0), np.zeros(0, dtype=np.float32)
+    return results[0]
+
+
+def make_request_handler(results):
+    """results: list that gets (points, confidences) appended"""
+    if not isinstance(results, list):
+        raise ValueError("results must be a list")
+
+    def handler(request, error):
+        if error:
+            print(f"Error! {error}")
+            return
+        observations = request.results()
+        points = empty_points(len(observations))
+        confidences = np.zeros(len(observations), dtype=np.float32)
+        for i, obs in enumerate(observations):
+            confidences[i] = obs.confidence()
+            recognized, _ = obs.recognizedPointsForJointsGroupName_error_(
+                Vision.VNHumanBodyPoseObservationJointsGroupNameAll, None
+            )
+            for join_name, point in recognized.items():
+                j = JOINT_INDEX.get(str(join_name))
+                if j is not None:
+                    points[i, j] = (point.x(), point.y(), point.confidence())
+        results.append((points, confidences))
+
+    return handler
+
+
+def capture_shit():
+    session = AVFoundation.AVCaptureSession.alloc().init()
+    devices = AVFoundation.AVCaptureDevice.devicesWithMediaType_(
+        AVFoundation.AVMediaTypeVideo
+    )
+    device = devices[0]
+
+    input_session = AVFoundation.AVCaptureDeviceInput.deviceInputWithDevice_error_(
+        device, None
+    )[0]
+
+    session.addInput_(input_session)
+
+    session.startRunning()